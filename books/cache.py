@@ -0,0 +1,89 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = "books:catalog_version"
+
+
+def get_catalog_version() -> int:
+    version = cache.get(CATALOG_VERSION_KEY)
+
+    if version is None:
+        # Seed from the clock so a lost counter never reuses old keys.
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+
+    return version
+
+
+def _incr_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog response.
+
+    The version is bumped right away and again on commit, so readers
+    that cached pre-commit rows under the first bump are discarded too.
+    """
+    _incr_catalog_version()
+    transaction.on_commit(_incr_catalog_version)
+
+
+def make_etag(data) -> str:
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return '"%s"' % hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+class CatalogCacheMixin:
+    """
+    Serve safe catalog reads from the Django cache.
+
+    Entries are keyed by the catalog version and the full request URI
+    and carry a strong ETag, so a matching ``If-None-Match`` is answered
+    with 304 straight from the cache.
+    """
+
+    def get_catalog_cache_key(self, request) -> str:
+        uri = request.build_absolute_uri()
+        digest = hashlib.sha256(uri.encode()).hexdigest()
+        return f"books:response:{get_catalog_version()}:{digest}"
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        key = self.get_catalog_cache_key(request)
+        cached = cache.get(key)
+
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+            cached = (make_etag(response.data), response.data)
+            cache.set(key, cached, settings.BOOK_CACHE_TIMEOUT)
+
+        etag, data = cached
+        if_none_match = {
+            tag.removeprefix("W/")
+            for tag in parse_etags(request.headers.get("If-None-Match", ""))
+        }
+
+        if etag in if_none_match or "*" in if_none_match:
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED,
+                headers={"ETag": etag},
+            )
+
+        return Response(data, headers={"ETag": etag})
@@ -0,0 +1,123 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.settings import api_settings
+
+from books.models import Book
+from books.search import search_books
+
+SEED_SQL = """
+WITH words AS (
+    SELECT
+        ARRAY['clean', 'code', 'pragmatic', 'programmer', 'design',
+              'patterns', 'refactoring', 'domain', 'driven', 'data',
+              'intensive', 'applications', 'structure', 'interpretation',
+              'computer', 'programs', 'algorithms', 'distributed',
+              'systems', 'database', 'internals', 'python', 'fluent',
+              'effective', 'modern', 'architecture', 'testing',
+              'legacy', 'release', 'continuous', 'delivery']::text[] AS w,
+        ARRAY['Robert Martin', 'Andrew Hunt', 'David Thomas',
+              'Martin Fowler', 'Eric Evans', 'Martin Kleppmann',
+              'Harold Abelson', 'Thomas Cormen', 'Donald Knuth',
+              'Luciano Ramalho', 'Brett Slatkin', 'Kent Beck',
+              'Michael Feathers', 'Jez Humble', 'Alex Petrov']::text[] AS n
+)
+INSERT INTO books_book (title, author, cover, inventory, daily_fee)
+SELECT
+    CASE WHEN i %% 500 = 0 THEN
+        initcap(
+            w[1 + (i * 7) %% cardinality(w)] || ' '
+            || w[1 + (i * 13) %% cardinality(w)] || ' '
+            || w[1 + (i / 97) %% cardinality(w)]
+        )
+    ELSE
+        initcap(
+            substr(md5(i::text), 1, 7) || ' '
+            || substr(md5(i::text), 8, 6) || ' '
+            || substr(md5((i / 7)::text), 1, 8)
+        )
+    END,
+    CASE WHEN i %% 500 = 0 THEN
+        n[1 + (i / 500) %% cardinality(n)]
+    ELSE
+        initcap(substr(md5((i / 3)::text), 10, 7)) || ' '
+        || initcap(substr(md5((i / 11)::text), 3, 9))
+    END,
+    CASE WHEN i %% 2 = 0 THEN 'Hard' ELSE 'Soft' END,
+    i %% 10,
+    (i %% 500) / 100.0
+FROM words, generate_series(1, %s) AS i
+"""
+
+DEFAULT_QUERIES = (
+    "clean code",
+    "kleppmann",
+    "pragmatc programer",
+    "distributed systems design",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway catalog and measure /api/books/?search= "
+        "query latency. All seeded rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--query", action="append", dest="queries")
+
+    def handle(self, *args, **options):
+        queries = options["queries"] or DEFAULT_QUERIES
+        page_size = api_settings.PAGE_SIZE
+
+        with transaction.atomic():
+            self.seed(options["rows"])
+
+            for query in queries:
+                self.bench(query, options["repeat"], page_size)
+
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        self.stdout.write(f"Seeding {rows} books...")
+        started = time.perf_counter()
+
+        with connection.cursor() as cursor:
+            cursor.execute(SEED_SQL, [rows])
+            cursor.execute("ANALYZE books_book")
+
+        self.stdout.write(
+            f"Seeded in {time.perf_counter() - started:.1f}s"
+        )
+
+    def bench(self, query, repeat, page_size):
+        queryset = search_books(
+            Book.objects.defer("search_vector"), query
+        ).order_by("-rank", "id")[:page_size]
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        plan = queryset.explain()
+
+        self.stdout.write(
+            f"\n{query!r}: "
+            f"p50={statistics.median(timings):.2f}ms "
+            f"p95={p95:.2f}ms "
+            f"max={timings[-1]:.2f}ms"
+        )
+        self.stdout.write(plan)
+
+        if "Seq Scan on books_book" in plan:
+            self.stdout.write(self.style.WARNING(
+                "Plan contains a sequential scan of books_book"
+            ))
@@ -0,0 +1,54 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.services import BookImportService, IMPORT_FORMATS, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk upsert books from a CSV or NDJSON file using COPY. "
+        "Rows with an id update that book; rows without one are added."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--file-format", choices=IMPORT_FORMATS)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        file_format = options["file_format"] or path.suffix.lstrip(".")
+
+        if file_format == "jsonl":
+            file_format = "ndjson"
+
+        if file_format not in IMPORT_FORMATS:
+            raise CommandError(
+                "Unknown file format, pass --file-format csv|ndjson"
+            )
+
+        service = BookImportService(
+            batch_size=options["batch_size"],
+            on_progress=self.report_progress,
+        )
+
+        with path.open(encoding="utf-8", newline="") as stream:
+            report = service.run(read_rows(stream, file_format))
+
+        for error in report.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.imported} books, "
+            f"rejected {report.rejected} rows "
+            f"in {report.elapsed:.1f}s "
+            f"({report.rows_per_second:.0f} rows/s)"
+        ))
+
+    def report_progress(self, report):
+        self.stdout.write(
+            f"{report.processed} rows processed, "
+            f"{report.rejected} rejected, "
+            f"{report.rows_per_second:.0f} rows/s"
+        )
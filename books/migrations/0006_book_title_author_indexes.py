@@ -0,0 +1,25 @@
+# Generated by Django 5.2.9 on 2026-10-17 21:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_alter_book_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(
+                fields=['title', 'id'],
+                name='books_book_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(
+                fields=['author', 'id'],
+                name='books_book_author_id_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.9 on 2026-10-17 21:46
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+CREATE_SEARCH_VECTOR_TRIGGER = """
+CREATE TRIGGER books_book_search_vector_update
+BEFORE INSERT OR UPDATE OF title, author ON books_book
+FOR EACH ROW EXECUTE FUNCTION
+tsvector_update_trigger(search_vector, 'pg_catalog.english', title, author);
+
+UPDATE books_book SET title = title;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER IF EXISTS books_book_search_vector_update ON books_book;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_title_author_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False,
+                null=True),
+        ),
+        migrations.RunSQL(
+            CREATE_SEARCH_VECTOR_TRIGGER,
+            DROP_SEARCH_VECTOR_TRIGGER,
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['search_vector'],
+                name='books_book_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['title'],
+                name='books_book_title_trgm_idx',
+                opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['author'],
+                name='books_book_author_trgm_idx',
+                opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-17 21:51
+
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_book_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(
+                django.db.models.functions.comparison.Collate(
+                    django.db.models.functions.text.Upper('title'), 'C'),
+                name='books_book_title_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(
+                django.db.models.functions.comparison.Collate(
+                    django.db.models.functions.text.Upper('author'), 'C'),
+                name='books_book_author_prefix_idx'),
+        ),
+    ]
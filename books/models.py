@@ -1,6 +1,9 @@
 from decimal import Decimal
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Collate, Upper
 
 
 class Book(models.Model):
@@ -17,3 +20,32 @@ class Book(models.Model):
         max_digits=3,
         decimal_places=2,
         default=Decimal('0.00'))
+    # Maintained by the books_book_search_vector_update trigger.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["title", "id"],
+                name="books_book_title_id_idx"),
+            models.Index(
+                fields=["author", "id"],
+                name="books_book_author_id_idx"),
+            models.Index(
+                Collate(Upper("title"), "C"),
+                name="books_book_title_prefix_idx"),
+            models.Index(
+                Collate(Upper("author"), "C"),
+                name="books_book_author_prefix_idx"),
+            GinIndex(
+                fields=["search_vector"],
+                name="books_book_search_vector_idx"),
+            GinIndex(
+                fields=["title"],
+                opclasses=["gin_trgm_ops"],
+                name="books_book_title_trgm_idx"),
+            GinIndex(
+                fields=["author"],
+                opclasses=["gin_trgm_ops"],
+                name="books_book_author_trgm_idx"),
+        ]
@@ -0,0 +1,39 @@
+from django.contrib.postgres.search import (SearchQuery,
+                                            SearchRank,
+                                            TrigramSimilarity)
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Greatest
+
+SEARCH_CONFIG = "english"
+
+
+def search_books(queryset, query: str):
+    """
+    Filter books matching ``query`` and annotate them with a ``rank``.
+
+    A book matches when its ``search_vector`` (kept up to date by a
+    database trigger) matches the web-search style query, or when its
+    title/author is trigram-similar to it. Both predicates are served
+    by GIN indexes, so no sequential ``ILIKE '%q%'`` scan is issued.
+    """
+    search_query = SearchQuery(
+        query,
+        config=SEARCH_CONFIG,
+        search_type="websearch",
+    )
+    # Double precision: a real would come back rounded, and the rank a
+    # pagination cursor carries would no longer match its row.
+    rank = Cast(
+        SearchRank(F("search_vector"), search_query)
+        + Greatest(
+            TrigramSimilarity("title", query),
+            TrigramSimilarity("author", query),
+        ),
+        output_field=FloatField(),
+    )
+
+    return queryset.annotate(rank=rank).filter(
+        Q(search_vector=search_query)
+        | Q(title__trigram_similar=query)
+        | Q(author__trigram_similar=query)
+    )
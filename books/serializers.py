@@ -1,8 +1,10 @@
 from rest_framework import serializers
 from books.models import Book
+from library_api_service.sparse_fields import SparseFieldsSerializerMixin
 
 
-class BooksSerializer(serializers.ModelSerializer):
+class BooksSerializer(SparseFieldsSerializerMixin,
+                      serializers.ModelSerializer):
     class Meta:
         model = Book
         fields = ("id", "title", "author", "cover", "inventory", "daily_fee", )
@@ -0,0 +1,206 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.db import connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from books.cache import bump_catalog_version
+from books.serializers import BooksSerializer
+
+IMPORT_FORMATS = ("csv", "ndjson")
+MAX_REPORTED_ERRORS = 100
+
+CREATE_STAGING_TABLE = """
+CREATE TEMP TABLE IF NOT EXISTS books_import_staging (
+    id bigint,
+    title varchar(100),
+    author varchar(100),
+    cover varchar(4),
+    inventory integer,
+    daily_fee numeric(3, 2)
+)
+"""
+
+TRUNCATE_STAGING_TABLE = "TRUNCATE books_import_staging"
+
+COPY_INTO_STAGING = """
+COPY books_import_staging (id, title, author, cover, inventory, daily_fee)
+FROM STDIN
+"""
+
+UPSERT_FROM_STAGING = """
+INSERT INTO books_book (id, title, author, cover, inventory, daily_fee)
+SELECT
+    COALESCE(id, nextval(pg_get_serial_sequence('books_book', 'id'))),
+    title, author, cover, inventory, daily_fee
+FROM books_import_staging
+ON CONFLICT (id) DO UPDATE SET
+    title = EXCLUDED.title,
+    author = EXCLUDED.author,
+    cover = EXCLUDED.cover,
+    inventory = EXCLUDED.inventory,
+    daily_fee = EXCLUDED.daily_fee
+"""
+
+SYNC_ID_SEQUENCE = """
+SELECT setval(
+    pg_get_serial_sequence('books_book', 'id'),
+    GREATEST((SELECT MAX(id) FROM books_book), 1)
+)
+"""
+
+
+def read_rows(stream, file_format: str):
+    """Lazily yield one dict per record of a CSV or NDJSON text stream."""
+    if file_format == "csv":
+        yield from csv.DictReader(stream)
+        return
+
+    for line in stream:
+        if not line.strip():
+            continue
+
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            yield None
+
+
+class BookImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self.started_at = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def reject(self, row_number: int, errors):
+        self.rejected += 1
+
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "errors": errors})
+
+    def as_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+class BookImportService:
+    """
+    Stream books into ``books_book`` in bounded batches.
+
+    Every batch is validated with ``BooksSerializer``, ``COPY``-ed into
+    a temporary staging table and upserted by id in one statement, so
+    memory and per-row overhead stay flat regardless of file size.
+    Rows without an id are inserted as new books.
+    """
+
+    def __init__(self, batch_size=5000, on_progress=None):
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+
+    def run(self, rows) -> BookImportReport:
+        report = BookImportReport()
+        rows = iter(rows)
+        explicit_ids = False
+
+        # Batches commit one by one: if a later one fails, the ones
+        # already in still need the sequence synced and the cache dropped.
+        try:
+            while batch := list(islice(rows, self.batch_size)):
+                records = self.validate(batch, report)
+                explicit_ids |= any(
+                    record[0] is not None for record in records
+                )
+
+                if records:
+                    self.upsert(records)
+                    report.imported += len(records)
+
+                if self.on_progress:
+                    self.on_progress(report)
+        finally:
+            if explicit_ids:
+                with connection.cursor() as cursor:
+                    cursor.execute(SYNC_ID_SEQUENCE)
+
+            if report.imported:
+                bump_catalog_version()
+
+        return report
+
+    @staticmethod
+    def validate(batch, report: BookImportReport) -> list:
+        # One serializer per batch: building fields is the expensive part.
+        serializer = BooksSerializer()
+        records = {}
+        new_books = []
+
+        for row in batch:
+            report.processed += 1
+            row_number = report.processed
+
+            if not isinstance(row, dict):
+                report.reject(
+                    row_number, {"non_field_errors": ["Invalid row."]}
+                )
+                continue
+
+            try:
+                book_id = int(row["id"]) if row.get("id") else None
+            except (TypeError, ValueError):
+                report.reject(
+                    row_number, {"id": ["A valid integer is required."]}
+                )
+                continue
+
+            try:
+                data = serializer.run_validation(row)
+            except ValidationError as e:
+                report.reject(row_number, e.detail)
+                continue
+
+            record = (
+                book_id,
+                data["title"],
+                data["author"],
+                data["cover"],
+                data.get("inventory", 0),
+                data.get("daily_fee", 0),
+            )
+
+            if book_id is None:
+                new_books.append(record)
+            else:
+                # ON CONFLICT cannot touch the same id twice per statement.
+                records[book_id] = record
+
+        return list(records.values()) + new_books
+
+    @staticmethod
+    def upsert(records):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(CREATE_STAGING_TABLE)
+            cursor.execute(TRUNCATE_STAGING_TABLE)
+
+            with cursor.copy(COPY_INTO_STAGING) as copy:
+                for record in records:
+                    copy.write_row(record)
+
+            cursor.execute(UPSERT_FROM_STAGING)
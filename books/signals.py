@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from books.cache import bump_catalog_version
+from books.models import Book
+from books.suggest import suggest_cache
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_catalog_caches(sender, instance, **kwargs):
+    suggest_cache.clear()
+    bump_catalog_version()
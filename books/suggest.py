@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.functions import Collate, Upper
+
+from books.cache import get_catalog_version
+from books.models import Book
+
+SUGGEST_FIELDS = {
+    "titles": "title",
+    "authors": "author",
+}
+
+
+class PrefixLRUCache:
+    """
+    Thread-safe, per-process LRU cache of suggestions keyed by prefix.
+
+    Keys include the shared catalog version, so a ``Book`` change in any
+    worker invalidates them; ``ttl`` only bounds how long cold entries
+    linger.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+suggest_cache = PrefixLRUCache(
+    max_size=settings.BOOK_SUGGEST_CACHE_SIZE,
+    ttl=settings.BOOK_SUGGEST_CACHE_TTL,
+)
+
+
+def normalize_prefix(query: str) -> str:
+    return " ".join(query.split()).upper()
+
+
+def complete(field: str, prefix: str, limit: int) -> list:
+    """
+    Return up to ``limit`` distinct values of ``field`` starting with
+    ``prefix``, served by the ``upper(field) COLLATE "C"`` index.
+    """
+    return list(
+        Book.objects.annotate(
+            suggest_key=Collate(Upper(field), "C"),
+        ).filter(
+            suggest_key__startswith=prefix,
+        ).order_by(
+            "suggest_key",
+        ).values_list(
+            field, flat=True,
+        ).distinct()[:limit]
+    )
+
+
+def suggest(query: str, limit: int) -> dict:
+    prefix = normalize_prefix(query)
+
+    if not prefix:
+        return {name: [] for name in SUGGEST_FIELDS}
+
+    key = (get_catalog_version(), prefix, limit)
+    suggestions = suggest_cache.get(key)
+
+    if suggestions is None:
+        suggestions = {
+            name: complete(field, prefix, limit)
+            for name, field in SUGGEST_FIELDS.items()
+        }
+        suggest_cache.set(key, suggestions)
+
+    return suggestions
@@ -0,0 +1,502 @@
+import io
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from books.models import Book
+from books.serializers import BooksSerializer
+from books.services import BookImportService, read_rows
+from books.views import BookViewSet
+from library_api_service.testing import QueryCountAssertionsMixin
+
+BOOKS_URL = reverse("books:books-list")
+SUGGEST_URL = reverse("books:books-suggest")
+BULK_IMPORT_URL = reverse("books:books-bulk-import")
+EXPORT_URL = reverse("books:books-export")
+
+user_model = get_user_model()
+
+
+def sample_book(**params):
+    defaults = {
+        "title": "Book 1",
+        "author": "<NAME>",
+        "cover": "Soft",
+        "inventory": 5,
+        "daily_fee": 1.99,
+    }
+    defaults.update(params)
+
+    return Book.objects.create(**defaults)
+
+
+class BookPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+        for number in range(5):
+            sample_book(title=f"Book {4 - number}")
+
+    def test_list_is_cursor_paginated(self):
+        response = self.client.get(BOOKS_URL, {"page_size": 2})
+
+        books = Book.objects.order_by("id")[:2]
+        serializer = BooksSerializer(books, many=True)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], serializer.data)
+        self.assertIsNotNone(response.data["next"])
+        self.assertIsNone(response.data["previous"])
+
+    def test_next_page_continues_after_last_id(self):
+        first_page = self.client.get(BOOKS_URL, {"page_size": 2})
+        second_page = self.client.get(first_page.data["next"])
+
+        books = Book.objects.order_by("id")[2:4]
+        serializer = BooksSerializer(books, many=True)
+
+        self.assertEqual(second_page.data["results"], serializer.data)
+
+    def test_ordering_by_title(self):
+        response = self.client.get(
+            BOOKS_URL,
+            {
+                "ordering": "title",
+                "page_size": 5,
+            }
+        )
+
+        titles = [book["title"] for book in response.data["results"]]
+
+        self.assertEqual(titles, sorted(titles))
+
+    def test_ordering_pages_through_duplicate_titles(self):
+        for _ in range(4):
+            sample_book(title="Book 2")
+
+        ids = []
+        page = self.client.get(
+            BOOKS_URL, {"ordering": "title", "page_size": 2}
+        )
+
+        while True:
+            ids += [book["id"] for book in page.data["results"]]
+
+            if not page.data["next"]:
+                break
+
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(page.data["next"])
+
+            # Ties are resolved by the id in the cursor, not an OFFSET.
+            self.assertNotIn("OFFSET", queries[-1]["sql"])
+
+        self.assertEqual(
+            ids,
+            list(Book.objects.order_by("title", "id").values_list(
+                "id", flat=True
+            ))
+        )
+
+        previous = self.client.get(page.data["previous"])
+
+        self.assertEqual(
+            [book["id"] for book in previous.data["results"]], ids[-3:-1]
+        )
+
+    def test_malformed_cursor_is_not_found(self):
+        # A position that does not match the ordering's fields.
+        cursor = "cD0lNUIlMjIxJTIyJTVE"
+        response = self.client.get(
+            BOOKS_URL, {"ordering": "title", "cursor": cursor}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unknown_ordering_falls_back_to_id(self):
+        response = self.client.get(BOOKS_URL, {"ordering": "inventory"})
+
+        ids = [book["id"] for book in response.data["results"]]
+
+        self.assertEqual(ids, sorted(ids))
+
+    def test_fields_param_loads_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                BOOKS_URL,
+                {
+                    "fields": "id,title",
+                    "ordering": "title",
+                }
+            )
+
+        self.assertEqual(
+            [set(book) for book in response.data["results"]],
+            [{"id", "title"}] * 5
+        )
+        self.assertNotIn("inventory", queries[-1]["sql"])
+
+    def test_export_streams_whole_catalog(self):
+        response = self.client.get(EXPORT_URL)
+
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        serializer = BooksSerializer(Book.objects.order_by("id"), many=True)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(rows, serializer.data)
+
+    def test_legacy_unpaginated_opt_in(self):
+        response = self.client.get(BOOKS_URL, {"paginate": "false"})
+
+        serializer = BooksSerializer(Book.objects.all(), many=True)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, serializer.data)
+
+    def test_fast_list_matches_serializer_output(self):
+        sample_book(title="Untitled", daily_fee=0.5, cover="Hard")
+        params = [
+            {},
+            {"ordering": "-title", "page_size": 3},
+            {"fields": "id,daily_fee"},
+            {"paginate": "false"},
+        ]
+
+        for query in params:
+            fast = self.client.get(BOOKS_URL, query)
+            cache.clear()
+
+            with override_settings(FAST_LIST_SERIALIZATION=False):
+                slow = self.client.get(BOOKS_URL, query)
+            cache.clear()
+
+            self.assertEqual(fast.status_code, status.HTTP_200_OK)
+            self.assertEqual(fast.content, slow.content)
+
+
+class BookQueryBudgetTest(QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def add_books(self, count):
+        for _ in range(count):
+            sample_book()
+
+    def test_list_query_count_is_constant(self):
+        self.assertQueryCountConstant(
+            lambda: self.client.get(BOOKS_URL, {"page_size": 100}),
+            self.add_books,
+        )
+
+    @override_settings(QUERY_BUDGET_HEADER=True)
+    def test_budget_overrun_is_logged_and_reported(self):
+        with mock.patch.object(BookViewSet, "query_budget", {"list": 0}), \
+                self.assertLogs("library_api_service.query_budget") as logs:
+            response = self.client.get(BOOKS_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("budget is 0", logs.output[0])
+        self.assertEqual(response["X-Query-Budget-Exceeded"], "1/0")
+
+        with self.assertRaises(AssertionError):
+            self.assertWithinQueryBudget(response)
+
+    @override_settings(QUERY_BUDGET_HEADER=False)
+    def test_budget_header_can_be_turned_off(self):
+        with mock.patch.object(BookViewSet, "query_budget", {"list": 0}), \
+                self.assertLogs("library_api_service.query_budget"):
+            response = self.client.get(BOOKS_URL)
+
+        self.assertNotIn("X-Query-Budget-Exceeded", response)
+
+    @override_settings(QUERY_BUDGET_HEADER=True)
+    async def test_budget_is_checked_under_asgi(self):
+        with mock.patch.object(BookViewSet, "query_budget", {"list": 0}), \
+                self.assertLogs("library_api_service.query_budget"):
+            response = await AsyncClient().get(BOOKS_URL)
+
+        self.assertEqual(response["X-Query-Budget-Exceeded"], "1/0")
+
+    @override_settings(DEBUG=True)
+    def test_debug_reports_query_count(self):
+        response = self.client.get(BOOKS_URL)
+
+        self.assertEqual(response["X-Query-Count"], "1")
+
+
+class BookSearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+        self.clean_code = sample_book(
+            title="Clean Code",
+            author="Robert Martin",
+        )
+        self.clean_architecture = sample_book(
+            title="Clean Architecture",
+            author="Robert Martin",
+        )
+        self.refactoring = sample_book(
+            title="Refactoring",
+            author="Martin Fowler",
+        )
+
+    def test_search_vector_maintained_on_save(self):
+        self.refactoring.title = "Domain Driven Design"
+        self.refactoring.save()
+
+        response = self.client.get(BOOKS_URL, {"search": "domain"})
+
+        ids = [book["id"] for book in response.data["results"]]
+
+        self.assertEqual(ids, [self.refactoring.id])
+
+    def test_search_ranks_best_match_first(self):
+        response = self.client.get(BOOKS_URL, {"search": "clean code"})
+
+        ids = [book["id"] for book in response.data["results"]]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ids[0], self.clean_code.id)
+        self.assertNotIn(self.refactoring.id, ids)
+
+    def test_search_tolerates_typos(self):
+        response = self.client.get(BOOKS_URL, {"search": "Refactorng"})
+
+        ids = [book["id"] for book in response.data["results"]]
+
+        self.assertEqual(ids, [self.refactoring.id])
+
+    def test_search_results_are_paginated(self):
+        first_page = self.client.get(
+            BOOKS_URL,
+            {
+                "search": "martin",
+                "page_size": 2,
+            }
+        )
+        second_page = self.client.get(first_page.data["next"])
+
+        ids = [
+            book["id"]
+            for book in first_page.data["results"]
+            + second_page.data["results"]
+        ]
+
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(len(set(ids)), 3)
+
+
+class BookSuggestTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+        sample_book(title="Clean Code", author="Robert Martin")
+        sample_book(title="Clean Architecture", author="Robert Martin")
+        sample_book(title="Refactoring", author="Martin Fowler")
+
+    def test_suggest_titles_and_authors_by_prefix(self):
+        response = self.client.get(SUGGEST_URL, {"q": "  clean "})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {
+                "titles": ["Clean Architecture", "Clean Code"],
+                "authors": [],
+            }
+        )
+
+    def test_suggest_distinct_authors(self):
+        response = self.client.get(SUGGEST_URL, {"q": "rob"})
+
+        self.assertEqual(response.data["authors"], ["Robert Martin"])
+
+    def test_suggest_limit(self):
+        response = self.client.get(SUGGEST_URL, {"q": "c", "limit": 1})
+
+        self.assertEqual(response.data["titles"], ["Clean Architecture"])
+
+    def test_suggest_cache_invalidated_on_book_change(self):
+        self.client.get(SUGGEST_URL, {"q": "ref"})
+
+        sample_book(title="Refactoring Databases", author="Scott Ambler")
+
+        response = self.client.get(SUGGEST_URL, {"q": "ref"})
+
+        self.assertEqual(
+            response.data["titles"],
+            ["Refactoring", "Refactoring Databases"]
+        )
+
+
+class BookCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.book = sample_book()
+
+    def test_list_sets_strong_etag(self):
+        response = self.client.get(BOOKS_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["ETag"].startswith('"'))
+
+    def test_if_none_match_returns_not_modified_without_queries(self):
+        etag = self.client.get(BOOKS_URL)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(BOOKS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_cached_detail_served_without_queries(self):
+        url = reverse("books:books-detail", args=[self.book.id])
+        first = self.client.get(url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_book_change_invalidates_cache(self):
+        etag = self.client.get(BOOKS_URL)["ETag"]
+
+        self.book.inventory = 0
+        self.book.save()
+
+        response = self.client.get(BOOKS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["results"][0]["inventory"], 0)
+
+
+class BookBulkImportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = user_model.objects.create_user(
+            email="admin@admin.com",
+            password="password",
+            is_staff=True,
+        )
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, name, content, **extra):
+        return self.client.post(
+            BULK_IMPORT_URL,
+            {
+                "file": SimpleUploadedFile(name, content.encode()),
+                **extra,
+            },
+            format="multipart",
+        )
+
+    def test_import_csv_upserts_and_reports_errors(self):
+        existing = sample_book(title="Old title")
+        content = (
+            "id,title,author,cover,inventory,daily_fee\n"
+            f"{existing.id},New title,Author,Hard,3,0.50\n"
+            ",Fresh book,Author,Soft,1,1.00\n"
+            ",Broken book,Author,Paper,1,1.00\n"
+        )
+
+        response = self.upload("books.csv", content)
+
+        existing.refresh_from_db()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["imported"], 2)
+        self.assertEqual(response.data["rejected"], 1)
+        self.assertEqual(response.data["errors"][0]["row"], 3)
+        self.assertEqual(existing.title, "New title")
+        self.assertEqual(existing.inventory, 3)
+        self.assertTrue(Book.objects.filter(title="Fresh book").exists())
+
+    def test_import_ndjson_in_batches(self):
+        content = "\n".join(
+            json.dumps({
+                "title": f"Book {number}",
+                "author": "Author",
+                "cover": "Soft",
+                "inventory": 1,
+                "daily_fee": "0.10",
+            })
+            for number in range(7)
+        ) + "\nnot json\n"
+
+        report = BookImportService(batch_size=3).run(
+            read_rows(io.StringIO(content), "ndjson")
+        )
+
+        self.assertEqual(report.imported, 7)
+        self.assertEqual(report.rejected, 1)
+        self.assertEqual(Book.objects.count(), 7)
+
+    def test_failed_batch_keeps_earlier_batches_fresh(self):
+        def rows():
+            for number in range(3):
+                yield {
+                    "title": f"Book {number}",
+                    "author": "Author",
+                    "cover": "Soft",
+                    "inventory": 1,
+                    "daily_fee": "0.10",
+                }
+
+            raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid")
+
+        cached = self.client.get(BOOKS_URL)
+
+        with self.assertRaises(UnicodeDecodeError):
+            BookImportService(batch_size=3).run(rows())
+
+        response = self.client.get(BOOKS_URL)
+
+        self.assertEqual(cached.data["results"], [])
+        self.assertEqual(len(response.data["results"]), 3)
+
+    def test_imported_books_are_searchable_and_get_new_ids(self):
+        self.upload(
+            "books.ndjson",
+            '{"id": 500, "title": "Imported", "author": "A", '
+            '"cover": "Soft"}\n'
+        )
+
+        created = sample_book(title="Created after import")
+
+        self.assertGreater(created.id, 500)
+        self.assertTrue(
+            Book.objects.filter(search_vector="imported").exists()
+        )
+
+    def test_import_requires_admin(self):
+        self.client.force_authenticate(
+            user_model.objects.create_user(
+                email="user@user.com",
+                password="password",
+            )
+        )
+
+        response = self.upload("books.csv", "title\n")
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -1,14 +1,78 @@
+import csv
+import io
+from pathlib import Path
+
+from django.conf import settings
 from drf_spectacular.types import OpenApiTypes
-from drf_spectacular.utils import extend_schema
-from rest_framework import viewsets, permissions
+from drf_spectacular.utils import (OpenApiExample,
+                                   extend_schema,
+                                   OpenApiParameter)
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
 
+from books.cache import CatalogCacheMixin
 from books.models import Book
+from books.search import search_books
 from books.serializers import BooksSerializer
+from books.services import BookImportService, IMPORT_FORMATS, read_rows
+from books.suggest import suggest
+from library_api_service.exports import StreamingExportMixin
+from library_api_service.fast_serializers import FastListMixin
+from library_api_service.sparse_fields import (SPARSE_FIELDS_PARAMETERS,
+                                               SparseFieldsViewMixin)
 
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(CatalogCacheMixin,
+                  StreamingExportMixin,
+                  SparseFieldsViewMixin,
+                  FastListMixin,
+                  viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BooksSerializer
+    export_filename = "books"
+    export_fields = {
+        field: field for field in BooksSerializer.Meta.fields
+    }
+    cursor_ordering_fields = {
+        "id": ("id",),
+        "title": ("title", "id"),
+        "author": ("author", "id"),
+    }
+    query_budget = {
+        "list": 3,
+        "retrieve": 3,
+        "suggest": 2,
+        # Runs a fixed handful of statements per import batch.
+        "bulk_import": None,
+    }
+
+    def get_search_query(self):
+        search = self.request.query_params.get("search", "").strip()
+        return search[:100] or None
+
+    def get_queryset(self):
+        queryset = Book.objects.defer("search_vector")
+        search = self.get_search_query()
+
+        if search and self.action == "list":
+            queryset = search_books(
+                queryset, search
+            ).order_by("-rank", "id")
+
+        return queryset
+
+    def get_cursor_ordering(self):
+        if self.get_search_query() and self.action == "list":
+            return ("-rank", "id")
+        return None
+
+    def perform_authentication(self, request):
+        # Catalog reads are public; authenticate lazily so cached
+        # responses never touch the user table.
+        if request.method not in permissions.SAFE_METHODS:
+            super().perform_authentication(request)
 
     def get_permissions(self):
         if self.request.method in permissions.SAFE_METHODS:
@@ -17,25 +81,59 @@ class BookViewSet(viewsets.ModelViewSet):
 
     @extend_schema(
         summary="Get list of books",
-        description="Retrieve a list of all available books. Public access.",
+        description=(
+                "Retrieve a cursor-paginated list of books. Public access.\n\n"
+                "Follow the `next`/`previous` links to page through the "
+                "catalog. Pass **paginate=false** to get the legacy "
+                "unpaginated list.\n\n"
+                "Pass **search** to run a ranked full-text and fuzzy "
+                "(trigram) search over titles and authors."
+        ),
+        parameters=[
+            *SPARSE_FIELDS_PARAMETERS,
+            OpenApiParameter(
+                name="search",
+                type=OpenApiTypes.STR,
+                required=False,
+                description="Search titles and authors, best matches first",
+            ),
+            OpenApiParameter(
+                name="ordering",
+                type=OpenApiTypes.STR,
+                required=False,
+                description="Order books by id (default), title or author",
+                enum=["id", "title", "author"],
+            ),
+            OpenApiParameter(
+                name="paginate",
+                type=OpenApiTypes.BOOL,
+                required=False,
+                description="Set to false to disable pagination (legacy)",
+            ),
+        ],
         responses={
             200: BooksSerializer(many=True),
+            304: None,
         },
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        return self.cached_response(request, super().list, *args, **kwargs)
 
     @extend_schema(
         summary="Retrieve book",
         description="Retrieve detailed information about a book. "
                     "Public access.",
+        parameters=SPARSE_FIELDS_PARAMETERS,
         responses={
             200: BooksSerializer,
+            304: None,
             404: OpenApiTypes.OBJECT,
         },
     )
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
 
     @extend_schema(
         summary="Create book",
@@ -90,3 +188,149 @@ class BookViewSet(viewsets.ModelViewSet):
     )
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
+
+    @extend_schema(
+        summary="Suggest book titles and authors",
+        description=(
+                "Autocomplete titles and authors starting with **q**. "
+                "Public access.\n\n"
+                "Designed to be called on every keystroke: results come "
+                "from a prefix index and hot prefixes are cached."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="q",
+                type=OpenApiTypes.STR,
+                required=True,
+                description="Prefix typed so far (case-insensitive)",
+            ),
+            OpenApiParameter(
+                name="limit",
+                type=OpenApiTypes.INT,
+                required=False,
+                description=(
+                    f"Completions per kind, "
+                    f"up to {settings.BOOK_SUGGEST_MAX_LIMIT}"
+                ),
+            ),
+        ],
+        responses={
+            200: OpenApiTypes.OBJECT,
+        },
+        examples=[
+            OpenApiExample(
+                name="Suggestions",
+                value={
+                    "titles": ["Clean Architecture", "Clean Code"],
+                    "authors": [],
+                },
+                response_only=True,
+                status_codes=["200"],
+            ),
+        ],
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="suggest",
+        authentication_classes=[],
+    )
+    def suggest(self, request):
+        try:
+            limit = int(request.query_params.get(
+                "limit", settings.BOOK_SUGGEST_DEFAULT_LIMIT
+            ))
+        except ValueError:
+            limit = settings.BOOK_SUGGEST_DEFAULT_LIMIT
+
+        limit = min(max(limit, 1), settings.BOOK_SUGGEST_MAX_LIMIT)
+
+        return Response(suggest(request.query_params.get("q", ""), limit))
+
+    @extend_schema(
+        summary="Bulk import books",
+        description=(
+                "Upload a CSV or NDJSON file of books as multipart "
+                "field **file**. Admin access only.\n\n"
+                "Rows with an id update that book, rows without one are "
+                "added. Rows are validated like single book creation; "
+                "invalid rows are skipped and reported. Use the "
+                "`import_books` management command for very large feeds."
+        ),
+        request={
+            "multipart/form-data": {
+                "type": "object",
+                "properties": {
+                    "file": {"type": "string", "format": "binary"},
+                    "file_format": {
+                        "type": "string",
+                        "enum": ["csv", "ndjson"],
+                    },
+                },
+            },
+        },
+        responses={
+            200: OpenApiTypes.OBJECT,
+            400: OpenApiTypes.OBJECT,
+            401: OpenApiTypes.OBJECT,
+            403: OpenApiTypes.OBJECT,
+        },
+        examples=[
+            OpenApiExample(
+                name="Import report",
+                value={
+                    "processed": 3,
+                    "imported": 2,
+                    "rejected": 1,
+                    "errors": [
+                        {
+                            "row": 2,
+                            "errors": {
+                                "cover": ['"Paper" is not a valid choice.']
+                            },
+                        },
+                    ],
+                    "seconds": 0.012,
+                    "rows_per_second": 250.0,
+                },
+                response_only=True,
+                status_codes=["200"],
+            ),
+        ],
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk-import",
+        parser_classes=[MultiPartParser],
+    )
+    def bulk_import(self, request):
+        upload = request.FILES.get("file")
+
+        if upload is None:
+            return Response(
+                {"detail": "file is required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        file_format = request.data.get("file_format") or (
+            Path(upload.name).suffix.lstrip(".").replace("jsonl", "ndjson")
+        )
+
+        if file_format not in IMPORT_FORMATS:
+            return Response(
+                {"detail": "file_format must be csv or ndjson."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8", newline="")
+
+        try:
+            report = BookImportService().run(read_rows(stream, file_format))
+        except (UnicodeDecodeError, csv.Error) as e:
+            return Response(
+                {"detail": f"Could not read file: {e}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
@@ -1,4 +1,5 @@
 from django.contrib import admin
-from borrowings.models import Borrowing
+from borrowings.models import Borrowing, DailyStats
 
 admin.site.register(Borrowing)
+admin.site.register(DailyStats)
@@ -0,0 +1,229 @@
+import asyncio
+import multiprocessing
+import random
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+import httpx
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from books.models import Book
+from payments.gateways import FakeGateway
+
+USER_EMAIL = "loadtest-{}@example.com"
+BOOK_TITLE = "Load test book {}"
+BOOK_INVENTORY = 1_000_000
+
+
+async def borrow_and_return(
+        client, token, book_ids, checkout_share, deadline, results):
+    headers = {"Authorization": f"Bearer {token}"}
+    expected_return_date = str(date.today() + timedelta(days=7))
+
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/borrowings/",
+            json={
+                "book": random.choice(book_ids),
+                "expected_return_date": expected_return_date,
+            },
+            headers=headers,
+        )
+        results.append(
+            ("create", response.status_code, time.perf_counter() - started)
+        )
+
+        if response.status_code != 201:
+            continue
+
+        borrowing = response.json()
+
+        # Sessions are created lazily, so only this reaches the gateway.
+        if random.random() < checkout_share:
+            started = time.perf_counter()
+            response = await client.get(
+                borrowing["payment_status_url"], headers=headers
+            )
+            results.append((
+                "checkout",
+                response.status_code,
+                time.perf_counter() - started,
+            ))
+
+        # Returning keeps inventory and the user's open borrowings flat.
+        started = time.perf_counter()
+        response = await client.post(
+            f"/api/borrowings/{borrowing['id']}/return/",
+            headers=headers,
+        )
+        results.append(
+            ("return", response.status_code, time.perf_counter() - started)
+        )
+
+
+async def drive(
+        url, tokens, book_ids, checkout_share, concurrency, duration):
+    results = []
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+
+    async with httpx.AsyncClient(
+            base_url=url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            borrow_and_return(
+                client,
+                tokens[number % len(tokens)],
+                book_ids,
+                checkout_share,
+                deadline,
+                results,
+            )
+            for number in range(concurrency)
+        ))
+
+    return results
+
+
+def run_process(args):
+    return asyncio.run(drive(*args))
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test POST /api/borrowings/, the payment's checkout session "
+        "and the return against a running server. Seeds "
+        "loadtest-N@example.com users and books with a large inventory, "
+        "which are kept for later runs. The server must use "
+        "payments.gateways.FakeGateway so no request reaches Stripe."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--books", type=int, default=100)
+        parser.add_argument(
+            "--concurrency", type=int, default=100,
+            help="Requests in flight per process",
+        )
+        parser.add_argument(
+            "--checkout-share", type=float, default=0.5,
+            help="Share of borrowings whose checkout session is requested",
+        )
+        parser.add_argument("--processes", type=int, default=1)
+        parser.add_argument("--duration", type=float, default=30)
+
+    def handle(self, *args, **options):
+        if settings.PAYMENT_GATEWAY != \
+                f"{FakeGateway.__module__}.{FakeGateway.__name__}":
+            raise CommandError(
+                "Set PAYMENT_GATEWAY=payments.gateways.FakeGateway, "
+                "here and on the server, to load test without Stripe."
+            )
+
+        tokens = self.seed_users(options["users"])
+        book_ids = self.seed_books(options["books"])
+        jobs = [
+            (
+                options["url"],
+                tokens,
+                book_ids,
+                options["checkout_share"],
+                options["concurrency"],
+                options["duration"],
+            )
+        ] * options["processes"]
+
+        self.stdout.write(
+            f"Driving {options['url']} with "
+            f"{options['processes']} x {options['concurrency']} "
+            f"connections for {options['duration']:.0f}s..."
+        )
+
+        if options["processes"] > 1:
+            with multiprocessing.get_context("fork").Pool(
+                    options["processes"]) as pool:
+                results = [
+                    result
+                    for process_results in pool.map(run_process, jobs)
+                    for result in process_results
+                ]
+        else:
+            results = run_process(jobs[0])
+
+        self.report(results, options["duration"])
+
+    def seed_users(self, count):
+        user_model = get_user_model()
+        emails = [USER_EMAIL.format(number) for number in range(count)]
+        existing = set(
+            user_model.objects.filter(email__in=emails).values_list(
+                "email", flat=True
+            )
+        )
+        user_model.objects.bulk_create(
+            user_model(email=email, password="!")
+            for email in emails
+            if email not in existing
+        )
+
+        return [
+            str(AccessToken.for_user(user))
+            for user in user_model.objects.filter(email__in=emails)
+        ]
+
+    def seed_books(self, count):
+        titles = [BOOK_TITLE.format(number) for number in range(count)]
+        existing = set(
+            Book.objects.filter(title__in=titles).values_list(
+                "title", flat=True
+            )
+        )
+        Book.objects.bulk_create(
+            Book(
+                title=title,
+                author="Load test",
+                cover=Book.CoverChoises.SOFT,
+                inventory=BOOK_INVENTORY,
+                daily_fee=1,
+            )
+            for title in titles
+            if title not in existing
+        )
+        Book.objects.filter(title__in=titles).update(
+            inventory=BOOK_INVENTORY
+        )
+
+        return list(
+            Book.objects.filter(title__in=titles).values_list("id", flat=True)
+        )
+
+    def report(self, results, duration):
+        self.stdout.write(
+            f"{len(results)} requests, {len(results) / duration:.0f} req/s"
+        )
+
+        for operation in ("create", "checkout", "return"):
+            timings = sorted(
+                elapsed for name, _, elapsed in results if name == operation
+            )
+
+            if not timings:
+                continue
+
+            statuses = Counter(
+                code for name, code, _ in results if name == operation
+            )
+            self.stdout.write(
+                f"{operation}: {len(timings)} "
+                f"p50={timings[len(timings) // 2] * 1000:.0f}ms "
+                f"p95={timings[int(len(timings) * 0.95)] * 1000:.0f}ms "
+                f"p99={timings[int(len(timings) * 0.99)] * 1000:.0f}ms "
+                f"statuses={dict(sorted(statuses.items()))}"
+            )
@@ -0,0 +1,57 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from library_api_service.partitions import (PartitionInUse,
+                                            create_partitions,
+                                            detach_partitions)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly borrowing and payment partitions for the "
+        "coming months, and optionally detach old ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.PARTITION_MONTHS_AHEAD,
+        )
+        parser.add_argument(
+            "--detach-before",
+            type=date.fromisoformat,
+            help="Detach partitions that end on or before this date.",
+        )
+        parser.add_argument(
+            "--archive-schema",
+            help="Move detached partitions into this schema.",
+        )
+
+    def handle(self, *args, **options):
+        created = create_partitions(connection, options["months_ahead"])
+        detached = []
+
+        for name in created:
+            self.stdout.write(f"Created {name}")
+
+        if options["detach_before"]:
+            try:
+                detached = detach_partitions(
+                    connection,
+                    options["detach_before"],
+                    archive_schema=options["archive_schema"],
+                )
+            except PartitionInUse as error:
+                raise CommandError(str(error))
+
+        for name in detached:
+            self.stdout.write(f"Detached {name}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(created)} partitions, "
+            f"detached {len(detached)}"
+        ))
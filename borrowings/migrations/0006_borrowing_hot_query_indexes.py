@@ -0,0 +1,50 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:12
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('borrowings', '0005_alter_borrowing_id'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='borrowing',
+            index=models.Index(
+                fields=['user', 'id'],
+                name='borrowings_user_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='borrowing',
+            index=models.Index(
+                condition=models.Q(('actual_return_date__isnull', True)),
+                fields=['user', 'id'],
+                name='borrowings_user_active_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='borrowing',
+            index=models.Index(
+                condition=models.Q(('actual_return_date__isnull', True)),
+                fields=['id'],
+                name='borrowings_active_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='borrowing',
+            index=models.Index(
+                condition=models.Q(('actual_return_date__isnull', True)),
+                fields=['expected_return_date'],
+                name='borrowings_overdue_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='borrowing',
+            index=models.Index(
+                fields=['borrow_date'],
+                name='borrowings_borrow_date_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:40
+
+from datetime import date
+
+from django.db import migrations
+
+from library_api_service.partitions import (BORROWINGS_TABLE,
+                                            add_months,
+                                            create_partitions,
+                                            month_start,
+                                            partition_table)
+
+
+def partition_borrowings(apps, schema_editor):
+    connection = schema_editor.connection
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT max(borrow_date) FROM {BORROWINGS_TABLE}")
+        (last_borrow_date,) = cursor.fetchone()
+
+    # Everything up to the end of this month stays in the history
+    # partition; monthly partitions start after it.
+    end = add_months(
+        month_start(max(last_borrow_date or date.min, date.today())), 1
+    )
+    partition_table(connection, BORROWINGS_TABLE, "borrow_date", end)
+    create_partitions(connection, 3, tables=[BORROWINGS_TABLE])
+
+
+class Migration(migrations.Migration):
+
+    # Later changes to the referenced keys would rebuild the partitions'
+    # indexes, so those must already be in place.
+    dependencies = [
+        ('books', '0008_book_prefix_indexes'),
+        ('borrowings', '0006_borrowing_hot_query_indexes'),
+        ('users', '0003_alter_user_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_borrowings),
+    ]
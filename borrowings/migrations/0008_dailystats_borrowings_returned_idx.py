@@ -0,0 +1,47 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowings', '0007_partition_borrowings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('borrowings_created', models.PositiveIntegerField(
+                    default=0)),
+                ('borrowings_returned', models.PositiveIntegerField(
+                    default=0)),
+                ('payments_created', models.PositiveIntegerField(
+                    default=0)),
+                ('payments_paid', models.PositiveIntegerField(default=0)),
+                ('fines_created', models.PositiveIntegerField(default=0)),
+                ('fines_paid', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(
+                    decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'daily stats',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(
+                condition=models.Q(('actual_return_date__isnull', False)),
+                fields=['actual_return_date'],
+                name='borrowings_returned_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:59
+
+from django.db import migrations
+
+from library_api_service.partitions import (BORROWINGS_TABLE,
+                                            create_default_partition)
+
+
+def add_default_partition(apps, schema_editor):
+    create_default_partition(schema_editor.connection, BORROWINGS_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowings', '0008_dailystats_borrowings_returned_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_default_partition),
+    ]
@@ -21,6 +21,58 @@ class Borrowing(models.Model):
         on_delete=models.CASCADE,
         related_name="borrowings")
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "id"],
+                name="borrowings_user_id_idx"),
+            models.Index(
+                fields=["user", "id"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowings_user_active_idx"),
+            models.Index(
+                fields=["id"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowings_active_idx"),
+            models.Index(
+                fields=["expected_return_date"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowings_overdue_idx"),
+            models.Index(
+                fields=["borrow_date"],
+                name="borrowings_borrow_date_idx"),
+            models.Index(
+                fields=["actual_return_date"],
+                condition=models.Q(actual_return_date__isnull=False),
+                name="borrowings_returned_idx"),
+        ]
+
     def set_actual_return_date(self):
         self.actual_return_date = date.today()
         self.save()
+
+
+class DailyStats(models.Model):
+    """
+    Activity of one day, rolled up from borrowings and payments by
+    ``rollup_daily_stats`` so reports read one row per day.
+    """
+
+    day = models.DateField(unique=True)
+    borrowings_created = models.PositiveIntegerField(default=0)
+    borrowings_returned = models.PositiveIntegerField(default=0)
+    payments_created = models.PositiveIntegerField(default=0)
+    payments_paid = models.PositiveIntegerField(default=0)
+    fines_created = models.PositiveIntegerField(default=0)
+    fines_paid = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(
+        decimal_places=2, max_digits=12, default=0
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "daily stats"
+        ordering = ["-day"]
+
+    def __str__(self):
+        return str(self.day)
@@ -1,10 +1,21 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.conf import settings
 from rest_framework import serializers
-from borrowings.models import Borrowing
+from borrowings.models import Borrowing, DailyStats
+from library_api_service.sparse_fields import SparseFieldsSerializerMixin
 from payments.serializers import PaymentSerializer
 
+BORROWING_EXPANDABLE_FIELDS = {
+    "book": ("books.serializers.BooksSerializer", {}),
+    "user": ("users.serializers.UserSerializer", {}),
+    "payments": ("payments.serializers.PaymentSerializer", {"many": True}),
+}
+
+
+class BorrowingSerializer(SparseFieldsSerializerMixin,
+                          serializers.ModelSerializer):
+    expandable_fields = BORROWING_EXPANDABLE_FIELDS
 
-class BorrowingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Borrowing
         fields = (
@@ -18,19 +29,18 @@ class BorrowingSerializer(serializers.ModelSerializer):
         read_only_fields = ("user", "actual_return_date", "borrow_date")
 
     def validate(self, data):
-        book = data["book"]
         expected_return_date = data["expected_return_date"]
 
-        if book.inventory <= 0:
-            raise serializers.ValidationError(
-                "We don't have enough inventory.")
+        # Inventory is reserved atomically on save, see BorrowingService.
         if expected_return_date < datetime.date(datetime.today()):
             raise serializers.ValidationError("Please enter a valid date.")
 
         return data
 
 
-class BorrowingDetailSerializer(serializers.ModelSerializer):
+class BorrowingDetailSerializer(SparseFieldsSerializerMixin,
+                                serializers.ModelSerializer):
+    expandable_fields = BORROWING_EXPANDABLE_FIELDS
     payments = PaymentSerializer(read_only=True, many=True)
 
     class Meta:
@@ -43,3 +53,48 @@ class BorrowingDetailSerializer(serializers.ModelSerializer):
             "book",
             "user",
             "payments")
+
+
+class BorrowingBulkReturnSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BORROWING_BULK_RETURN_MAX_IDS,
+    )
+
+
+class DailyStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailyStats
+        fields = (
+            "day",
+            "borrowings_created",
+            "borrowings_returned",
+            "payments_created",
+            "payments_paid",
+            "fines_created",
+            "fines_paid",
+            "revenue",
+            "updated_at",
+        )
+
+
+class DailyStatsQuerySerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, data):
+        date_to = data.get("date_to") or datetime.date(datetime.today())
+        date_from = data.get("date_from") or date_to - timedelta(days=29)
+
+        if date_from > date_to:
+            raise serializers.ValidationError(
+                "date_from must not be after date_to."
+            )
+
+        if (date_to - date_from).days >= settings.DAILY_STATS_MAX_DAYS:
+            raise serializers.ValidationError(
+                f"At most {settings.DAILY_STATS_MAX_DAYS} days at once."
+            )
+
+        return {"date_from": date_from, "date_to": date_to}
@@ -0,0 +1,234 @@
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from books.cache import bump_catalog_version
+from books.models import Book
+from borrowings.models import Borrowing, DailyStats
+from payments.models import Payment
+
+
+TAKE_BOOKS = """
+WITH wanted AS (
+    SELECT book_id, count(*) AS quantity
+    FROM unnest(%s::bigint[]) AS book_id
+    GROUP BY book_id
+), locked AS (
+    SELECT book.id, wanted.quantity
+    FROM books_book AS book
+    JOIN wanted ON wanted.book_id = book.id
+    WHERE book.inventory >= wanted.quantity
+    ORDER BY book.id
+    FOR UPDATE OF book
+)
+UPDATE books_book AS book
+SET inventory = book.inventory - locked.quantity
+FROM locked
+WHERE book.id = locked.id
+RETURNING book.id
+"""
+
+RETURN_BORROWINGS = """
+UPDATE borrowings_borrowing
+SET actual_return_date = %s
+WHERE id = ANY(%s) AND actual_return_date IS NULL
+RETURNING id, book_id
+"""
+
+RESTOCK_BOOKS = """
+WITH returned (id, quantity) AS (
+    VALUES {values}
+), locked AS (
+    SELECT book.id, returned.quantity
+    FROM books_book AS book
+    JOIN returned ON returned.id = book.id
+    ORDER BY book.id
+    FOR UPDATE OF book
+)
+UPDATE books_book AS book
+SET inventory = book.inventory + locked.quantity
+FROM locked
+WHERE book.id = locked.id
+"""
+
+
+class InventoryExhausted(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "We don't have enough inventory."
+    default_code = "inventory_exhausted"
+
+
+class BorrowingService:
+    """
+    Inventory bookkeeping done as single conditional UPDATEs.
+
+    The database checks and changes the row in one statement, so
+    concurrent checkouts and returns cannot oversell a book or lose an
+    increment the way a Python read-modify-write could.
+    """
+
+    @staticmethod
+    def take_book(book_id: int) -> None:
+        taken = Book.objects.filter(
+            pk=book_id,
+            inventory__gt=0,
+        ).update(inventory=F("inventory") - 1)
+
+        if not taken:
+            raise InventoryExhausted()
+
+        bump_catalog_version()
+
+    @staticmethod
+    def take_books(book_ids: list[int]) -> None:
+        """
+        Take one copy per entry of ``book_ids`` (repeats allowed) in a
+        single statement, or none at all.
+
+        Rows are locked in id order, so overlapping carts queue up
+        instead of deadlocking.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(TAKE_BOOKS, [book_ids])
+
+            if cursor.rowcount != len(set(book_ids)):
+                raise InventoryExhausted()
+
+        bump_catalog_version()
+
+    @staticmethod
+    def checkout(user, items: list[dict]) -> list[Borrowing]:
+        """
+        Create one borrowing per validated ``{book, expected_return_date}``
+        item; nothing is created if any book runs out.
+        """
+        with transaction.atomic():
+            BorrowingService.take_books(
+                [item["book"].pk for item in items]
+            )
+
+            return Borrowing.objects.bulk_create(
+                Borrowing(user=user, **item) for item in items
+            )
+
+    @staticmethod
+    def put_back_book(book_id: int) -> None:
+        Book.objects.filter(pk=book_id).update(
+            inventory=F("inventory") + 1
+        )
+        bump_catalog_version()
+
+    @staticmethod
+    def return_book(borrowing: Borrowing) -> bool:
+        """
+        Mark ``borrowing`` returned and restock its book.
+
+        Returns ``False`` if another request returned it first.
+        """
+        today = date.today()
+        returned = Borrowing.objects.filter(
+            pk=borrowing.pk,
+            actual_return_date__isnull=True,
+        ).update(actual_return_date=today)
+
+        if not returned:
+            return False
+
+        borrowing.actual_return_date = today
+        BorrowingService.put_back_book(borrowing.book_id)
+
+        return True
+
+    @staticmethod
+    def return_books(borrowing_ids: list[int]) -> list[int]:
+        """
+        Return every still-active borrowing of ``borrowing_ids`` with one
+        UPDATE and restock their books with one grouped UPDATE.
+
+        Returns the ids that were actually returned by this call.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(RETURN_BORROWINGS, [date.today(), borrowing_ids])
+            returned = cursor.fetchall()
+
+            if not returned:
+                return []
+
+            quantities = sorted(Counter(
+                book_id for _, book_id in returned
+            ).items())
+            cursor.execute(
+                RESTOCK_BOOKS.format(
+                    values=", ".join(["(%s, %s)"] * len(quantities))
+                ),
+                [value for pair in quantities for value in pair],
+            )
+
+        bump_catalog_version()
+
+        return [borrowing_id for borrowing_id, _ in returned]
+
+
+class DailyStatsService:
+    """
+    Keeps one ``DailyStats`` row per day. Each rollup aggregates only
+    that day's rows, found through date indexes, so its cost follows
+    the day's activity rather than the size of the ledger.
+    """
+
+    @staticmethod
+    def rollup(day: date) -> DailyStats:
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        end = start + timedelta(days=1)
+        fine = Q(type=Payment.TypeChoices.FINE)
+
+        borrowings_created = Borrowing.objects.filter(
+            borrow_date=day
+        ).aggregate(count=Count("id"))["count"]
+        borrowings_returned = Borrowing.objects.filter(
+            actual_return_date=day
+        ).aggregate(count=Count("id"))["count"]
+        created = Payment.objects.filter(
+            created_at__gte=start,
+            created_at__lt=end,
+        ).aggregate(
+            payments=Count("id", filter=~fine),
+            fines=Count("id", filter=fine),
+        )
+        paid = Payment.objects.filter(
+            paid_at__gte=start,
+            paid_at__lt=end,
+        ).aggregate(
+            payments=Count("id", filter=~fine),
+            fines=Count("id", filter=fine),
+            revenue=Sum("money_to_paid"),
+        )
+
+        stats = DailyStats(
+            day=day,
+            borrowings_created=borrowings_created,
+            borrowings_returned=borrowings_returned,
+            payments_created=created["payments"],
+            payments_paid=paid["payments"],
+            fines_created=created["fines"],
+            fines_paid=paid["fines"],
+            revenue=paid["revenue"] or 0,
+            updated_at=timezone.now(),
+        )
+        DailyStats.objects.bulk_create(
+            [stats],
+            update_conflicts=True,
+            unique_fields=["day"],
+            update_fields=[
+                field.name
+                for field in DailyStats._meta.concrete_fields
+                if field.name not in ("id", "day")
+            ],
+        )
+
+        return stats
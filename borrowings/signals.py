@@ -1,8 +1,12 @@
-from django.dispatch import receiver
+from django.dispatch import receiver, Signal
 from django.db.models.signals import post_save
-from rest_framework.exceptions import ValidationError
 
 from .models import Borrowing
+from .services import BorrowingService
+
+# Sent with ``user`` and ``borrowings`` after a multi-book checkout, whose
+# bulk_create skips post_save.
+borrowings_checked_out = Signal()
 
 
 @receiver(post_save, sender=Borrowing)
@@ -10,11 +14,7 @@ def borrowing_decrease_book_inventory(sender, instance, created, **kwargs):
     if not created:
         return
 
-    book_obj = instance.book
-
-    if book_obj.inventory <= 0:
-        raise ValidationError("We don't have enough inventory")
-
-    book_obj.inventory -= 1
+    BorrowingService.take_book(instance.book_id)
 
-    book_obj.save()
+    if Borrowing.book.is_cached(instance):
+        instance.book.refresh_from_db(fields=["inventory"])
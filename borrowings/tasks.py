@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.db import connection
+from django.utils.timezone import now
+
+from borrowings.services import DailyStatsService
+from library_api_service.partitions import create_partitions
+
+
+@shared_task
+def create_future_partitions():
+    """Keep monthly partitions ready ahead of the rows that need them."""
+    return create_partitions(connection, settings.PARTITION_MONTHS_AHEAD)
+
+
+@shared_task
+def rollup_daily_stats(days_ago: int = 0):
+    """Refresh the ``DailyStats`` row of today, or of ``days_ago``."""
+    day = now().date() - timedelta(days=days_ago)
+    DailyStatsService.rollup(day)
+
+    return day.isoformat()
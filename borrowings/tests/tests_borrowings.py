@@ -1,14 +1,47 @@
-from datetime import date
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
 from rest_framework.reverse import reverse
 from books.models import Book
-from borrowings.models import Borrowing
+from borrowings.models import Borrowing, DailyStats
 from borrowings.serializers import BorrowingSerializer
+from borrowings.services import (BorrowingService,
+                                 DailyStatsService,
+                                 InventoryExhausted)
+from borrowings.tasks import rollup_daily_stats
+from library_api_service.partitions import (BORROWINGS_TABLE,
+                                            PAYMENTS_TABLE,
+                                            add_months,
+                                            create_partitions,
+                                            default_partition_name,
+                                            get_partitions,
+                                            month_start,
+                                            partition_name)
+from library_api_service.testing import QueryCountAssertionsMixin
+from library_api_service.throttling import get_token_buckets
+from payments.models import Payment
+from payments.tasks import create_batch_checkout_session
+from users.tests import throttle_rates
 
 BORROWINGS_URL = reverse("borrowings:borrowings-list")
+BORROWINGS_EXPORT_URL = reverse("borrowings:borrowings-export")
+CHECKOUT_URL = reverse("borrowings:borrowings-checkout")
+BULK_RETURN_URL = reverse("borrowings:borrowings-bulk-return")
+STATS_URL = reverse("borrowings:borrowings-stats")
 
 user_model = get_user_model()
 
@@ -34,6 +67,39 @@ def sample_borrowing(client: user_model, book: Book = None):
     )
 
 
+PARTITION_INDEXES = """
+SELECT child.relname, parent.relname
+FROM pg_inherits
+JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent
+JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+WHERE parent.relkind = 'I'
+ORDER BY length(child.relname) DESC
+"""
+
+
+def explain_indexed(queryset, disable=("seqscan",)) -> str:
+    """
+    EXPLAIN ``queryset`` with sequential scans (and any other plan nodes
+    in ``disable``) turned off for the current transaction, so tiny test
+    tables still show which index is usable.
+
+    Indexes of partitions are reported by their parent index's name.
+    """
+    with connection.cursor() as cursor:
+        for node in disable:
+            cursor.execute(f"SET LOCAL enable_{node} = off")
+
+        cursor.execute(PARTITION_INDEXES)
+        partition_indexes = cursor.fetchall()
+
+    plan = queryset.explain()
+
+    for name, parent_name in partition_indexes:
+        plan = plan.replace(name, parent_name)
+
+    return plan
+
+
 class UnauthenticatedBorrowingsTest(TestCase):
     def setUp(self):
 
@@ -96,7 +162,7 @@ class AuthenticatedBorrowingsTest(TestCase):
         serializers = BorrowingSerializer(users_borrowings, many=True)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializers.data)
+        self.assertEqual(response.data["results"], serializers.data)
 
     def test_user_id_filter_unauthorized(self):
         sample_borrowing(client=self.user)
@@ -119,6 +185,85 @@ class AuthenticatedBorrowingsTest(TestCase):
             response.data["detail"],
             "You don't have permission to view this borrowing.")
 
+    def test_export_ndjson_honours_queryset_filters(self):
+        active = sample_borrowing(client=self.user)
+        returned = sample_borrowing(client=self.user)
+        returned.actual_return_date = date.today()
+        returned.save()
+
+        other_user = user_model.objects.create_user(
+            email="other@example.com",
+            password="password",
+        )
+        sample_borrowing(client=other_user)
+
+        response = self.client.get(
+            BORROWINGS_EXPORT_URL,
+            {
+                "is_active": "true",
+            }
+        )
+
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(
+            rows,
+            [
+                {
+                    "id": active.id,
+                    "borrow_date": str(active.borrow_date),
+                    "expected_return_date": str(active.expected_return_date),
+                    "actual_return_date": None,
+                    "book": active.book_id,
+                    "user": self.user.id,
+                }
+            ]
+        )
+
+    def test_fields_param_trims_output(self):
+        sample_borrowing(client=self.user)
+
+        response = self.client.get(BORROWINGS_URL, {"fields": "id,book"})
+
+        self.assertEqual(
+            set(response.data["results"][0]),
+            {"id", "book"}
+        )
+
+    def test_expand_inlines_related_objects_in_constant_queries(self):
+        for _ in range(3):
+            sample_borrowing(client=self.user)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                BORROWINGS_URL,
+                {
+                    "expand": "book,user,payments",
+                }
+            )
+
+        borrowing = response.data["results"][0]
+
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertEqual(borrowing["book"]["title"], "Book 1")
+        self.assertEqual(borrowing["user"]["email"], self.user.email)
+        self.assertEqual(borrowing["payments"], [])
+
+    def test_export_rejects_unknown_format(self):
+        response = self.client.get(
+            BORROWINGS_EXPORT_URL,
+            {
+                "file_format": "xml",
+            }
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_return_book_increase_inventory(self):
         borrowings_obj = sample_borrowing(client=self.user)
         book_obj_before = borrowings_obj.book
@@ -137,6 +282,203 @@ class AuthenticatedBorrowingsTest(TestCase):
             book_obj_after.inventory,
             book_obj_before.inventory + 1)
 
+    def test_exhausted_inventory_conflict(self):
+        book_obj = sample_book()
+        book_obj.inventory = 0
+        book_obj.save()
+
+        response = self.client.post(
+            BORROWINGS_URL,
+            {
+                "expected_return_date": str(date.today()),
+                "book": book_obj.pk,
+            },
+            format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            response.data["detail"],
+            "We don't have enough inventory."
+        )
+        self.assertFalse(Borrowing.objects.filter(book=book_obj).exists())
+
+    @mock.patch("stripe.checkout.Session.create")
+    def test_checkout_several_books(self, session_create):
+        session_create.return_value = SimpleNamespace(
+            id="cs_test_batch",
+            url="https://checkout.stripe.com/c/pay/cs_test_batch",
+        )
+        books = [sample_book(), sample_book(), sample_book()]
+        payload = [
+            {
+                "book": book.pk,
+                "expected_return_date": str(
+                    date.today() + timedelta(days=days)
+                ),
+            }
+            for book, days in zip(books, (1, 2, 3))
+        ]
+
+        with mock.patch.object(
+                create_batch_checkout_session,
+                "delay",
+                create_batch_checkout_session
+        ), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(CHECKOUT_URL, payload, format="json")
+
+        payments = Payment.objects.filter(borrowing__user=self.user)
+        line_items = session_create.call_args.kwargs["line_items"]
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data["borrowings"]), 3)
+        self.assertEqual(
+            [Book.objects.get(pk=book.pk).inventory for book in books],
+            [4, 4, 4]
+        )
+        self.assertEqual(session_create.call_count, 1)
+        self.assertEqual(
+            [item["price_data"]["unit_amount"] for item in line_items],
+            [199, 398, 597]
+        )
+        self.assertEqual(
+            set(payments.values_list("session_id", flat=True)),
+            {"cs_test_batch"}
+        )
+
+    def test_checkout_is_all_or_nothing(self):
+        available = sample_book()
+        exhausted = sample_book()
+        exhausted.inventory = 1
+        exhausted.save()
+        payload = [
+            {"book": book.pk, "expected_return_date": str(date.today())}
+            for book in (available, exhausted, exhausted)
+        ]
+
+        response = self.client.post(CHECKOUT_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Borrowing.objects.exists())
+        self.assertEqual(Book.objects.get(pk=available.pk).inventory, 5)
+        self.assertEqual(Book.objects.get(pk=exhausted.pk).inventory, 1)
+
+    def test_checkout_validates_items(self):
+        book_obj = sample_book()
+
+        empty = self.client.post(CHECKOUT_URL, [], format="json")
+        past = self.client.post(
+            CHECKOUT_URL,
+            [{"book": book_obj.pk, "expected_return_date": "2000-01-01"}],
+            format="json"
+        )
+
+        self.assertEqual(empty.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(past.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Book.objects.get(pk=book_obj.pk).inventory, 5)
+
+    def test_second_return_does_not_restock(self):
+        borrowing_obj = sample_borrowing(client=self.user)
+        stale_copy = Borrowing.objects.get(pk=borrowing_obj.pk)
+
+        self.assertTrue(BorrowingService.return_book(borrowing_obj))
+        self.assertFalse(BorrowingService.return_book(stale_copy))
+        self.assertEqual(
+            Book.objects.get(pk=borrowing_obj.book_id).inventory,
+            5
+        )
+
+    def test_fast_list_matches_serializer_output(self):
+        sample_borrowing(client=self.user)
+        returned = sample_borrowing(client=self.user)
+        returned.actual_return_date = date.today()
+        returned.save()
+
+        fast = self.client.get(BORROWINGS_URL)
+
+        with override_settings(FAST_LIST_SERIALIZATION=False):
+            slow = self.client.get(BORROWINGS_URL)
+
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_fast_list_falls_back_for_expanded_fields(self):
+        sample_borrowing(client=self.user)
+
+        response = self.client.get(BORROWINGS_URL, {"expand": "book"})
+
+        self.assertEqual(
+            response.data["results"][0]["book"]["title"],
+            "Book 1"
+        )
+
+
+class BorrowingQueryBudgetTest(QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+        self.client.force_authenticate(self.user)
+
+    def add_borrowings(self, count):
+        for _ in range(count):
+            Payment.objects.create(
+                type=Payment.TypeChoices.PAYMENT,
+                borrowing=sample_borrowing(client=self.user),
+                money_to_paid=1,
+            )
+
+    def test_list_query_count_is_constant(self):
+        self.assertQueryCountConstant(
+            lambda: self.client.get(BORROWINGS_URL),
+            self.add_borrowings,
+        )
+
+    def test_expanded_list_query_count_is_constant(self):
+        self.assertQueryCountConstant(
+            lambda: self.client.get(
+                BORROWINGS_URL,
+                {"expand": "book,user,payments"}
+            ),
+            self.add_borrowings,
+        )
+
+    def test_detail_query_count_is_constant(self):
+        borrowing_obj = sample_borrowing(client=self.user)
+
+        def add_payments(count):
+            for _ in range(count):
+                Payment.objects.create(
+                    type=Payment.TypeChoices.PAYMENT,
+                    borrowing=borrowing_obj,
+                    money_to_paid=1,
+                )
+
+        self.assertQueryCountConstant(
+            lambda: self.client.get(
+                reverse(
+                    "borrowings:borrowings-detail",
+                    args=[borrowing_obj.pk]
+                )
+            ),
+            add_payments,
+        )
+
+    def test_detail_does_not_load_owner(self):
+        borrowing_obj = sample_borrowing(client=self.user)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse(
+                    "borrowings:borrowings-detail",
+                    args=[borrowing_obj.pk]
+                )
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
 
 class AdminBorrowingsTest(TestCase):
     def setUp(self):
@@ -167,3 +509,705 @@ class AdminBorrowingsTest(TestCase):
         )
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_bulk_return(self):
+        book_obj = sample_book()
+        on_time = sample_borrowing(client=self.user, book=book_obj)
+        overdue = sample_borrowing(client=self.user, book=book_obj)
+        Borrowing.objects.filter(pk=overdue.pk).update(
+            expected_return_date=date.today() - timedelta(days=3)
+        )
+        returned = sample_borrowing(client=self.user)
+        Borrowing.objects.filter(pk=returned.pk).update(
+            actual_return_date=date.today()
+        )
+
+        with mock.patch(
+                "stripe.checkout.Session.create") as session_create, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                BULK_RETURN_URL,
+                {"ids": [on_time.pk, overdue.pk, returned.pk, 999999]},
+                format="json"
+            )
+
+        fine = Payment.objects.get(borrowing=overdue)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"],
+            {
+                on_time.pk: {"status": "returned", "fine_payment_id": None},
+                overdue.pk: {
+                    "status": "returned",
+                    "fine_payment_id": fine.pk,
+                },
+                returned.pk: {"status": "already_returned"},
+                999999: {"status": "not_found"},
+            }
+        )
+        self.assertEqual(Book.objects.get(pk=book_obj.pk).inventory, 5)
+        self.assertEqual(str(fine.money_to_paid), "5.97")
+        self.assertEqual(fine.type, Payment.TypeChoices.FINE)
+        self.assertFalse(
+            Payment.objects.filter(borrowing=on_time).exists()
+        )
+        # The fine's checkout session waits until it is asked for.
+        session_create.assert_not_called()
+        self.assertIsNone(fine.session_id)
+
+    def test_bulk_return_query_count_is_flat(self):
+        def bulk_return(count):
+            ids = [
+                sample_borrowing(client=self.user).pk
+                for _ in range(count)
+            ]
+
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(BULK_RETURN_URL, {"ids": ids}, format="json")
+
+            return len(queries)
+
+        self.assertEqual(bulk_return(2), bulk_return(20))
+
+    def test_bulk_return_admin_only(self):
+        regular_user = user_model.objects.create_user(
+            email="user@example.com",
+            password="password",
+        )
+        self.client.force_authenticate(regular_user)
+
+        response = self.client.post(
+            BULK_RETURN_URL,
+            {"ids": [1]},
+            format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class DailyStatsTest(QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = user_model.objects.create_user(
+            email="admin@admin.com",
+            password="password",
+            is_staff=True,
+        )
+        self.client.force_authenticate(self.admin)
+
+    def add_activity(self, count):
+        for _ in range(count):
+            borrowing = sample_borrowing(client=self.admin)
+            Payment.objects.create(
+                type=Payment.TypeChoices.PAYMENT,
+                status=Payment.StatusChoices.PAID,
+                borrowing=borrowing,
+                money_to_paid=2,
+            )
+            Borrowing.objects.filter(pk=borrowing.pk).update(
+                actual_return_date=date.today()
+            )
+            Payment.objects.create(
+                type=Payment.TypeChoices.FINE,
+                borrowing=borrowing,
+                money_to_paid=1,
+            )
+
+    def test_rollup_counts_the_day(self):
+        self.add_activity(2)
+        yesterday = date.today() - timedelta(days=1)
+        Payment.objects.update(paid_at=None)
+        Payment.objects.filter(type=Payment.TypeChoices.PAYMENT).update(
+            paid_at=F("created_at") - timedelta(days=1)
+        )
+
+        rollup_daily_stats()
+        rollup_daily_stats(1)
+
+        today_stats = DailyStats.objects.get(day=date.today())
+        self.assertEqual(
+            (
+                today_stats.borrowings_created,
+                today_stats.borrowings_returned,
+                today_stats.payments_created,
+                today_stats.payments_paid,
+                today_stats.fines_created,
+                today_stats.fines_paid,
+                today_stats.revenue,
+            ),
+            (2, 2, 2, 0, 2, 0, 0)
+        )
+        self.assertEqual(DailyStats.objects.get(day=yesterday).revenue, 4)
+
+    def test_rollup_replaces_the_days_row(self):
+        self.add_activity(1)
+        DailyStatsService.rollup(date.today())
+        self.add_activity(1)
+        DailyStatsService.rollup(date.today())
+
+        stats = DailyStats.objects.get()
+        self.assertEqual(stats.borrowings_created, 2)
+        self.assertEqual(stats.revenue, 4)
+
+    def test_rollup_query_count_is_constant(self):
+        self.assertQueryCountConstant(
+            lambda: DailyStatsService.rollup(date.today()),
+            self.add_activity,
+        )
+
+    def test_stats_for_admins_only(self):
+        client = APIClient()
+        client.force_authenticate(
+            user_model.objects.create_user(
+                email="test_user@example.com",
+                password="password",
+            )
+        )
+
+        response = client.get(STATS_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_stats_by_day(self):
+        self.add_activity(1)
+        DailyStatsService.rollup(date.today())
+        DailyStatsService.rollup(date.today() - timedelta(days=40))
+
+        response = self.client.get(STATS_URL)
+        older = self.client.get(
+            STATS_URL,
+            {"date_from": str(date.today() - timedelta(days=40))}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row["day"], row["revenue"]) for row in response.data],
+            [(str(date.today()), "2.00")]
+        )
+        self.assertEqual(len(older.data), 2)
+
+    def test_stats_range_is_bounded(self):
+        for params in (
+                {"date_from": "2026-01-02", "date_to": "2026-01-01"},
+                {"date_from": "2020-01-01", "date_to": "2026-01-01"}):
+            response = self.client.get(STATS_URL, params)
+
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST
+            )
+
+
+class BorrowingIndexTest(TestCase):
+    def setUp(self):
+        self.user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+        sample_borrowing(client=self.user)
+
+    def assertUsesIndex(self, queryset, index_name, **kwargs):
+        self.assertIn(index_name, explain_indexed(queryset, **kwargs))
+
+    def test_returned_on_day(self):
+        self.assertUsesIndex(
+            Borrowing.objects.filter(actual_return_date=date.today()),
+            "borrowings_returned_idx"
+        )
+
+    def test_active_borrowings_of_user(self):
+        self.assertUsesIndex(
+            Borrowing.objects.filter(
+                user=self.user,
+                actual_return_date__isnull=True,
+            ).order_by("id")[:20],
+            "borrowings_user_active_idx"
+        )
+
+    def test_borrowings_of_user(self):
+        self.assertUsesIndex(
+            Borrowing.objects.filter(user=self.user).order_by("id")[:20],
+            "borrowings_user_id_idx"
+        )
+
+    def test_active_borrowings(self):
+        self.assertUsesIndex(
+            Borrowing.objects.filter(
+                actual_return_date__isnull=True,
+            ).order_by("id")[:20],
+            "borrowings_active_idx",
+            # Admins page through all active borrowings in id order.
+            disable=("seqscan", "sort"),
+        )
+
+    def add_history(self):
+        """
+        With a row or two every index costs the same, so give the
+        planner not-yet-due borrowings made over the past 200 days.
+        """
+        book = sample_book()
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(
+                expected_return_date=date.today() + timedelta(days=14),
+                book=book,
+                user=self.user,
+            )
+            for _ in range(200)
+        )
+
+        for days, borrowing in enumerate(borrowings, start=1):
+            borrowing.borrow_date = date.today() - timedelta(days=days)
+
+        Borrowing.objects.bulk_update(borrowings, ["borrow_date"])
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE borrowings_borrowing")
+
+    def test_overdue_borrowings(self):
+        self.add_history()
+        self.assertUsesIndex(
+            Borrowing.objects.filter(
+                expected_return_date__lt=date.today(),
+                actual_return_date__isnull=True,
+            ),
+            "borrowings_overdue_idx"
+        )
+
+    def test_borrowings_of_the_day(self):
+        self.add_history()
+        self.assertUsesIndex(
+            Borrowing.objects.filter(borrow_date=date.today()),
+            "borrowings_borrow_date_idx"
+        )
+
+
+class BorrowingIdempotencyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book()
+        self.payload = {
+            "expected_return_date": str(date.today()),
+            "book": self.book.pk,
+        }
+
+    def post(self, url, payload, key="key-1"):
+        return self.client.post(
+            url, payload, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retried_create_is_replayed(self):
+        first = self.post(BORROWINGS_URL, self.payload)
+
+        with self.assertNumQueries(0):
+            retry = self.post(BORROWINGS_URL, self.payload)
+
+        self.book.refresh_from_db()
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Borrowing.objects.count(), 1)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(self.book.inventory, 4)
+
+    def test_different_keys_create_separate_borrowings(self):
+        self.post(BORROWINGS_URL, self.payload, key="key-1")
+        self.post(BORROWINGS_URL, self.payload, key="key-2")
+
+        self.assertEqual(Borrowing.objects.count(), 2)
+
+    def test_requests_without_key_are_not_replayed(self):
+        self.client.post(BORROWINGS_URL, self.payload, format="json")
+        self.client.post(BORROWINGS_URL, self.payload, format="json")
+
+        self.assertEqual(Borrowing.objects.count(), 2)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.post(BORROWINGS_URL, self.payload)
+        response = self.post(
+            BORROWINGS_URL,
+            {**self.payload, "book": sample_book().pk},
+        )
+
+        self.assertEqual(
+            response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+        self.assertEqual(Borrowing.objects.count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        self.post(BORROWINGS_URL, self.payload)
+        self.client.force_authenticate(
+            user_model.objects.create_user(
+                email="other_user@example.com",
+                password="password",
+            )
+        )
+        response = self.post(BORROWINGS_URL, self.payload)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Borrowing.objects.count(), 2)
+
+    def test_too_long_key_is_rejected(self):
+        response = self.post(BORROWINGS_URL, self.payload, key="k" * 256)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Borrowing.objects.exists())
+
+    def test_retried_return_is_replayed(self):
+        borrowing = sample_borrowing(client=self.user, book=self.book)
+        url = reverse(
+            "borrowings:borrowings-return-borrowing",
+            args=[borrowing.pk]
+        )
+
+        first = self.post(url, {})
+        retry = self.post(url, {})
+
+        self.book.refresh_from_db()
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry.data["detail"], "Returned successfully.")
+        self.assertEqual(self.book.inventory, 5)
+
+    def test_retried_checkout_is_replayed(self):
+        payload = [self.payload, {**self.payload, "book": sample_book().pk}]
+
+        first = self.post(CHECKOUT_URL, payload)
+        retry = self.post(CHECKOUT_URL, payload)
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Borrowing.objects.count(), 2)
+
+
+@override_settings(THROTTLE_REDIS_URL=None)
+class BorrowingThrottleTest(TestCase):
+    def setUp(self):
+        get_token_buckets().reset()
+        self.client = APIClient()
+        self.user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+        self.client.force_authenticate(self.user)
+
+    @throttle_rates(borrowings_write="2/min")
+    def test_borrowing_writes_are_throttled_per_user(self):
+        book = sample_book()
+        payload = {
+            "expected_return_date": str(date.today()),
+            "book": book.pk,
+        }
+
+        for _ in range(2):
+            self.client.post(BORROWINGS_URL, payload, format="json")
+
+        response = self.client.post(BORROWINGS_URL, payload, format="json")
+
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertIn("Retry-After", response)
+        self.assertEqual(Borrowing.objects.count(), 2)
+        # Reads only count against the general per-user rate.
+        self.assertEqual(
+            self.client.get(BORROWINGS_URL).status_code, status.HTTP_200_OK
+        )
+
+
+class BorrowingPartitionTest(TestCase):
+    month = date(2030, 1, 1)
+
+    def setUp(self):
+        self.user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+        create_partitions(connection, 1, today=self.month)
+
+    def sample_borrowing_in(self, borrow_date):
+        borrowing = sample_borrowing(client=self.user)
+        # Updating the partition key moves the row to its new partition.
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            borrow_date=borrow_date
+        )
+        borrowing.refresh_from_db()
+
+        return borrowing
+
+    def partition_of(self, table, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT tableoid::regclass::text FROM {table} WHERE id = %s",
+                [pk],
+            )
+            return cursor.fetchone()[0]
+
+    def assertScansOnly(self, queryset, partition):
+        plan = queryset.explain()
+
+        self.assertIn(f"{partition} ", plan)
+
+        table = queryset.model._meta.db_table
+
+        for other in get_partitions(connection, table):
+            if other.name != partition:
+                self.assertNotIn(f"{other.name} ", plan)
+
+    def flush_deferred_checks(self):
+        # TestCase never commits, and Postgres won't detach a partition
+        # with foreign key checks still queued against it.
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+    def test_borrowing_lands_in_its_month(self):
+        borrowing = self.sample_borrowing_in(date(2030, 1, 20))
+
+        self.assertEqual(
+            self.partition_of(BORROWINGS_TABLE, borrowing.pk),
+            partition_name(BORROWINGS_TABLE, self.month),
+        )
+        self.assertEqual(Borrowing.objects.get(pk=borrowing.pk), borrowing)
+
+    def test_borrowing_past_the_partitions_lands_in_default(self):
+        borrowing = self.sample_borrowing_in(date(2031, 3, 5))
+
+        self.assertEqual(
+            self.partition_of(BORROWINGS_TABLE, borrowing.pk),
+            default_partition_name(BORROWINGS_TABLE),
+        )
+
+    def test_missed_months_take_their_rows_from_default(self):
+        # The daily job stopped before March and runs again in June.
+        march = date(2031, 3, 1)
+        borrowing = self.sample_borrowing_in(date(2031, 3, 5))
+        payment = Payment.objects.create(
+            type=Payment.TypeChoices.PAYMENT,
+            borrowing=borrowing,
+            money_to_paid=2,
+        )
+
+        with self.assertLogs("library_api_service.partitions") as logs:
+            created = create_partitions(
+                connection, 0, today=date(2031, 6, 1)
+            )
+
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual(
+            created,
+            [
+                partition_name(table, add_months(march, offset))
+                for offset in range(4)
+                for table in (BORROWINGS_TABLE, PAYMENTS_TABLE)
+            ],
+        )
+        self.assertEqual(
+            self.partition_of(BORROWINGS_TABLE, borrowing.pk),
+            partition_name(BORROWINGS_TABLE, march),
+        )
+        self.assertEqual(
+            self.partition_of(PAYMENTS_TABLE, payment.pk),
+            partition_name(PAYMENTS_TABLE, march),
+        )
+        self.assertEqual(
+            Payment.objects.get(pk=payment.pk).borrowing, borrowing
+        )
+
+    def test_borrow_date_filter_prunes_partitions(self):
+        self.assertScansOnly(
+            Borrowing.objects.filter(
+                borrow_date__gte=self.month,
+                borrow_date__lt=date(2030, 2, 1),
+            ),
+            "borrowings_borrowing_2030_01",
+        )
+
+    def test_payment_follows_its_borrowing(self):
+        borrowing = self.sample_borrowing_in(date(2030, 1, 20))
+        payment = Payment.objects.create(
+            type=Payment.TypeChoices.PAYMENT,
+            borrowing=borrowing,
+            money_to_paid=2,
+        )
+
+        self.assertEqual(payment.borrow_date, borrowing.borrow_date)
+        self.assertScansOnly(
+            Payment.objects.filter(borrow_date=payment.borrow_date),
+            "payments_payment_2030_01",
+        )
+
+    def test_command_creates_missing_partitions_once(self):
+        first, second = StringIO(), StringIO()
+
+        call_command("manage_partitions", months_ahead=6, stdout=first)
+        call_command("manage_partitions", months_ahead=6, stdout=second)
+
+        self.assertIn(
+            partition_name(
+                BORROWINGS_TABLE, add_months(month_start(date.today()), 6)
+            ),
+            first.getvalue(),
+        )
+        self.assertIn("Created 0 partitions", second.getvalue())
+
+    def test_command_archives_returned_history(self):
+        borrowing = sample_borrowing(client=self.user)
+        Payment.objects.create(
+            type=Payment.TypeChoices.PAYMENT,
+            status=Payment.StatusChoices.PAID,
+            borrowing=borrowing,
+            money_to_paid=2,
+        )
+        BorrowingService.return_book(borrowing)
+        history, *_ = get_partitions(connection, BORROWINGS_TABLE)
+        self.flush_deferred_checks()
+
+        call_command(
+            "manage_partitions",
+            detach_before=history.end,
+            archive_schema="archive",
+            stdout=StringIO(),
+        )
+
+        self.assertFalse(Borrowing.objects.exists())
+        self.assertFalse(Payment.objects.exists())
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM archive.borrowings_borrowing_history"
+            )
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_command_keeps_partitions_with_active_borrowings(self):
+        sample_borrowing(client=self.user)
+        history, *_ = get_partitions(connection, BORROWINGS_TABLE)
+        self.flush_deferred_checks()
+
+        with self.assertRaises(CommandError):
+            call_command(
+                "manage_partitions",
+                detach_before=history.end,
+                stdout=StringIO(),
+            )
+
+        self.assertTrue(Borrowing.objects.exists())
+
+
+class ConcurrentInventoryTest(TransactionTestCase):
+    workers = 16
+    requests = 64
+
+    def setUp(self):
+        self.user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+        self.book = sample_book()
+
+    def run_concurrently(self, func):
+        barrier = threading.Barrier(self.workers)
+
+        def worker(_):
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                pass
+
+            try:
+                with transaction.atomic():
+                    func()
+                return True
+            except InventoryExhausted:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            return list(executor.map(worker, range(self.requests)))
+
+    def test_concurrent_checkouts_never_oversell(self):
+        def checkout():
+            Borrowing.objects.create(
+                expected_return_date=date.today(),
+                book_id=self.book.pk,
+                user=self.user,
+            )
+
+        results = self.run_concurrently(checkout)
+
+        self.book.refresh_from_db()
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(self.book.inventory, 0)
+        self.assertEqual(Borrowing.objects.count(), 5)
+
+    def test_overlapping_carts_do_not_deadlock(self):
+        other_book = sample_book()
+        carts = iter(
+            [[self.book.pk, other_book.pk], [other_book.pk, self.book.pk]]
+            * (self.requests // 2)
+        )
+        lock = threading.Lock()
+
+        def checkout():
+            with lock:
+                cart = next(carts)
+            BorrowingService.take_books(cart)
+
+        results = self.run_concurrently(checkout)
+
+        self.book.refresh_from_db()
+        other_book.refresh_from_db()
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual((self.book.inventory, other_book.inventory), (0, 0))
+
+    def test_concurrent_duplicate_requests_create_one_borrowing(self):
+        cache.clear()
+        barrier = threading.Barrier(self.workers)
+
+        def post(_):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+
+            try:
+                return client.post(
+                    BORROWINGS_URL,
+                    {
+                        "expected_return_date": str(date.today()),
+                        "book": self.book.pk,
+                    },
+                    format="json",
+                    HTTP_IDEMPOTENCY_KEY="same-key",
+                )
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            responses = list(executor.map(post, range(self.workers)))
+
+        self.book.refresh_from_db()
+        self.assertEqual(
+            {response.status_code for response in responses},
+            {status.HTTP_201_CREATED},
+        )
+        self.assertEqual(
+            sum("Idempotent-Replayed" in response for response in responses),
+            self.workers - 1,
+        )
+        self.assertEqual(Borrowing.objects.count(), 1)
+        self.assertEqual(self.book.inventory, 4)
+
+    def test_concurrent_returns_lose_no_increments(self):
+        self.run_concurrently(
+            lambda: BorrowingService.put_back_book(self.book.pk)
+        )
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 5 + self.requests)
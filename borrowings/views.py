@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import transaction
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (OpenApiExample,
@@ -6,17 +7,33 @@ from drf_spectacular.utils import (OpenApiExample,
 from rest_framework import status, mixins, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
-from borrowings.models import Borrowing
+from borrowings.models import Borrowing, DailyStats
 from borrowings.serializers import (BorrowingSerializer,
-                                    BorrowingDetailSerializer)
+                                    BorrowingBulkReturnSerializer,
+                                    BorrowingDetailSerializer,
+                                    DailyStatsQuerySerializer,
+                                    DailyStatsSerializer)
+from borrowings.services import BorrowingService
+from borrowings.signals import borrowings_checked_out
+from library_api_service.exports import StreamingExportMixin
+from library_api_service.fast_serializers import FastListMixin
+from library_api_service.idempotency import (IDEMPOTENCY_PARAMETERS,
+                                             IdempotencyMixin)
+from library_api_service.sparse_fields import (SPARSE_FIELDS_PARAMETERS,
+                                               SparseFieldsViewMixin)
 from payments.services import PaymentService
 
 
-class BorrowingViewSet(mixins.ListModelMixin,
+class BorrowingViewSet(IdempotencyMixin,
+                       StreamingExportMixin,
+                       SparseFieldsViewMixin,
+                       FastListMixin,
+                       mixins.ListModelMixin,
                        mixins.CreateModelMixin,
                        mixins.RetrieveModelMixin,
                        viewsets.GenericViewSet,
@@ -24,6 +41,41 @@ class BorrowingViewSet(mixins.ListModelMixin,
     serializer_class = BorrowingSerializer
     permission_classes = (IsAuthenticated,)
     authentication_classes = (JWTAuthentication, )
+    query_budget = {
+        "list": 4,
+        "retrieve": 4,
+        "create": 11,
+        # Validation looks up each item's book: bounded by the cart size.
+        "checkout": 10 + settings.BORROWING_CHECKOUT_MAX_BOOKS,
+        "return_borrowing": 10,
+        "bulk_return": 10,
+        "stats": 3,
+    }
+    throttle_scope = {
+        "create": "borrowings_write",
+        "checkout": "borrowings_write",
+        "return_borrowing": "borrowings_write",
+    }
+    export_filename = "borrowings"
+    export_fields = {
+        "id": "id",
+        "borrow_date": "borrow_date",
+        "expected_return_date": "expected_return_date",
+        "actual_return_date": "actual_return_date",
+        "book": "book_id",
+        "user": "user_id",
+    }
+
+    def get_payment_response_data(self, payment):
+
+        return {
+            "payment_session_url": payment.session_url,
+            "payment_status_url": reverse(
+                "payments:payments-checkout-session",
+                args=[payment.pk],
+                request=self.request,
+            ),
+        }
 
     def perform_create(self, serializer):
         with transaction.atomic():
@@ -32,25 +84,29 @@ class BorrowingViewSet(mixins.ListModelMixin,
             )
             payment = PaymentService.create_base_payment(borrowing)
 
-            self.extra_response_data = {
-                "payment_session_url": payment.session_url}
+        self.extra_response_data = self.get_payment_response_data(payment)
 
     @extend_schema(
         summary="Create a borrowing",
         description=(
                 "Create a new borrowing for the authenticated user.\n\n"
                 "Rules:\n"
-                "- Book must be available in inventory\n"
+                "- Book must be available in inventory "
+                "(409 once the last copy is taken)\n"
                 "- Expected return date must be today or later\n\n"
                 "Side effects:\n"
-                "- Creates a payment session\n"
-                "- Returns payment_session_url in response"
+                "- Creates a pending payment; its Stripe checkout session "
+                "is created when payment_status_url is first requested\n"
+                "- Returns payment_session_url (null) and "
+                "payment_status_url, which returns the session"
         ),
         request=BorrowingSerializer,
+        parameters=IDEMPOTENCY_PARAMETERS,
         responses={
             201: BorrowingSerializer,
             400: OpenApiTypes.OBJECT,
             401: OpenApiTypes.OBJECT,
+            409: OpenApiTypes.OBJECT,
         },
         examples=[
             OpenApiExample(
@@ -62,7 +118,9 @@ class BorrowingViewSet(mixins.ListModelMixin,
                     "actual_return_date": None,
                     "book": 3,
                     "user": 5,
-                    "payment_session_url": "https://checkout.stripe.com/..."
+                    "payment_session_url": None,
+                    "payment_status_url":
+                        "http://localhost/api/payments/1/checkout-session/"
                 },
                 response_only=True,
                 status_codes=["201"],
@@ -70,12 +128,10 @@ class BorrowingViewSet(mixins.ListModelMixin,
             OpenApiExample(
                 name="No inventory",
                 value={
-                    "non_field_errors": [
-                        "We don't have enough inventory."
-                    ]
+                    "detail": "We don't have enough inventory."
                 },
                 response_only=True,
-                status_codes=["400"],
+                status_codes=["409"],
             ),
             OpenApiExample(
                 name="Invalid return date",
@@ -90,6 +146,11 @@ class BorrowingViewSet(mixins.ListModelMixin,
         ],
     )
     def create(self, request, *args, **kwargs):
+        return self.idempotent_response(
+            request, self.create_borrowing, *args, **kwargs
+        )
+
+    def create_borrowing(self, request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
 
         if hasattr(self, "extra_response_data"):
@@ -97,6 +158,104 @@ class BorrowingViewSet(mixins.ListModelMixin,
 
         return response
 
+    @extend_schema(
+        summary="Borrow several books at once",
+        description=(
+                "Create one borrowing per item of a JSON array of "
+                "`{book, expected_return_date}` objects, all or nothing.\n\n"
+                "Rules:\n"
+                "- Every book must be available in inventory "
+                "(409 otherwise, nothing is borrowed)\n"
+                "- Expected return dates must be today or later\n"
+                "- At most BORROWING_CHECKOUT_MAX_BOOKS items\n\n"
+                "Side effects:\n"
+                "- Creates one pending payment per borrowing, all paid "
+                "through a single Stripe checkout session\n"
+                "- Returns payment_session_url (null until the session "
+                "exists) and payment_status_url to poll for it"
+        ),
+        request=BorrowingSerializer(many=True),
+        parameters=IDEMPOTENCY_PARAMETERS,
+        responses={
+            201: OpenApiTypes.OBJECT,
+            400: OpenApiTypes.OBJECT,
+            401: OpenApiTypes.OBJECT,
+            409: OpenApiTypes.OBJECT,
+        },
+        examples=[
+            OpenApiExample(
+                name="Two books",
+                value=[
+                    {"book": 3, "expected_return_date": "2025-12-25"},
+                    {"book": 8, "expected_return_date": "2025-12-20"},
+                ],
+                request_only=True,
+            ),
+            OpenApiExample(
+                name="Successful checkout",
+                value={
+                    "borrowings": [
+                        {
+                            "id": 1,
+                            "borrow_date": "2025-12-18",
+                            "expected_return_date": "2025-12-25",
+                            "actual_return_date": None,
+                            "book": 3,
+                            "user": 5,
+                        },
+                        {
+                            "id": 2,
+                            "borrow_date": "2025-12-18",
+                            "expected_return_date": "2025-12-20",
+                            "actual_return_date": None,
+                            "book": 8,
+                            "user": 5,
+                        },
+                    ],
+                    "payment_session_url": None,
+                    "payment_status_url":
+                        "http://localhost/api/payments/1/checkout-session/"
+                },
+                response_only=True,
+                status_codes=["201"],
+            ),
+        ],
+    )
+    @action(detail=False, methods=["post"], url_path="checkout")
+    def checkout(self, request):
+        return self.idempotent_response(request, self.checkout_borrowings)
+
+    def checkout_borrowings(self, request):
+        serializer = self.get_serializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=settings.BORROWING_CHECKOUT_MAX_BOOKS,
+        )
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            borrowings = BorrowingService.checkout(
+                request.user, serializer.validated_data
+            )
+            payments = PaymentService.create_batch_payments(borrowings)
+            borrowings_checked_out.send(
+                sender=Borrowing,
+                user=request.user,
+                borrowings=borrowings,
+            )
+
+        # Set already if the checkout task ran inline on commit.
+        payments[0].refresh_from_db(fields=["session_url"])
+
+        return Response(
+            {
+                "borrowings": self.get_serializer(borrowings, many=True).data,
+                **self.get_payment_response_data(payments[0]),
+            },
+            status=status.HTTP_201_CREATED
+        )
+
     @extend_schema(
         summary="Return borrowed book",
         description=(
@@ -105,13 +264,16 @@ class BorrowingViewSet(mixins.ListModelMixin,
                 "- Users can return only their own borrowings\n"
                 "- If the borrowing is "
                 "already returned, an error is returned\n"
-                "- If the borrowing is overdue, "
-                "a fine payment session is created\n\n"
+                "- If the borrowing is overdue, its fine (accrued "
+                "nightly while overdue) is settled at the final amount; "
+                "its checkout session is created when payment_status_url "
+                "is first requested\n\n"
                 "Side effects:\n"
                 "- Sets actual return date\n"
                 "- Increases book inventory\n"
                 "- Creates fine payment if needed"
         ),
+        parameters=IDEMPOTENCY_PARAMETERS,
         responses={
             200: OpenApiTypes.OBJECT,
             400: OpenApiTypes.OBJECT,
@@ -132,7 +294,9 @@ class BorrowingViewSet(mixins.ListModelMixin,
                 value={
                     "detail": "Returned successfully.",
                     "payments": "Please pay the fine.",
-                    "payment_session_url": "https://checkout.stripe.com/..."
+                    "payment_session_url": None,
+                    "payment_status_url":
+                        "http://localhost/api/payments/2/checkout-session/"
                 },
                 response_only=True,
                 status_codes=["200"],
@@ -157,9 +321,12 @@ class BorrowingViewSet(mixins.ListModelMixin,
     )
     @action(detail=True, methods=["post"], url_path="return")
     def return_borrowing(self, request, pk=None):
+        return self.idempotent_response(request, self.return_book, pk=pk)
+
+    def return_book(self, request, pk=None):
         borrowing_obj = self.get_object()
 
-        if not borrowing_obj.user == self.request.user:
+        if borrowing_obj.user_id != self.request.user.pk:
             return Response(
                 {"detail": "You don't have permission to do this."},
                 status=status.HTTP_403_FORBIDDEN
@@ -172,10 +339,12 @@ class BorrowingViewSet(mixins.ListModelMixin,
             )
 
         with transaction.atomic():
-            borrowing_obj.set_actual_return_date()
-            book_obj = borrowing_obj.book
-            book_obj.inventory += 1
-            book_obj.save()
+            if not BorrowingService.return_book(borrowing_obj):
+                return Response(
+                    {"detail": "Already returned."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
             payment_fine = PaymentService.create_fine_payment(borrowing_obj)
 
         message = {
@@ -184,15 +353,154 @@ class BorrowingViewSet(mixins.ListModelMixin,
 
         if payment_fine:
             message["payments"] = "Please pay the fine."
-            message["payment_session_url"] = payment_fine.session_url
+            message.update(self.get_payment_response_data(payment_fine))
 
         return Response(message, status=status.HTTP_200_OK)
 
+    @extend_schema(
+        summary="Return many borrowings (admin)",
+        description=(
+                "Process a batch of returns, e.g. from a drop box.\n\n"
+                "Every still-active borrowing in **ids** is returned "
+                "today, its book restocked and, if overdue, its fine "
+                "settled at the final amount.\n\n"
+                "The response maps each requested id to **returned**, "
+                "**already_returned** or **not_found**."
+        ),
+        request=BorrowingBulkReturnSerializer,
+        parameters=IDEMPOTENCY_PARAMETERS,
+        responses={
+            200: OpenApiTypes.OBJECT,
+            400: OpenApiTypes.OBJECT,
+            403: OpenApiTypes.OBJECT,
+        },
+        examples=[
+            OpenApiExample(
+                name="Mixed batch",
+                value={
+                    "results": {
+                        "11": {
+                            "status": "returned",
+                            "fine_payment_id": None,
+                        },
+                        "12": {
+                            "status": "returned",
+                            "fine_payment_id": 40,
+                        },
+                        "13": {
+                            "status": "already_returned",
+                        },
+                        "99": {
+                            "status": "not_found",
+                        },
+                    }
+                },
+                response_only=True,
+                status_codes=["200"],
+            ),
+        ],
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk-return",
+        permission_classes=[IsAdminUser],
+    )
+    def bulk_return(self, request):
+        return self.idempotent_response(request, self.return_books)
+
+    def return_books(self, request):
+        serializer = BorrowingBulkReturnSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        borrowing_ids = list(dict.fromkeys(serializer.validated_data["ids"]))
+
+        with transaction.atomic():
+            returned = BorrowingService.return_books(borrowing_ids)
+            fines = PaymentService.create_fine_payments(returned)
+
+        returned = set(returned)
+        already_returned = set(
+            Borrowing.objects.filter(
+                pk__in=set(borrowing_ids) - returned
+            ).values_list("id", flat=True)
+        )
+        results = {}
+
+        for borrowing_id in borrowing_ids:
+            if borrowing_id in returned:
+                results[borrowing_id] = {
+                    "status": "returned",
+                    "fine_payment_id": fines.get(borrowing_id),
+                }
+            elif borrowing_id in already_returned:
+                results[borrowing_id] = {"status": "already_returned"}
+            else:
+                results[borrowing_id] = {"status": "not_found"}
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary="Daily activity stats (admin)",
+        description=(
+                "Borrowings, returns, payments and revenue per day, from "
+                "the rollup refreshed every 10 minutes. Days without a "
+                "rollup yet are left out.\n\n"
+                "Defaults to the last 30 days; at most "
+                "DAILY_STATS_MAX_DAYS days per request.\n\n"
+                "Permissions:\n"
+                "- Admin users only"
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="date_from",
+                type=OpenApiTypes.DATE,
+                location=OpenApiParameter.QUERY,
+                required=False,
+            ),
+            OpenApiParameter(
+                name="date_to",
+                type=OpenApiTypes.DATE,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description="Defaults to today",
+            ),
+        ],
+        responses={
+            200: DailyStatsSerializer(many=True),
+            400: OpenApiTypes.OBJECT,
+            403: OpenApiTypes.OBJECT,
+        },
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="stats",
+        permission_classes=[IsAdminUser],
+    )
+    def stats(self, request):
+        query = DailyStatsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        stats = DailyStats.objects.filter(
+            day__gte=query.validated_data["date_from"],
+            day__lte=query.validated_data["date_to"],
+        ).order_by("day")
+
+        return Response(
+            DailyStatsSerializer(stats, many=True).data,
+            status=status.HTTP_200_OK
+        )
+
     def get_queryset(self):
         user = self.request.user
         is_user_admin = user.is_superuser or user.is_staff
         queryset = Borrowing.objects.all()
 
+        if self.action == "retrieve":
+            queryset = queryset.prefetch_related("payments")
+        elif self.action == "return_borrowing":
+            # Fine amounts need the book's daily fee.
+            queryset = queryset.select_related("book")
+
         if not is_user_admin:
             queryset = queryset.filter(user=user)
 
@@ -237,6 +545,7 @@ class BorrowingViewSet(mixins.ListModelMixin,
                 "- Regular users can access only their own borrowings\n"
                 "- Admin users can access any borrowing"
         ),
+        parameters=SPARSE_FIELDS_PARAMETERS,
         responses={
             200: BorrowingDetailSerializer,
             403: OpenApiTypes.OBJECT,
@@ -274,7 +583,7 @@ class BorrowingViewSet(mixins.ListModelMixin,
     def retrieve(self, request, *args, **kwargs):
         borrowing_obj = self.get_object()
 
-        if not borrowing_obj.user == self.request.user:
+        if borrowing_obj.user_id != self.request.user.pk:
             return Response(status=status.HTTP_403_FORBIDDEN)
 
         serializer = self.get_serializer(borrowing_obj)
@@ -289,9 +598,18 @@ class BorrowingViewSet(mixins.ListModelMixin,
                 "Filters:\n"
                 "- **is_active=true** → only active borrowings\n"
                 "- **is_active=false** → only returned borrowings\n"
-                "- **user_id** → filter by user (admin only)"
+                "- **user_id** → filter by user (admin only)\n\n"
+                "Results are cursor-paginated; pass **paginate=false** "
+                "for the legacy unpaginated list."
         ),
         parameters=[
+            *SPARSE_FIELDS_PARAMETERS,
+            OpenApiParameter(
+                name="paginate",
+                type=OpenApiTypes.BOOL,
+                required=False,
+                description="Set to false to disable pagination (legacy)",
+            ),
             OpenApiParameter(
                 name="is_active",
                 type=OpenApiTypes.BOOL,
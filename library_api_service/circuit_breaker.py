@@ -0,0 +1,137 @@
+import time
+
+from django.core.cache import cache
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(
+            f"The {name} circuit is open, retry in {retry_after:.0f}s"
+        )
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Stop calling a failing dependency for a while once too many of the
+    calls to it fail.
+
+    Calls and ``failures`` (exception types) are counted in the Django
+    cache over fixed windows of ``window`` seconds, so every worker
+    shares one circuit. Once ``min_calls`` calls in a window see a
+    failure rate of ``failure_rate`` or more the circuit opens, and calls
+    raise ``CircuitOpen`` without running for ``open_seconds``. After
+    that a single trial call is let through: success closes the circuit,
+    failure opens it again.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            failures=(Exception,),
+            failure_rate=0.5,
+            min_calls=20,
+            window=60,
+            open_seconds=30):
+        self.name = name
+        self.failures = failures
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+
+    def key(self, suffix: str) -> str:
+        return f"circuit:{self.name}:{suffix}"
+
+    def window_keys(self, now: float) -> tuple[str, str]:
+        window = int(now // self.window)
+        return self.key(f"calls:{window}"), self.key(f"failures:{window}")
+
+    def get_state(self, now=None) -> tuple[str, float]:
+        """The circuit's state and the seconds until it may close."""
+        now = now or time.time()
+        open_until = cache.get(self.key("open_until"))
+
+        if open_until is None:
+            return CLOSED, 0
+
+        if now < open_until:
+            return OPEN, open_until - now
+
+        return HALF_OPEN, 0
+
+    def call(self, func, *args, **kwargs):
+        now = time.time()
+        state, retry_after = self.get_state(now)
+
+        if state == OPEN:
+            raise CircuitOpen(self.name, retry_after)
+
+        trial = state == HALF_OPEN
+
+        if trial and not cache.add(self.key("trial"), 1, self.open_seconds):
+            # Another worker is making the trial call.
+            raise CircuitOpen(self.name, self.open_seconds)
+
+        try:
+            result = func(*args, **kwargs)
+        except self.failures:
+            self.record(now, failed=True, trial=trial)
+            raise
+        except BaseException:
+            if trial:
+                cache.delete(self.key("trial"))
+            raise
+
+        self.record(now, failed=False, trial=trial)
+
+        return result
+
+    def record(self, now: float, failed: bool, trial: bool):
+        if trial:
+            if failed:
+                self.open(now)
+                cache.delete(self.key("trial"))
+            else:
+                self.reset(now)
+
+            return
+
+        calls_key, failures_key = self.window_keys(now)
+        calls = self.incr(calls_key)
+        failures = self.incr(failures_key) if failed else 0
+
+        if failed and calls >= self.min_calls and \
+                failures / calls >= self.failure_rate:
+            self.open(now)
+
+    def incr(self, key: str) -> int:
+        cache.add(key, 0, self.window * 2)
+        return cache.incr(key)
+
+    def open(self, now: float):
+        cache.set(self.key("open_until"), now + self.open_seconds, None)
+
+    def reset(self, now=None):
+        """Close the circuit and forget the current window's calls."""
+        cache.delete_many([
+            self.key("open_until"),
+            self.key("trial"),
+            *self.window_keys(now or time.time()),
+        ])
+
+    def stats(self) -> dict:
+        now = time.time()
+        state, retry_after = self.get_state(now)
+        calls_key, failures_key = self.window_keys(now)
+
+        return {
+            "state": state,
+            "retry_after": round(retry_after, 1),
+            "calls": cache.get(calls_key, 0),
+            "failures": cache.get(failures_key, 0),
+        }
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+IDEMPOTENCY_PARAMETERS = [
+    OpenApiParameter(
+        name=IDEMPOTENCY_KEY_HEADER,
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.HEADER,
+        required=False,
+        description=(
+            "Unique key for this operation; retries with the same key "
+            "replay the first response instead of repeating it"
+        ),
+    ),
+]
+
+
+def get_request_fingerprint(request) -> str:
+    payload = json.dumps(
+        [request.method, request.path, request.data],
+        cls=DjangoJSONEncoder,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotencyMixin:
+    """
+    Replay the first response to a request sent again with the same
+    ``Idempotency-Key`` header.
+
+    Responses are kept in the Django cache for ``IDEMPOTENCY_KEY_TTL``
+    seconds, keyed by user and key, and replayed without running the
+    handler again. A duplicate that arrives while the first request is
+    still running waits for its response instead of racing it. Raised
+    exceptions and server errors are not stored, so those can be retried.
+    """
+
+    def get_idempotency_cache_key(self, request, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return f"idempotency:{request.user.pk}:{digest}"
+
+    def idempotent_response(self, request, handler, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+
+        if key is None:
+            return handler(request, *args, **kwargs)
+
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return Response(
+                {
+                    "detail": f"{IDEMPOTENCY_KEY_HEADER} must be 1 to "
+                              f"{IDEMPOTENCY_KEY_MAX_LENGTH} characters."
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cache_key = self.get_idempotency_cache_key(request, key)
+        lock_key = f"{cache_key}:lock"
+        fingerprint = get_request_fingerprint(request)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+
+        while True:
+            stored = cache.get(cache_key)
+
+            if stored is not None:
+                return self.replay_response(stored, fingerprint)
+
+            token = uuid.uuid4().hex
+
+            if cache.add(
+                    lock_key, token, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+                break
+
+            if time.monotonic() >= deadline:
+                return Response(
+                    {
+                        "detail": "A request with this "
+                                  f"{IDEMPOTENCY_KEY_HEADER} is still "
+                                  "in progress."
+                    },
+                    status=status.HTTP_409_CONFLICT
+                )
+
+            time.sleep(settings.IDEMPOTENCY_POLL_INTERVAL)
+
+        try:
+            response = handler(request, *args, **kwargs)
+
+            if response.status_code < 500:
+                cache.set(
+                    cache_key,
+                    (fingerprint, response.status_code, response.data),
+                    settings.IDEMPOTENCY_KEY_TTL,
+                )
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+        return response
+
+    def replay_response(self, stored, fingerprint):
+        stored_fingerprint, status_code, data = stored
+
+        if stored_fingerprint != fingerprint:
+            return Response(
+                {
+                    "detail": f"{IDEMPOTENCY_KEY_HEADER} was already used "
+                              "for a different request."
+                },
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+
+        return Response(
+            data,
+            status=status_code,
+            headers={REPLAYED_HEADER: "true"},
+        )
@@ -0,0 +1,153 @@
+import json
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination over a stable, indexed key.
+
+    Every page costs the same no matter how deep the client is. The
+    cursor holds the last row's value for every ordering field, and the
+    next page is ``WHERE (title, id) > (last_title, last_id)``, written
+    as ``title >= last_title AND (title > last_title OR id > last_id)``
+    so the composite index seeks straight to it. DRF's own cursor only
+    keys on the first field and skips ties with an ``OFFSET``.
+
+    Views may expose extra orderings through ``cursor_ordering_fields``,
+    a mapping of ``?ordering=`` values to ordering tuples. Each tuple
+    must end with ``id`` and be backed by a composite index. A view can
+    also force an ordering (e.g. by search rank) by returning it from
+    ``get_cursor_ordering()``.
+
+    Legacy clients can opt out with ``?paginate=false`` and get the
+    old unpaginated list.
+    """
+    ordering = "id"
+    ordering_query_param = "ordering"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    unpaginated_query_param = "paginate"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        paginate = request.query_params.get(self.unpaginated_query_param)
+
+        if paginate is not None and paginate.lower() == "false":
+            return None
+
+        # CursorPagination.paginate_queryset, filtering on the whole
+        # position instead of its first field.
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None:
+            offset, reverse, position = 0, False, None
+        else:
+            offset, reverse, position = self.cursor
+
+        ordering = (
+            _reverse_ordering(self.ordering) if reverse else self.ordering
+        )
+        queryset = queryset.order_by(*ordering)
+
+        if position is not None:
+            values = self.decode_position(position)
+            queryset = queryset.filter(
+                self.get_keyset_filter(ordering, values)
+            )
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position = position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    @staticmethod
+    def get_keyset_filter(ordering, values) -> Q:
+        """Rows after ``values`` in ``ordering``."""
+        after = []
+        ties = Q()
+
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            after.append(ties & Q(**{f"{name}__{lookup}": value}))
+            ties &= Q(**{name: value})
+
+        # Redundant, but lets the index seek on the leading field.
+        first = ordering[0].lstrip("-")
+        lookup = "lte" if ordering[0].startswith("-") else "gte"
+
+        return Q(**{f"{first}__{lookup}": values[0]}) & reduce(or_, after)
+
+    def decode_position(self, position):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return values
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+
+        for field in ordering:
+            name = field.lstrip("-")
+
+            if isinstance(instance, dict):
+                values.append(instance[name])
+            else:
+                values.append(getattr(instance, name))
+
+        return json.dumps([str(value) for value in values])
+
+    def get_ordering(self, request, queryset, view):
+        get_cursor_ordering = getattr(view, "get_cursor_ordering", None)
+
+        if get_cursor_ordering is not None:
+            ordering = get_cursor_ordering()
+            if ordering:
+                return tuple(ordering)
+
+        allowed_orderings = getattr(view, "cursor_ordering_fields", {})
+        requested = request.query_params.get(self.ordering_query_param)
+
+        if requested in allowed_orderings:
+            return tuple(allowed_orderings[requested])
+
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,423 @@
+"""
+Monthly range partitions for the tables that only ever grow.
+
+``borrowings_borrowing`` is partitioned by ``borrow_date`` and
+``payments_payment`` by a copy of its borrowing's ``borrow_date``, so a
+borrowing and its payments always sit in partitions covering the same
+month and can be archived together.
+
+Everything that existed before partitioning is kept as one
+``<table>_history`` partition covering ``MINVALUE`` up to the first
+month created afterwards. Rows no monthly partition covers yet, e.g.
+when the daily job stopped running, go to ``<table>_default`` instead of
+failing; ``create_partitions`` moves them into their month.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+BORROWINGS_TABLE = "borrowings_borrowing"
+PAYMENTS_TABLE = "payments_payment"
+
+# Parents before children: payments reference borrowings.
+PARTITIONED_TABLES = (BORROWINGS_TABLE, PAYMENTS_TABLE)
+
+# Payments copy their borrowing's borrow_date, so both share the key.
+PARTITION_KEY = "borrow_date"
+
+PARTITIONS = """
+SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+FROM pg_inherits
+JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent
+JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+WHERE parent.relname = %s
+"""
+
+INDEXES = """
+SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid)
+FROM pg_index
+WHERE indrelid = %s::regclass AND NOT indisprimary
+ORDER BY indexrelid
+"""
+
+FOREIGN_KEYS = """
+SELECT conname, pg_get_constraintdef(oid)
+FROM pg_constraint
+WHERE conrelid = %s::regclass AND contype = 'f'
+"""
+
+FOREIGN_KEYS_TO = """
+SELECT conname
+FROM pg_constraint
+WHERE conrelid = %s::regclass AND confrelid = %s::regclass
+"""
+
+# Rows of the default partition in one month, kept in a temporary table
+# until that month's partition exists.
+TAKE_FROM_DEFAULT = """
+CREATE TEMPORARY TABLE {moved} ON COMMIT DROP AS
+WITH moved AS (
+    DELETE FROM {default}
+    WHERE {key} >= %s AND {key} < %s
+    RETURNING *
+)
+SELECT * FROM moved
+"""
+
+BOUND = re.compile(
+    r"FROM \((?:MINVALUE|'(?P<start>[\d-]+)')\) TO \('(?P<end>[\d-]+)'\)"
+)
+
+# Rows that must not leave the live tables with their partition.
+STILL_IN_USE = {
+    BORROWINGS_TABLE: "actual_return_date IS NULL",
+    PAYMENTS_TABLE: "status = 'Pending'",
+}
+
+
+class PartitionInUse(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    start: date | None
+    end: date
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(table: str, start: date) -> str:
+    return f"{table}_{start:%Y_%m}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def create_default_partition(connection, table: str) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {default_partition_name(table)} "
+            f"PARTITION OF {table} DEFAULT"
+        )
+
+
+def has_default_partition(connection, table: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT to_regclass(%s) IS NOT NULL",
+            [default_partition_name(table)],
+        )
+        return cursor.fetchone()[0]
+
+
+def first_default_month(connection, tables) -> date | None:
+    """Month of the oldest row waiting in a default partition."""
+    months = []
+
+    with connection.cursor() as cursor:
+        for table in tables:
+            if not has_default_partition(connection, table):
+                continue
+
+            cursor.execute(
+                f"SELECT min({PARTITION_KEY}) "
+                f"FROM {default_partition_name(table)}"
+            )
+            (oldest,) = cursor.fetchone()
+
+            if oldest:
+                months.append(month_start(oldest))
+
+    return min(months, default=None)
+
+
+def take_from_default(connection, table: str, start: date) -> str | None:
+    """
+    Move the rows of the month of ``start`` out of the default partition
+    of ``table``, which Postgres requires before creating that month's
+    partition. Returns the temporary table holding them, or ``None``
+    when there were none.
+    """
+    if not has_default_partition(connection, table):
+        return None
+
+    default = default_partition_name(table)
+    end = add_months(start, 1)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {default} "
+            f"WHERE {PARTITION_KEY} >= %s AND {PARTITION_KEY} < %s)",
+            [start, end],
+        )
+
+        if not cursor.fetchone()[0]:
+            return None
+
+        moved = f"{table}_moved"
+        cursor.execute(
+            TAKE_FROM_DEFAULT.format(
+                moved=moved, default=default, key=PARTITION_KEY
+            ),
+            [start, end],
+        )
+
+    return moved
+
+
+def get_partitions(connection, table: str) -> list[Partition]:
+    """Range partitions of ``table`` ordered by their lower bound."""
+    with connection.cursor() as cursor:
+        cursor.execute(PARTITIONS, [table])
+        rows = cursor.fetchall()
+
+    partitions = []
+
+    for name, bound in rows:
+        match = BOUND.search(bound)
+
+        if match is None:
+            continue
+
+        start = match["start"]
+        partitions.append(Partition(
+            name=name,
+            start=date.fromisoformat(start) if start else None,
+            end=date.fromisoformat(match["end"]),
+        ))
+
+    return sorted(partitions, key=lambda p: (p.start or date.min))
+
+
+def partition_table(connection, table: str, column: str, end: date):
+    """
+    Turn ``table`` into a table partitioned by range of ``column``.
+
+    The existing table is attached as ``<table>_history`` for every row
+    before ``end`` without copying it. Its indexes and foreign keys are
+    recreated on the new parent, which adopts the existing ones instead
+    of building them again. ``id`` keeps its sequence, and the primary
+    key becomes ``(id, column)`` as Postgres requires.
+    """
+    history = f"{table}_history"
+
+    with connection.cursor() as cursor:
+        cursor.execute(INDEXES, [table])
+        indexes = cursor.fetchall()
+        cursor.execute(FOREIGN_KEYS, [table])
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT coalesce(max(id), 0) FROM {table}")
+        (last_id,) = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {history}")
+        # Replaced by the parent's (id, column) key when attached.
+        cursor.execute(
+            f"ALTER TABLE {history} DROP CONSTRAINT {table}_pkey"
+        )
+        cursor.execute(
+            f"ALTER TABLE {history} ALTER COLUMN id DROP IDENTITY IF EXISTS"
+        )
+
+        for number, (name, _) in enumerate(indexes):
+            cursor.execute(
+                f"ALTER INDEX {name} RENAME TO {history}_{number}_idx"
+            )
+
+        cursor.execute(
+            f"CREATE TABLE {table} "
+            f"(LIKE {history} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE ({column})"
+        )
+        cursor.execute(
+            f"ALTER TABLE {table} "
+            f"ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY"
+        )
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, %s)",
+            [table, max(last_id, 1), last_id > 0],
+        )
+        cursor.execute(
+            f"ALTER TABLE {table} "
+            f"ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, {column})"
+        )
+        cursor.execute(
+            f"ALTER TABLE {table} ATTACH PARTITION {history} "
+            f"FOR VALUES FROM (MINVALUE) TO (%s)",
+            [end],
+        )
+
+        for _, definition in indexes:
+            cursor.execute(definition)
+
+        for name, definition in foreign_keys:
+            cursor.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}"
+            )
+
+
+def create_partition(connection, table: str, start: date) -> str | None:
+    """
+    Create the partition of ``table`` for the month of ``start``.
+
+    Returns its name, or ``None`` when part of that month is already
+    covered by another partition.
+    """
+    start = month_start(start)
+    end = add_months(start, 1)
+
+    for partition in get_partitions(connection, table):
+        if (partition.start or date.min) < end and start < partition.end:
+            return None
+
+    name = partition_name(table, start)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {name} PARTITION OF {table} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+
+    return name
+
+
+def create_month_partitions(connection, tables, start: date) -> list[str]:
+    """
+    Create the partitions of ``tables`` for the month of ``start``,
+    moving that month's rows out of the default partitions into them.
+    """
+    # Payments first, as they reference the borrowings being moved.
+    moved = {}
+
+    for table in reversed(tables):
+        name = take_from_default(connection, table, start)
+
+        if name:
+            moved[table] = name
+
+    created = []
+
+    with connection.cursor() as cursor:
+        if moved:
+            # Foreign key checks queued by putting the rows back would
+            # block creating the next partition of the same table.
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        for table in tables:
+            name = create_partition(connection, table, start)
+
+            if name:
+                created.append(name)
+
+            if table not in moved:
+                continue
+
+            cursor.execute(f"INSERT INTO {table} SELECT * FROM {moved[table]}")
+            logger.warning(
+                f"Moved {cursor.rowcount} rows of {table} for "
+                f"{start:%Y-%m} out of its default partition"
+            )
+            cursor.execute(f"DROP TABLE {moved[table]}")
+
+    return created
+
+
+def create_partitions(
+        connection,
+        months_ahead: int,
+        tables=PARTITIONED_TABLES,
+        today=None) -> list[str]:
+    """
+    Make sure each of ``tables`` has a partition for the current month
+    and the next ``months_ahead`` months, and for every earlier month
+    with rows waiting in a default partition.
+    """
+    first = month_start(today or date.today())
+    last = add_months(first, months_ahead)
+    created = []
+
+    with transaction.atomic(using=connection.alias):
+        waiting = first_default_month(connection, tables)
+        start = min(first, waiting) if waiting else first
+
+        while start <= last:
+            created += create_month_partitions(connection, tables, start)
+            start = add_months(start, 1)
+
+    return created
+
+
+def detach_partitions(connection, before: date, archive_schema=None):
+    """
+    Detach every partition that ends on or before ``before`` from both
+    tables, and move it into ``archive_schema`` when one is given.
+
+    Payments go first since their foreign key points at the borrowings
+    being detached. Raises ``PartitionInUse`` and detaches nothing if a
+    partition still holds an active borrowing or a pending payment.
+    """
+    detached = []
+
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        old = {
+            table: [
+                partition.name
+                for partition in get_partitions(connection, table)
+                if partition.end <= before
+            ]
+            for table in PARTITIONED_TABLES
+        }
+
+        for table, names in old.items():
+            for name in names:
+                cursor.execute(
+                    f"SELECT EXISTS (SELECT 1 FROM {name} "
+                    f"WHERE {STILL_IN_USE[table]})"
+                )
+
+                if cursor.fetchone()[0]:
+                    raise PartitionInUse(
+                        f"{name} still has rows in use "
+                        f"({STILL_IN_USE[table]})"
+                    )
+
+        if archive_schema:
+            cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}")
+
+        for table in reversed(PARTITIONED_TABLES):
+            for name in old[table]:
+                cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+
+                # The detached copy keeps a foreign key to the live
+                # borrowings, which would block detaching them next.
+                cursor.execute(FOREIGN_KEYS_TO, [name, BORROWINGS_TABLE])
+
+                for (constraint,) in cursor.fetchall():
+                    cursor.execute(
+                        f"ALTER TABLE {name} DROP CONSTRAINT {constraint}"
+                    )
+
+                if archive_schema:
+                    cursor.execute(
+                        f"ALTER TABLE {name} SET SCHEMA {archive_schema}"
+                    )
+
+                detached.append(name)
+
+    return detached
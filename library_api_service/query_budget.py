@@ -0,0 +1,83 @@
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+BUDGET_EXCEEDED_HEADER = "X-Query-Budget-Exceeded"
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the SQL queries every request runs and flag endpoints that go
+    over their budget.
+
+    A view sets ``query_budget`` to an int, or to a dict keyed by
+    viewset action where ``None`` opts an action out (e.g. batched
+    imports). Anything else gets ``QUERY_BUDGET_DEFAULT``. Overruns are
+    logged, never raised: the view has already run and committed by then.
+    With ``QUERY_BUDGET_HEADER`` on (the default in debug) they are also
+    reported in the ``X-Query-Budget-Exceeded`` header, which tests fail
+    on through ``QueryCountAssertionsMixin``.
+
+    Connections are per thread, so this stays sync-only: under ASGI
+    Django runs it on the request's thread-sensitive worker, the same
+    thread that runs sync views and async ORM calls, and counts them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        request.query_budget = settings.QUERY_BUDGET_DEFAULT
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+
+            response = self.get_response(request)
+
+        if settings.DEBUG:
+            response["X-Query-Count"] = str(counter.count)
+
+        budget = request.query_budget
+
+        if budget is not None and counter.count > budget:
+            logger.warning(
+                f"{request.method} {request.path} ran {counter.count} "
+                f"queries, budget is {budget}"
+            )
+
+            if settings.QUERY_BUDGET_HEADER:
+                response[BUDGET_EXCEEDED_HEADER] = (
+                    f"{counter.count}/{budget}"
+                )
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "cls", None) or getattr(
+            view_func, "view_class", None
+        )
+        budget = getattr(view_class, "query_budget", None)
+
+        if isinstance(budget, dict):
+            actions = getattr(view_func, "actions", None) or {}
+            action = actions.get(request.method.lower())
+
+            if action in budget:
+                request.query_budget = budget[action]
+        elif budget is not None:
+            request.query_budget = budget
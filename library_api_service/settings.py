@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import json
 import os
 from datetime import timedelta
 from pathlib import Path
@@ -35,11 +36,50 @@ STRIPE_PUBLIC = os.environ.get("STRIPE_PUBLIC")
 STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY")
 STRIPE_SUCCESS_URL = os.environ.get("STRIPE_SUCCESS_URL")
 STRIPE_CANCEL_URL = os.environ.get("STRIPE_CANCEL_URL")
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+STRIPE_EVENT_BATCH_SIZE = 500
+STRIPE_CONNECT_TIMEOUT = float(os.environ.get("STRIPE_CONNECT_TIMEOUT", 5))
+STRIPE_READ_TIMEOUT = float(os.environ.get("STRIPE_READ_TIMEOUT", 20))
+STRIPE_MAX_NETWORK_RETRIES = int(
+    os.environ.get("STRIPE_MAX_NETWORK_RETRIES", 2)
+)
+STRIPE_POOL_SIZE = int(os.environ.get("STRIPE_POOL_SIZE", 10))
+STRIPE_BREAKER_FAILURE_RATE = 0.5
+STRIPE_BREAKER_MIN_CALLS = 10
+STRIPE_BREAKER_WINDOW = 60
+STRIPE_BREAKER_OPEN_SECONDS = int(
+    os.environ.get("STRIPE_BREAKER_OPEN_SECONDS", 30)
+)
+
+# PAYMENT GATEWAY
+# "payments.gateways.FakeGateway" answers locally without Stripe, e.g.
+# PAYMENT_GATEWAY_OPTIONS='{"latency": [0.1, 0.5], "error_rate": 0.05}'.
+PAYMENT_GATEWAY = os.environ.get(
+    "PAYMENT_GATEWAY", "payments.gateways.StripeGateway"
+)
+PAYMENT_GATEWAY_OPTIONS = json.loads(
+    os.environ.get("PAYMENT_GATEWAY_OPTIONS", "{}")
+)
+
+# Checkout sessions are created when a client first asks for one, live
+# between one and two TTLs (Stripe allows 30 minutes to 24h, so the TTL
+# is checked at startup), and are replaced once fewer than MIN_REMAINING
+# seconds are left to pay.
+CHECKOUT_SESSION_TTL = int(os.environ.get("CHECKOUT_SESSION_TTL", 6 * 60 * 60))
+CHECKOUT_SESSION_MIN_REMAINING = 30 * 60
 
 # TELEGRAM
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 ADMIN_TELEGRAM_CHAT_ID = os.environ.get("ADMIN_TELEGRAM_CHAT_ID")
 
+# Nightly overdue scan: ids per worker task, rows per query, and
+# borrowings listed per Telegram message.
+OVERDUE_SCAN_RANGE_SIZE = int(
+    os.environ.get("OVERDUE_SCAN_RANGE_SIZE", 50_000)
+)
+OVERDUE_SCAN_CHUNK_SIZE = 2000
+OVERDUE_DIGEST_SIZE = 40
+
 ALLOWED_HOSTS = []
 
 
@@ -52,6 +92,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "books",
     "borrowings",
     "users",
@@ -66,6 +107,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "library_api_service.query_budget.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -154,8 +196,37 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS':
+        'library_api_service.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.environ.get("API_PAGE_SIZE", 20)),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'library_api_service.throttling.TokenBucketThrottle',
+    ),
+    # Token bucket sizes, refilled evenly over the period.
+    'DEFAULT_THROTTLE_RATES': {
+        'user': os.environ.get("THROTTLE_RATE_USER", "600/min"),
+        'anon': os.environ.get("THROTTLE_RATE_ANON", "120/min"),
+        # Each one creates a Stripe checkout session.
+        'borrowings_write': os.environ.get(
+            "THROTTLE_RATE_BORROWINGS_WRITE", "30/min"
+        ),
+        # Password hashing.
+        'login': os.environ.get("THROTTLE_RATE_LOGIN", "10/min"),
+    },
 }
 
+# Render list endpoints from values() rows instead of model instances.
+FAST_LIST_SERIALIZATION = (
+    os.environ.get("FAST_LIST_SERIALIZATION", "True") == "True"
+)
+
+# Per-request SQL query budget, see library_api_service/query_budget.py.
+QUERY_BUDGET_DEFAULT = int(os.environ.get("QUERY_BUDGET_DEFAULT", 10))
+# Flag overruns in a response header; they are always logged.
+QUERY_BUDGET_HEADER = (
+    os.environ.get("QUERY_BUDGET_HEADER", str(DEBUG)) == "True"
+)
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Library Api Service',
     'DESCRIPTION': 'Borrow your first book online today!',
@@ -163,6 +234,57 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': False,
 }
 
+# CACHE
+CACHE_URL = os.environ.get("CACHE_URL")
+
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+BOOK_CACHE_TIMEOUT = int(os.environ.get("BOOK_CACHE_TIMEOUT", 60 * 60))
+
+# Throttle buckets live in this Redis, shared by all workers; without it
+# each process keeps its own (see library_api_service/throttling.py).
+THROTTLE_REDIS_URL = os.environ.get("THROTTLE_REDIS_URL", CACHE_URL)
+
+# BOOK SUGGESTIONS
+BOOK_SUGGEST_DEFAULT_LIMIT = 10
+BOOK_SUGGEST_MAX_LIMIT = 25
+BOOK_SUGGEST_CACHE_SIZE = int(
+    os.environ.get("BOOK_SUGGEST_CACHE_SIZE", 2048)
+)
+BOOK_SUGGEST_CACHE_TTL = int(os.environ.get("BOOK_SUGGEST_CACHE_TTL", 60))
+
+# BORROWINGS
+BORROWING_CHECKOUT_MAX_BOOKS = 10
+BORROWING_BULK_RETURN_MAX_IDS = 1000
+# Overdue borrowings whose fine is accrued per statement, nightly.
+FINE_ACCRUAL_BATCH_SIZE = 1000
+# Longest date range served by the daily stats endpoint.
+DAILY_STATS_MAX_DAYS = 366
+
+# IDEMPOTENCY
+# How long responses are replayed for a repeated Idempotency-Key, and
+# how long a duplicate waits for the in-flight original.
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 60 * 60 * 24))
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+IDEMPOTENCY_WAIT_TIMEOUT = 10
+IDEMPOTENCY_POLL_INTERVAL = 0.05
+
+# PARTITIONS
+# Monthly borrowing/payment partitions kept ready beyond the current one.
+PARTITION_MONTHS_AHEAD = 3
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=2),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=12),
@@ -172,16 +294,48 @@ SIMPLE_JWT = {
 # CELERY
 CELERY_BEAT_SCHEDULE = {
     "daily_summary_notification": {
-        "task": "notifications.tasks.daily_summary",
+        "task": "tg_notifications.tasks.daily_summary",
         "schedule": crontab(hour=20, minute=0),
         "args": (),
     },
 
     "check_overdue_borrowings": {
-        "task": "notifications.tasks.check_overdue_borrowings",
+        "task": "tg_notifications.tasks.check_overdue_borrowings",
         "schedule": crontab(hour=20, minute=1),
         "args": (),
     },
+
+    "process_stripe_events": {
+        "task": "payments.tasks.process_stripe_events",
+        "schedule": crontab(minute="*"),
+        "args": (),
+    },
+
+    "accrue_fines": {
+        "task": "payments.tasks.accrue_fines",
+        "schedule": crontab(hour=0, minute=15),
+        "args": (),
+    },
+
+    # Today's row is kept fresh for the summary and stats endpoint;
+    # yesterday's is finished once its last rows are in.
+    "rollup_daily_stats": {
+        "task": "borrowings.tasks.rollup_daily_stats",
+        "schedule": crontab(minute="*/10"),
+        "args": (),
+    },
+
+    "rollup_yesterday_stats": {
+        "task": "borrowings.tasks.rollup_daily_stats",
+        "schedule": crontab(hour=0, minute=5),
+        "args": (1,),
+    },
+
+    "create_future_partitions": {
+        "task": "borrowings.tasks.create_future_partitions",
+        "schedule": crontab(hour=3, minute=0),
+        "args": (),
+    },
 }
 
 CELERY_BACKEND_URL = os.environ.get("CELERY_BACKEND_URL")
@@ -0,0 +1,156 @@
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from django.utils.module_loading import import_string
+from rest_framework import permissions
+
+FIELDS_QUERY_PARAM = "fields"
+EXPAND_QUERY_PARAM = "expand"
+
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        name=FIELDS_QUERY_PARAM,
+        type=OpenApiTypes.STR,
+        required=False,
+        description="Comma-separated list of fields to return",
+    ),
+    OpenApiParameter(
+        name=EXPAND_QUERY_PARAM,
+        type=OpenApiTypes.STR,
+        required=False,
+        description="Comma-separated list of related objects to inline",
+    ),
+]
+
+
+def get_query_set_param(request, name):
+    """Parse ``?name=a,b`` into ``{"a", "b"}``, or ``None`` if absent."""
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return None
+
+    value = request.query_params.get(name)
+
+    if value is None:
+        return None
+
+    return {item.strip() for item in value.split(",") if item.strip()}
+
+
+def _concrete_field_names(model):
+    return {field.name for field in model._meta.concrete_fields}
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Let read requests trim and expand a model serializer's output.
+
+    ``?fields=`` keeps only the listed fields and ``?expand=`` replaces
+    a related primary key with the nested object. Expansions are
+    declared in ``expandable_fields`` as
+    ``name -> (serializer import path, serializer kwargs)``.
+
+    Only the outermost serializer of a request reacts to the query
+    params; nested serializers render in full.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get("request")
+        expand = get_query_set_param(request, EXPAND_QUERY_PARAM)
+        fields = get_query_set_param(request, FIELDS_QUERY_PARAM)
+
+        for name in self.get_expansions(expand):
+            self.fields[name] = self.build_expanded_field(name)
+
+        if fields is not None:
+            keep = fields | (expand or set())
+
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+    @classmethod
+    def get_expansions(cls, expand):
+        if not expand:
+            return []
+
+        return [name for name in cls.expandable_fields if name in expand]
+
+    @classmethod
+    def get_expanded_serializer_class(cls, name):
+        return import_string(cls.expandable_fields[name][0])
+
+    def build_expanded_field(self, name):
+        serializer_class = self.get_expanded_serializer_class(name)
+        kwargs = self.expandable_fields[name][1]
+
+        return serializer_class(read_only=True, **kwargs)
+
+    @classmethod
+    def optimize_queryset(cls, queryset, request, required_fields=()):
+        """
+        Restrict ``queryset`` to the columns the response will use and
+        load expanded relations with ``select_related``/
+        ``prefetch_related`` instead of one query per object.
+        """
+        expand = get_query_set_param(request, EXPAND_QUERY_PARAM)
+        fields = get_query_set_param(request, FIELDS_QUERY_PARAM)
+
+        if expand is None and fields is None:
+            return queryset
+
+        model = queryset.model
+        concrete = _concrete_field_names(model)
+        requested = fields if fields is not None else set(cls.Meta.fields)
+        only = {model._meta.pk.name}
+        only |= (requested | set(required_fields)) & concrete
+
+        for name in cls.get_expansions(expand):
+            relation = model._meta.get_field(name)
+
+            if relation.many_to_one or relation.one_to_one:
+                nested = cls.get_expanded_serializer_class(name)
+                nested_concrete = _concrete_field_names(relation.related_model)
+
+                queryset = queryset.select_related(name)
+                only.add(name)
+                only |= {
+                    f"{name}__{field}"
+                    for field in nested.Meta.fields
+                    if field in nested_concrete
+                }
+            else:
+                queryset = queryset.prefetch_related(name)
+
+        return queryset.only(*only)
+
+
+class SparseFieldsViewMixin:
+    """
+    Apply the serializer's ``optimize_queryset`` to list/detail reads.
+
+    Fields the view itself relies on (e.g. the cursor ordering) are
+    always loaded.
+    """
+
+    def get_sparse_required_fields(self):
+        cursor_ordering_fields = getattr(self, "cursor_ordering_fields", {})
+        ordering = cursor_ordering_fields.get(
+            self.request.query_params.get("ordering"), ()
+        )
+
+        return [field.lstrip("-") for field in ordering]
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+
+        if not hasattr(serializer_class, "optimize_queryset"):
+            return queryset
+
+        return serializer_class.optimize_queryset(
+            queryset,
+            self.request,
+            required_fields=self.get_sparse_required_fields(),
+        )
@@ -0,0 +1,46 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from library_api_service.query_budget import BUDGET_EXCEEDED_HEADER
+
+
+class QueryCountAssertionsMixin:
+    """TestCase helpers for catching N+1 queries and budget overruns."""
+
+    def assertWithinQueryBudget(self, response):
+        if BUDGET_EXCEEDED_HEADER in response:
+            self.fail(
+                f"{response.wsgi_request.method} "
+                f"{response.wsgi_request.path} ran "
+                f"{response[BUDGET_EXCEEDED_HEADER]} queries of its budget"
+            )
+
+    def assertQueryCountConstant(self, request, add_rows, sizes=(1, 5)):
+        """
+        Call ``add_rows(size)`` then ``request()`` for each size and fail
+        if the number of queries ``request`` runs changes between them,
+        or if a response it returns went over its query budget.
+        """
+        captured = []
+
+        for size in sizes:
+            add_rows(size)
+
+            with override_settings(QUERY_BUDGET_HEADER=True), \
+                    CaptureQueriesContext(connection) as queries:
+                response = request()
+
+            if hasattr(response, "wsgi_request"):
+                self.assertWithinQueryBudget(response)
+
+            captured.append(queries)
+
+        first, last = captured[0], captured[-1]
+
+        if len(first) != len(last):
+            self.fail(
+                f"Query count grew from {len(first)} to {len(last)} "
+                f"with more rows:\n"
+                + "\n".join(query["sql"] for query in last.captured_queries)
+            )
@@ -0,0 +1,205 @@
+import logging
+import math
+import threading
+import time
+from functools import cache
+
+import redis
+from django.conf import settings
+from django.core.signals import setting_changed
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 60 * 60 * 24}
+
+# Refill every bucket in KEYS by the time elapsed since it was last
+# touched, then take one token from each only if all of them have one.
+# ARGV holds a capacity and a refill rate (tokens per ms) per key.
+# Returns {allowed, milliseconds until a token is available}.
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call("TIME")
+local now = time[1] * 1000 + math.floor(time[2] / 1000)
+local levels = {}
+local wait = 0
+
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local bucket = redis.call("HMGET", key, "tokens", "ts")
+    local tokens = tonumber(bucket[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+
+    tokens = math.min(capacity, tokens + elapsed * rate)
+    levels[i] = tokens
+
+    if tokens < 1 then
+        wait = math.max(wait, math.ceil((1 - tokens) / rate))
+    end
+end
+
+if wait > 0 then
+    return {0, wait}
+end
+
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+
+    redis.call("HSET", key, "tokens", levels[i] - 1, "ts", now)
+    redis.call("PEXPIRE", key, math.ceil(capacity / rate))
+end
+
+return {1, 0}
+"""
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    """``"20/min"`` -> capacity 20, refilled at 20 tokens per 60s."""
+    count, period = rate.split("/")
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class RedisTokenBuckets:
+    """Token buckets shared by every worker, one round trip per check."""
+
+    def __init__(self, client):
+        self.client = client
+        self.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def consume(self, buckets) -> tuple[bool, float]:
+        args = []
+
+        for _, capacity, per_second in buckets:
+            args += [capacity, per_second / 1000]
+
+        allowed, wait_ms = self.script(
+            keys=[key for key, _, _ in buckets], args=args
+        )
+        return bool(allowed), wait_ms / 1000
+
+
+class LocalTokenBuckets:
+    """
+    In-process token buckets, for tests and setups without Redis.
+
+    Limits are per process, so N workers allow N times the rate.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def consume(self, buckets) -> tuple[bool, float]:
+        now = time.monotonic()
+        levels = []
+        wait = 0
+
+        with self.lock:
+            for key, capacity, per_second in buckets:
+                tokens, touched = self.buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - touched) * per_second)
+                levels.append(tokens)
+
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / per_second)
+
+            if wait:
+                return False, wait
+
+            for (key, _, _), tokens in zip(buckets, levels):
+                self.buckets[key] = (tokens - 1, now)
+
+        return True, 0
+
+    def reset(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+@cache
+def get_token_buckets():
+    if settings.THROTTLE_REDIS_URL:
+        return RedisTokenBuckets(
+            redis.Redis.from_url(settings.THROTTLE_REDIS_URL)
+        )
+
+    return LocalTokenBuckets()
+
+
+def _reset_token_buckets(*, setting, **kwargs):
+    if setting == "THROTTLE_REDIS_URL":
+        get_token_buckets.cache_clear()
+
+
+setting_changed.connect(_reset_token_buckets)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Rate limit every request by client, and some endpoints further by
+    their own scope, with token buckets.
+
+    Authenticated clients are limited per user under the ``user`` rate,
+    anonymous ones per IP under ``anon``. A view may add
+    ``throttle_scope``, a rate name or a dict of them keyed by viewset
+    action, which is also counted per client. Rates come from
+    ``DEFAULT_THROTTLE_RATES`` (e.g. ``"20/min"``, ``None`` to disable).
+
+    All of a request's buckets are checked and charged together in one
+    Redis script call. A Redis outage lets requests through rather than
+    failing them.
+    """
+
+    def get_scopes(self, request, view) -> list[str]:
+        scopes = ["user" if request.user.is_authenticated else "anon"]
+        scope = getattr(view, "throttle_scope", None)
+
+        if isinstance(scope, dict):
+            scope = scope.get(getattr(view, "action", None))
+
+        if scope:
+            scopes.append(scope)
+
+        return scopes
+
+    def get_buckets(self, request, view) -> list[tuple[str, int, float]]:
+        if request.user.is_authenticated:
+            ident = f"user:{request.user.pk}"
+        else:
+            ident = f"ip:{self.get_ident(request)}"
+
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        buckets = []
+
+        for scope in self.get_scopes(request, view):
+            rate = rates.get(scope)
+
+            if rate:
+                # The hash tag keeps one client's buckets on one
+                # Redis Cluster slot so the script may touch them all.
+                buckets.append(
+                    (f"throttle:{{{ident}}}:{scope}", *parse_rate(rate))
+                )
+
+        return buckets
+
+    def allow_request(self, request, view):
+        buckets = self.get_buckets(request, view)
+
+        if not buckets:
+            return True
+
+        try:
+            allowed, self.retry_after = get_token_buckets().consume(buckets)
+        except redis.RedisError:
+            logger.warning("Throttling skipped, Redis unavailable",
+                           exc_info=True)
+            return True
+
+        return allowed
+
+    def wait(self):
+        return math.ceil(self.retry_after)
@@ -1,4 +1,5 @@
 from django.contrib import admin
-from payments.models import Payment
+from payments.models import Payment, StripeEvent
 
 admin.site.register(Payment)
+admin.site.register(StripeEvent)
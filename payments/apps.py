@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class PaymentsConfig(AppConfig):
     name = 'payments'
+
+    def ready(self):
+        from payments.gateways import (check_checkout_session_ttl,
+                                       get_payment_gateway)
+        from payments.stripe_client import configure_stripe
+
+        configure_stripe()
+        # Build the gateway now so a misconfigured one fails at startup.
+        get_payment_gateway()
+        check_checkout_session_ttl()
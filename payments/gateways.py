@@ -0,0 +1,218 @@
+"""
+Payment gateways behind ``PaymentService``.
+
+``PAYMENT_GATEWAY`` names the class to use and ``PAYMENT_GATEWAY_OPTIONS``
+its keyword arguments: ``StripeGateway`` in production, ``FakeGateway``
+for load tests and offline development.
+"""
+import json
+import random
+from abc import ABC, abstractmethod
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from functools import cache
+
+import stripe
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+
+from payments.stripe_client import call_stripe
+
+FAKE_SESSION_NAMESPACE = uuid.UUID("6f1c7a52-3a0b-4d8e-9a47-2f5b8d1e0c39")
+
+# Currency of every checkout line item.
+CHECKOUT_CURRENCY = "usd"
+
+# How long after creation Stripe lets a checkout session expire.
+CHECKOUT_SESSION_MIN_LIFETIME = 30 * 60
+CHECKOUT_SESSION_MAX_LIFETIME = 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class CheckoutSession:
+    id: str
+    url: str
+    expires_at: datetime
+
+
+class PaymentGateway(ABC):
+    """Creates hosted checkout sessions for pending payments."""
+
+    @abstractmethod
+    def create_checkout_session(
+            self,
+            line_items: list[dict],
+            metadata: dict,
+            expires_at: datetime,
+            idempotency_key: str) -> CheckoutSession:
+        """
+        Open a checkout session for ``line_items`` (Stripe's format)
+        that can be paid until ``expires_at``. Calls repeated with the
+        same ``idempotency_key`` return the same session.
+        """
+
+    @abstractmethod
+    def expire_checkout_session(self, session_id: str) -> None:
+        """
+        Close an open session so it can no longer be paid. Raises
+        ``InvalidRequestError`` if it is not open any more.
+        """
+
+    @abstractmethod
+    def is_checkout_session_complete(self, session_id: str) -> bool:
+        """Whether the session was paid. Unknown sessions were not."""
+
+
+class StripeGateway(PaymentGateway):
+    def create_checkout_session(
+            self, line_items, metadata, expires_at, idempotency_key):
+        session = call_stripe(
+            stripe.checkout.Session.create,
+            line_items=line_items,
+            mode='payment',
+            success_url=(
+                f"{settings.STRIPE_SUCCESS_URL}"
+                "?session_id={CHECKOUT_SESSION_ID}"
+            ),
+            cancel_url=settings.STRIPE_CANCEL_URL,
+            metadata=metadata,
+            expires_at=int(expires_at.timestamp()),
+            idempotency_key=idempotency_key,
+        )
+        return CheckoutSession(
+            id=session.id, url=session.url, expires_at=expires_at
+        )
+
+    def expire_checkout_session(self, session_id):
+        call_stripe(stripe.checkout.Session.expire, session_id)
+
+    def is_checkout_session_complete(self, session_id):
+        try:
+            session = call_stripe(
+                stripe.checkout.Session.retrieve, session_id
+            )
+        except stripe.error.InvalidRequestError:
+            return False
+
+        return session.status == "complete"
+
+
+class FakeGateway(PaymentGateway):
+    """
+    Answers like Stripe without any network access.
+
+    Each call takes ``latency`` seconds (a ``[min, max]`` range) and
+    fails with ``APIConnectionError`` at ``error_rate``. Calls go through
+    the Stripe circuit breaker, so load tests exercise it. A ``paid_rate``
+    share of the sessions is reported paid ``webhook_delay`` seconds
+    later by a ``checkout.session.completed`` event, stored as if the
+    webhook had received it.
+    """
+
+    def __init__(
+            self,
+            latency=(0.05, 0.3),
+            error_rate=0.0,
+            paid_rate=1.0,
+            webhook_delay=1.0):
+        self.latency = tuple(latency)
+        self.error_rate = error_rate
+        self.paid_rate = paid_rate
+        self.webhook_delay = webhook_delay
+
+    def simulate_call(self):
+        time.sleep(random.uniform(*self.latency))
+
+        if random.random() < self.error_rate:
+            raise stripe.error.APIConnectionError(
+                "Simulated payment gateway failure"
+            )
+
+    def create_checkout_session(
+            self, line_items, metadata, expires_at, idempotency_key):
+        call_stripe(self.simulate_call)
+
+        session_id = "cs_fake_" + uuid.uuid5(
+            FAKE_SESSION_NAMESPACE, idempotency_key
+        ).hex
+
+        if random.random() < self.paid_rate:
+            from payments.tasks import send_fake_webhook
+
+            send_fake_webhook.apply_async(
+                (session_id,), countdown=self.webhook_delay
+            )
+
+        return CheckoutSession(
+            id=session_id,
+            url=f"{settings.STRIPE_SUCCESS_URL}?session_id={session_id}",
+            expires_at=expires_at,
+        )
+
+    def expire_checkout_session(self, session_id):
+        call_stripe(self.simulate_call)
+
+    def is_checkout_session_complete(self, session_id):
+        # Never asked: expiring a fake session does not fail.
+        call_stripe(self.simulate_call)
+        return False
+
+    @staticmethod
+    def build_paid_event(session_id: str) -> bytes:
+        return json.dumps({
+            "id": f"evt_fake_{uuid.uuid4().hex}",
+            "object": "event",
+            "type": "checkout.session.completed",
+            "data": {
+                "object": {
+                    "id": session_id,
+                    "object": "checkout.session",
+                    "payment_status": "paid",
+                },
+            },
+        }).encode()
+
+
+def check_checkout_session_ttl() -> None:
+    """
+    Sessions live between one and two ``CHECKOUT_SESSION_TTL``s, and
+    Stripe only accepts 30 minutes to 24 hours. They must also outlive
+    ``CHECKOUT_SESSION_MIN_REMAINING``, or each one is replaced as soon
+    as it is created.
+    """
+    ttl = settings.CHECKOUT_SESSION_TTL
+    lowest = max(
+        CHECKOUT_SESSION_MIN_LIFETIME, settings.CHECKOUT_SESSION_MIN_REMAINING
+    )
+    highest = CHECKOUT_SESSION_MAX_LIFETIME // 2
+
+    if not lowest < ttl <= highest:
+        raise ImproperlyConfigured(
+            f"CHECKOUT_SESSION_TTL must be more than {lowest} and at "
+            f"most {highest} seconds, got {ttl}."
+        )
+
+
+@cache
+def get_payment_gateway() -> PaymentGateway:
+    gateway_class = import_string(settings.PAYMENT_GATEWAY)
+
+    if not issubclass(gateway_class, PaymentGateway):
+        raise ImproperlyConfigured(
+            f"PAYMENT_GATEWAY {settings.PAYMENT_GATEWAY} is not a "
+            "PaymentGateway."
+        )
+
+    return gateway_class(**settings.PAYMENT_GATEWAY_OPTIONS)
+
+
+def _reset_payment_gateway(*, setting, **kwargs):
+    if setting.startswith("PAYMENT_GATEWAY"):
+        get_payment_gateway.cache_clear()
+
+
+setting_changed.connect(_reset_payment_gateway)
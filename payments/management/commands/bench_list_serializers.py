@@ -0,0 +1,128 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from books.models import Book
+from books.serializers import BooksSerializer
+from borrowings.models import Borrowing
+from borrowings.serializers import BorrowingSerializer
+from library_api_service.fast_serializers import compile_field_plan
+from payments.models import Payment
+from payments.serializers import PaymentSerializer
+
+BENCHMARKS = (
+    ("books", Book, BooksSerializer),
+    ("borrowings", Borrowing, BorrowingSerializer),
+    ("payments", Payment, PaymentSerializer),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows/second of the regular and the fast list "
+        "serialization paths. All seeded rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50_000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options["rows"])
+
+            for name, model, serializer_class in BENCHMARKS:
+                self.bench(
+                    name,
+                    model.objects.order_by("id"),
+                    serializer_class,
+                    options["repeat"],
+                )
+
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        self.stdout.write(f"Seeding {rows} rows per table...")
+        today = date.today()
+
+        user = get_user_model().objects.create_user(
+            email="bench_list_serializers@example.com",
+            password="password",
+        )
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Book {i}",
+                author=f"Author {i % 100}",
+                cover="Hard" if i % 2 else "Soft",
+                inventory=i % 10,
+                daily_fee=Decimal(i % 500) / 100,
+            )
+            for i in range(rows)
+        )
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(
+                expected_return_date=today + timedelta(days=i % 14),
+                actual_return_date=today if i % 3 == 0 else None,
+                book=book,
+                user=user,
+            )
+            for i, book in enumerate(books)
+        )
+        Payment.objects.bulk_create(
+            Payment(
+                type=Payment.TypeChoices.PAYMENT,
+                borrowing=borrowing,
+                borrow_date=borrowing.borrow_date,
+                session_id=f"cs_test_{i}",
+                session_url=f"https://checkout.stripe.com/c/pay/{i}",
+                money_to_paid=Decimal(i % 5000) / 100,
+            )
+            for i, borrowing in enumerate(borrowings)
+        )
+
+    def bench(self, name, queryset, serializer_class, repeat):
+        renderer = JSONRenderer()
+        plan = compile_field_plan(serializer_class())
+
+        if plan is None:
+            raise CommandError(f"{serializer_class.__name__} has no plan")
+
+        def regular():
+            return renderer.render(
+                serializer_class(queryset.all(), many=True).data
+            )
+
+        def fast():
+            return renderer.render(
+                [plan.render(row) for row in queryset.values(*plan.columns)]
+            )
+
+        rows = queryset.count()
+        regular_body, regular_rate = self.measure(regular, rows, repeat)
+        fast_body, fast_rate = self.measure(fast, rows, repeat)
+
+        if regular_body != fast_body:
+            raise CommandError(f"{name}: fast path output differs")
+
+        self.stdout.write(
+            f"{name}: regular={regular_rate:,.0f} rows/s "
+            f"fast={fast_rate:,.0f} rows/s "
+            f"speedup={fast_rate / regular_rate:.1f}x"
+        )
+
+    @staticmethod
+    def measure(render, rows, repeat):
+        best = None
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = render()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+
+        return body, rows / best
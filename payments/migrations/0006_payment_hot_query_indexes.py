@@ -0,0 +1,37 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:12
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('payments', '0005_alter_payment_id_alter_payment_session_url'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(
+                fields=['session_id'],
+                name='payments_session_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(
+                fields=['borrowing', 'type', 'status'],
+                name='payments_borrowing_type_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(
+                condition=models.Q(
+                    ('session_id__isnull', True), ('status', 'Pending')),
+                fields=['id'],
+                name='payments_missing_session_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowings', '0006_borrowing_hot_query_indexes'),
+        ('payments', '0006_payment_hot_query_indexes'),
+    ]
+
+    # The foreign key must be gone before borrowings is partitioned.
+    run_before = [
+        ('borrowings', '0007_partition_borrowings'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='borrowing',
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name='payments',
+                to='borrowings.borrowing'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='borrow_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE payments_payment AS payment
+                SET borrow_date = borrowing.borrow_date
+                FROM borrowings_borrowing AS borrowing
+                WHERE borrowing.id = payment.borrowing_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='borrow_date',
+            field=models.DateField(editable=False),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:41
+
+from django.db import migrations
+
+from library_api_service.partitions import (BORROWINGS_TABLE,
+                                            PAYMENTS_TABLE,
+                                            create_partitions,
+                                            get_partitions,
+                                            partition_table)
+
+ADD_BORROWING_FOREIGN_KEY = """
+ALTER TABLE payments_payment
+ADD CONSTRAINT payments_payment_borrowing_fk
+FOREIGN KEY (borrowing_id, borrow_date)
+REFERENCES borrowings_borrowing (id, borrow_date)
+DEFERRABLE INITIALLY DEFERRED
+"""
+
+
+def partition_payments(apps, schema_editor):
+    connection = schema_editor.connection
+
+    # Share the borrowings' bounds so each month can be archived from
+    # both tables at once.
+    history, *_ = get_partitions(connection, BORROWINGS_TABLE)
+    partition_table(connection, PAYMENTS_TABLE, "borrow_date", history.end)
+
+    with connection.cursor() as cursor:
+        cursor.execute(ADD_BORROWING_FOREIGN_KEY)
+
+    create_partitions(connection, 3, tables=[PAYMENTS_TABLE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowings', '0007_partition_borrowings'),
+        ('payments', '0007_payment_borrow_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_payments),
+    ]
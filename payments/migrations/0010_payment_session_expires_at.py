@@ -0,0 +1,22 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0009_stripeevent'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='payments_missing_session_idx',
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='session_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0010_payment_session_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('type', 'Fine')),
+                fields=('borrowing', 'borrow_date'),
+                name='payments_one_fine_per_borrowing'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:59
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+# Existing payments have no timestamps: date them by their borrowing,
+# base payments on the borrow date and fines on the return date, and
+# count paid ones as paid that day so past rollups keep their revenue.
+BACKFILL_TIMESTAMPS = """
+UPDATE payments_payment AS payment
+SET created_at = dated.day,
+    paid_at = CASE WHEN payment.status = 'Paid' THEN dated.day END
+FROM (
+    SELECT p.id, p.borrow_date, COALESCE(
+        CASE WHEN p.type = 'Fine' THEN b.actual_return_date END,
+        p.borrow_date
+    )::timestamptz AS day
+    FROM payments_payment AS p
+    JOIN borrowings_borrowing AS b
+        ON b.id = p.borrowing_id AND b.borrow_date = p.borrow_date
+) AS dated
+WHERE payment.id = dated.id AND payment.borrow_date = dated.borrow_date
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0011_payment_one_fine_per_borrowing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='created_at',
+            field=models.DateTimeField(
+                db_default=django.db.models.functions.datetime.Now(),
+                editable=False),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunSQL(BACKFILL_TIMESTAMPS, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(
+                fields=['created_at'],
+                name='payments_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(
+                condition=models.Q(('paid_at__isnull', False)),
+                fields=['paid_at'],
+                name='payments_paid_at_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:59
+
+from django.db import migrations
+
+from library_api_service.partitions import (PAYMENTS_TABLE,
+                                            create_default_partition)
+
+
+def add_default_partition(apps, schema_editor):
+    create_default_partition(schema_editor.connection, PAYMENTS_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowings', '0009_borrowing_default_partition'),
+        ('payments', '0012_payment_created_at_paid_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_default_partition),
+    ]
@@ -1,5 +1,7 @@
 from django.core.validators import URLValidator
 from django.db import models
+from django.db.models.functions import Now
+from django.utils import timezone
 
 from borrowings.models import Borrowing
 
@@ -25,12 +27,80 @@ class Payment(models.Model):
         choices=TypeChoices,
     )
 
+    # Enforced in the database by a (borrowing_id, borrow_date) foreign
+    # key, as the partitioned borrowings table has no unique id alone.
     borrowing = models.ForeignKey(
         Borrowing,
         on_delete=models.PROTECT,
+        db_constraint=False,
         related_name="payments")
+    # Copy of the borrowing's borrow_date, used as the partition key.
+    borrow_date = models.DateField(editable=False)
     session_url = models.TextField(
         blank=True, null=True, validators=[
             URLValidator()])
     session_id = models.CharField(null=True, blank=True, max_length=255)
+    session_expires_at = models.DateTimeField(null=True, blank=True)
     money_to_paid = models.DecimalField(decimal_places=2, max_digits=10)
+    # Set by the database, so raw INSERTs (fines) get it too.
+    created_at = models.DateTimeField(db_default=Now(), editable=False)
+    paid_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["session_id"],
+                name="payments_session_id_idx"),
+            models.Index(
+                fields=["created_at"],
+                name="payments_created_at_idx"),
+            models.Index(
+                fields=["paid_at"],
+                condition=models.Q(paid_at__isnull=False),
+                name="payments_paid_at_idx"),
+            models.Index(
+                fields=["borrowing", "type", "status"],
+                name="payments_borrowing_type_idx"),
+        ]
+        constraints = [
+            # Fines accrue nightly on one row per borrowing, upserted by
+            # PaymentService.accrue_fines and settled at return.
+            models.UniqueConstraint(
+                fields=["borrowing", "borrow_date"],
+                condition=models.Q(type="Fine"),
+                name="payments_one_fine_per_borrowing"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.borrow_date is None:
+            self.borrow_date = self.borrowing.borrow_date
+
+        if self.status == self.StatusChoices.PAID and self.paid_at is None:
+            self.paid_at = timezone.now()
+            update_fields = kwargs.get("update_fields")
+
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "paid_at"}
+
+        super().save(*args, **kwargs)
+
+
+class StripeEvent(models.Model):
+    """A verified Stripe webhook event, stored before it is handled."""
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(processed_at__isnull=True),
+                name="payments_event_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
@@ -1,8 +1,14 @@
 from rest_framework import serializers
+from library_api_service.sparse_fields import SparseFieldsSerializerMixin
 from payments.models import Payment
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsSerializerMixin,
+                        serializers.ModelSerializer):
+    expandable_fields = {
+        "borrowing": ("borrowings.serializers.BorrowingSerializer", {}),
+    }
+
     class Meta:
         model = Payment
         fields = (
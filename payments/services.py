@@ -1,49 +1,268 @@
+import json
+from datetime import UTC, date, datetime
 from decimal import Decimal
 import stripe
 from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
 from borrowings.models import Borrowing
-from payments.models import Payment
+from payments.models import Payment, StripeEvent
+from payments.signals import payments_paid
+from payments.gateways import (CHECKOUT_CURRENCY,
+                               CheckoutSession,
+                               get_payment_gateway)
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+# Both statements upsert the borrowing's single fine row (see the
+# payments_one_fine_per_borrowing constraint, whose predicate the
+# ON CONFLICT clauses repeat). Paid fines are left alone.
+CREATE_OVERDUE_FINES = """
+INSERT INTO payments_payment (
+    status, type, borrowing_id, borrow_date, money_to_paid
+)
+SELECT
+    %s,
+    %s,
+    borrowing.id,
+    borrowing.borrow_date,
+    book.daily_fee
+        * (borrowing.actual_return_date - borrowing.expected_return_date)
+FROM borrowings_borrowing AS borrowing
+JOIN books_book AS book ON book.id = borrowing.book_id
+WHERE borrowing.id = ANY(%s)
+    AND borrowing.actual_return_date > borrowing.expected_return_date
+ON CONFLICT (borrowing_id, borrow_date) WHERE type = 'Fine'
+DO UPDATE SET money_to_paid = EXCLUDED.money_to_paid
+WHERE payments_payment.status = 'Pending'
+RETURNING borrowing_id, id
+"""
+
+# One keyset batch of still-open overdue borrowings. Rows whose amount
+# is already up to date are not rewritten, so a rerun on the same day
+# writes nothing.
+ACCRUE_FINES = """
+WITH overdue AS (
+    SELECT
+        borrowing.id,
+        borrowing.borrow_date,
+        book.daily_fee
+            * (%(today)s::date - borrowing.expected_return_date) AS amount
+    FROM borrowings_borrowing AS borrowing
+    JOIN books_book AS book ON book.id = borrowing.book_id
+    WHERE borrowing.actual_return_date IS NULL
+        AND borrowing.expected_return_date < %(today)s
+        AND borrowing.id > %(after)s
+    ORDER BY borrowing.id
+    LIMIT %(batch_size)s
+), accrued AS (
+    INSERT INTO payments_payment (
+        status, type, borrowing_id, borrow_date, money_to_paid
+    )
+    SELECT %(status)s, %(type)s, id, borrow_date, amount
+    FROM overdue
+    ON CONFLICT (borrowing_id, borrow_date) WHERE type = 'Fine'
+    DO UPDATE SET money_to_paid = EXCLUDED.money_to_paid
+    WHERE payments_payment.status = 'Pending'
+        AND payments_payment.money_to_paid <> EXCLUDED.money_to_paid
+    RETURNING id
+)
+SELECT (SELECT max(id) FROM overdue), (SELECT count(*) FROM accrued)
+"""
+
+# Events whose checkout session settles its payments once paid.
+PAID_SESSION_EVENTS = {
+    "checkout.session.completed",
+    "checkout.session.async_payment_succeeded",
+}
+
+
+def get_metadata_payment_ids(session: dict) -> list[str]:
+    """Ids of the payments a checkout session was created for."""
+    metadata = session.get("metadata") or {}
+
+    if metadata.get("payment_ids"):
+        return metadata["payment_ids"].split(",")
+
+    if metadata.get("payment_id"):
+        return [metadata["payment_id"]]
+
+    return []
 
 
 class PaymentService:
 
     @staticmethod
     def create_checkout_session(
-            borrowing: Borrowing,
-            payment: Payment,
-            money_to_paid=Decimal(0)):
-        session = stripe.checkout.Session.create(
+            payments: list[Payment], now=None) -> CheckoutSession:
+        """
+        One checkout session with a line item per payment.
+
+        Time is cut into ``CHECKOUT_SESSION_TTL`` windows. A session
+        expires at the end of the window after the one it was created
+        in, and sessions asked for within one window share an
+        idempotency key, so concurrent requests get the same session.
+        """
+        now = now or timezone.now()
+        ttl = settings.CHECKOUT_SESSION_TTL
+        window = int(now.timestamp()) // ttl
+        payment_ids = [str(payment.id) for payment in payments]
+        metadata = {"payment_id": payment_ids[0]}
+
+        # Multi-book checkouts settle several payments with one session.
+        if len(payment_ids) > 1:
+            metadata["payment_ids"] = ",".join(payment_ids)
+
+        return get_payment_gateway().create_checkout_session(
             line_items=[{
                 'price_data': {
-                    'currency': 'usd',
+                    'currency': CHECKOUT_CURRENCY,
                     'product_data': {
-                        'name': borrowing.book.title,
+                        'name': payment.borrowing.book.title,
                     },
-                    'unit_amount': int(money_to_paid * 100),
+                    'unit_amount': int(payment.money_to_paid * 100),
                 },
                 'quantity': 1,
-            }],
-            mode='payment',
-            success_url=(
-                f"{settings.STRIPE_SUCCESS_URL}"
-                "?session_id={CHECKOUT_SESSION_ID}"
+            } for payment in payments],
+            metadata=metadata,
+            expires_at=datetime.fromtimestamp((window + 2) * ttl, tz=UTC),
+            idempotency_key=(
+                f"checkout-session-{'-'.join(payment_ids)}-{window}"
             ),
-            cancel_url=settings.STRIPE_CANCEL_URL,
-            metadata={
-                "payment_id": payment.id,
-            },
         )
-        return session
 
     @staticmethod
-    def create_base_payment(borrowing):
+    def store_checkout_session(
+            payments: list[Payment],
+            session: CheckoutSession,
+            replace=True) -> None:
+        """
+        Save ``session`` on ``payments``. With ``replace=False`` payments
+        that got a session meanwhile keep it.
+        """
+        stored = Payment.objects.filter(
+            pk__in=[payment.pk for payment in payments]
+        )
+
+        if not replace:
+            stored = stored.filter(session_id__isnull=True)
+
+        stored.update(
+            session_id=session.id,
+            session_url=session.url,
+            session_expires_at=session.expires_at,
+        )
+
+        for payment in payments:
+            payment.session_id = session.id
+            payment.session_url = session.url
+            payment.session_expires_at = session.expires_at
+
+    @staticmethod
+    def get_checkout_session(payment: Payment) -> Payment:
+        """
+        Give pending ``payment`` a checkout session that stays open for
+        at least ``CHECKOUT_SESSION_MIN_REMAINING`` seconds.
+
+        Sessions are only created once a client asks for one. The
+        session stored on the payment is reused until it gets that close
+        to expiring, then expired at the gateway and replaced by a new
+        one for every pending payment that shared it.
+        """
+        if payment.status != Payment.StatusChoices.PENDING:
+            return payment
+
+        # A fine keeps accruing until the book is returned.
+        if payment.type == Payment.TypeChoices.FINE and \
+                payment.borrowing.actual_return_date is None:
+            return payment
+
+        now = timezone.now()
+        expires_at = payment.session_expires_at
+
+        if payment.session_id and expires_at and \
+                (expires_at - now).total_seconds() > \
+                settings.CHECKOUT_SESSION_MIN_REMAINING:
+            return payment
+
+        group = Q(pk=payment.pk)
+
+        if payment.session_id:
+            group |= Q(session_id=payment.session_id)
+
+        if payment.session_id and (expires_at is None or expires_at > now):
+            gateway = get_payment_gateway()
+            session_id = payment.session_id
+
+            try:
+                gateway.expire_checkout_session(session_id)
+            except stripe.error.InvalidRequestError:
+                # Not open any more: replaced by a concurrent request,
+                # paid (its webhook settles the payments), or expired.
+                payment.refresh_from_db(
+                    fields=["session_id", "session_url", "session_expires_at"]
+                )
+
+                if payment.session_id != session_id or \
+                        gateway.is_checkout_session_complete(session_id):
+                    return payment
+            else:
+                # Recorded so a failure below does not expire it again.
+                Payment.objects.filter(group).update(session_expires_at=now)
+
+        payments = list(
+            Payment.objects.select_related("borrowing__book").filter(
+                group, status=Payment.StatusChoices.PENDING
+            ).order_by("id")
+        )
+        session = PaymentService.create_checkout_session(payments, now)
+        PaymentService.store_checkout_session([payment, *payments], session)
+
+        return payment
+
+    @staticmethod
+    def schedule_batch_checkout_session(payments: list[Payment]) -> None:
+        """
+        Create the shared session of a multi-book checkout once
+        ``payments`` are committed, so no transaction stays open for
+        the Stripe round trip.
+        """
+        from payments.tasks import create_batch_checkout_session
+
+        payment_ids = [payment.id for payment in payments]
+        transaction.on_commit(
+            lambda: create_batch_checkout_session.delay(payment_ids)
+        )
+
+    @staticmethod
+    def attach_batch_checkout_session(payment_ids: list[int]) -> None:
+        # Payments a client already asked a session for keep their own.
+        payments = list(
+            Payment.objects.select_related("borrowing__book").filter(
+                pk__in=payment_ids,
+                session_id__isnull=True,
+            ).order_by("id")
+        )
+
+        if not payments:
+            return
+
+        PaymentService.store_checkout_session(
+            payments,
+            PaymentService.create_checkout_session(payments),
+            replace=False,
+        )
+
+    @staticmethod
+    def calculate_base_fee(borrowing: Borrowing) -> Decimal:
         start_date = borrowing.borrow_date
         end_date = borrowing.expected_return_date
         price_per_day = borrowing.book.daily_fee
         duration = max(1, (end_date - start_date).days)
-        amount = Decimal(price_per_day * duration)
+        return Decimal(price_per_day * duration)
+
+    @staticmethod
+    def create_base_payment(borrowing):
+        amount = PaymentService.calculate_base_fee(borrowing)
 
         payment = Payment.objects.create(
             status=Payment.StatusChoices.PENDING,
@@ -52,42 +271,198 @@ class PaymentService:
             money_to_paid=amount,
         )
 
-        payment_session = PaymentService.create_checkout_session(
-            borrowing=borrowing, payment=payment, money_to_paid=amount)
+        return payment
 
-        payment.session_url = payment_session.url
-        payment.session_id = payment_session.id
-        payment.save(update_fields=['session_url', 'session_id'])
+    @staticmethod
+    def create_batch_payments(borrowings: list[Borrowing]) -> list[Payment]:
+        """Base payments for ``borrowings``, settled in one session."""
+        payments = Payment.objects.bulk_create(
+            Payment(
+                status=Payment.StatusChoices.PENDING,
+                type=Payment.TypeChoices.PAYMENT,
+                borrowing=borrowing,
+                borrow_date=borrowing.borrow_date,
+                money_to_paid=PaymentService.calculate_base_fee(borrowing),
+            )
+            for borrowing in borrowings
+        )
 
-        return payment
+        PaymentService.schedule_batch_checkout_session(payments)
+
+        return payments
 
     @staticmethod
-    def create_fine_payment(borrowing: Borrowing) -> Payment:
-        if borrowing.actual_return_date:
-            overdue_days = max(
-                1,
-                (
-                    borrowing.actual_return_date -
-                    borrowing.expected_return_date
-                ).days
+    def create_fine_payment(borrowing: Borrowing) -> Payment | None:
+        """
+        Settle the fine of just returned ``borrowing`` at its final
+        amount. Usually the nightly accrual has created it already, and
+        this only updates the row.
+        """
+        fine_id = PaymentService.create_fine_payments(
+            [borrowing.id]
+        ).get(borrowing.id)
+
+        if fine_id is None:
+            return None
+
+        return Payment.objects.get(
+            pk=fine_id, borrow_date=borrowing.borrow_date
+        )
+
+    @staticmethod
+    def create_fine_payments(borrowing_ids: list[int]) -> dict[int, int]:
+        """
+        Create or settle fines for the overdue returned borrowings among
+        ``borrowing_ids`` in one INSERT ... SELECT. Returns
+        ``{borrowing id: fine payment id}``.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                CREATE_OVERDUE_FINES,
+                [
+                    Payment.StatusChoices.PENDING,
+                    Payment.TypeChoices.FINE,
+                    borrowing_ids,
+                ],
             )
+            fines = dict(cursor.fetchall())
+
+        return fines
+
+    @staticmethod
+    def accrue_fines(today=None, batch_size=1000) -> int:
+        """
+        Bring the pending fine of every overdue, unreturned borrowing up
+        to ``today``, ``batch_size`` borrowings per statement. Returns
+        the number of fines created or changed.
+        """
+        today = today or date.today()
+        after = 0
+        accrued = 0
+
+        with connection.cursor() as cursor:
+            while True:
+                cursor.execute(
+                    ACCRUE_FINES,
+                    {
+                        "today": today,
+                        "after": after,
+                        "batch_size": batch_size,
+                        "status": Payment.StatusChoices.PENDING,
+                        "type": Payment.TypeChoices.FINE,
+                    },
+                )
+                last_id, count = cursor.fetchone()
+
+                if last_id is None:
+                    return accrued
+
+                after = last_id
+                accrued += count
+
+    @staticmethod
+    def record_stripe_event(event, payload: bytes) -> None:
+        """
+        Store a verified webhook event for ``process_stripe_events``.
+        Stripe may deliver an event more than once; repeats are ignored.
+        """
+        StripeEvent.objects.bulk_create(
+            [
+                StripeEvent(
+                    event_id=event.id,
+                    type=event.type,
+                    payload=json.loads(payload),
+                ),
+            ],
+            ignore_conflicts=True,
+        )
 
-            if overdue_days > 0:
-                price_per_day = borrowing.book.daily_fee
-                amount = Decimal(price_per_day * overdue_days)
+        from payments.tasks import process_stripe_events
 
-                fine = Payment.objects.create(
-                    status=Payment.StatusChoices.PENDING,
-                    type=Payment.TypeChoices.FINE,
-                    borrowing=borrowing,
-                    money_to_paid=amount,
+        transaction.on_commit(lambda: process_stripe_events.delay())
+
+    @staticmethod
+    def process_stripe_events(batch_size: int) -> int:
+        """
+        Handle stored Stripe events in batches of ``batch_size`` and
+        return how many were handled.
+
+        Each batch marks the payments of all its paid checkout sessions
+        in one UPDATE, so an event replayed or arriving after its
+        payments were settled changes nothing. Concurrent workers skip
+        events another one has claimed.
+        """
+        processed = 0
+
+        while True:
+            with transaction.atomic():
+                events = list(
+                    StripeEvent.objects.select_for_update(
+                        skip_locked=True
+                    ).filter(
+                        processed_at__isnull=True
+                    ).order_by("id")[:batch_size]
                 )
 
-                payment_session = PaymentService.create_checkout_session(
-                    borrowing=borrowing, payment=fine, money_to_paid=amount)
+                if not events:
+                    return processed
+
+                sessions = [
+                    event.payload["data"]["object"]
+                    for event in events
+                    if event.type in PAID_SESSION_EVENTS
+                    and event.payload["data"]["object"].get(
+                        "payment_status"
+                    ) == "paid"
+                ]
+                PaymentService.mark_sessions_paid(
+                    {session["id"] for session in sessions},
+                    {
+                        int(payment_id)
+                        for session in sessions
+                        for payment_id in get_metadata_payment_ids(session)
+                    },
+                )
+                StripeEvent.objects.filter(
+                    pk__in=[event.pk for event in events]
+                ).update(processed_at=timezone.now())
+
+            processed += len(events)
+
+    @staticmethod
+    def mark_sessions_paid(
+            session_ids: set[str], payment_ids=frozenset()) -> list[Payment]:
+        """
+        Mark the pending payments of ``session_ids`` paid, along with
+        ``payment_ids`` taken from the sessions' metadata: a session
+        replaced just before it was paid is no longer stored on them.
+        """
+        if not session_ids and not payment_ids:
+            return []
+
+        # Locked so an event for the same session handled concurrently
+        # finds them paid and does not notify twice.
+        payments = list(
+            Payment.objects.select_for_update(of=("self",)).select_related(
+                "borrowing__user"
+            ).filter(
+                Q(session_id__in=session_ids) | Q(pk__in=payment_ids),
+                status=Payment.StatusChoices.PENDING,
+            ).order_by("id")
+        )
+
+        if not payments:
+            return []
+
+        paid_at = timezone.now()
+        Payment.objects.filter(
+            pk__in=[payment.pk for payment in payments]
+        ).update(status=Payment.StatusChoices.PAID, paid_at=paid_at)
+
+        for payment in payments:
+            payment.status = Payment.StatusChoices.PAID
+            payment.paid_at = paid_at
 
-                fine.session_url = payment_session.url
-                fine.session_id = payment_session.id
-                fine.save(update_fields=['session_url', 'session_id'])
+        payments_paid.send(sender=Payment, payments=payments)
 
-                return fine
+        return payments
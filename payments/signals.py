@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent with ``payments`` after Stripe events mark them paid in one
+# UPDATE, which skips post_save.
+payments_paid = Signal()
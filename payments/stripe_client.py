@@ -0,0 +1,142 @@
+"""
+Stripe API access shared by every payment call: one pooled keep-alive
+HTTP session per process, timeouts, bounded retries and a circuit
+breaker.
+"""
+from functools import cache
+
+import requests
+import stripe
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.core.signals import setting_changed
+from requests.adapters import HTTPAdapter
+
+from library_api_service.circuit_breaker import CircuitBreaker
+
+# Errors that mean Stripe is unavailable rather than that the request
+# was wrong; only these count towards opening the circuit.
+STRIPE_FAILURES = (
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+    stripe.error.RateLimitError,
+)
+
+POOL_REQUESTS_KEY = "stripe:pool:requests"
+POOL_CONNECTIONS_KEY = "stripe:pool:connections"
+
+_seen = {"requests": 0, "connections": 0}
+
+
+@cache
+def get_http_session() -> requests.Session:
+    session = requests.Session()
+    # Retries are left to the Stripe SDK, which adds jitter and reuses
+    # the idempotency key.
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.STRIPE_POOL_SIZE,
+        max_retries=0,
+    )
+    session.mount("https://", adapter)
+
+    return session
+
+
+@cache
+def get_stripe_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        "stripe",
+        failures=STRIPE_FAILURES,
+        failure_rate=settings.STRIPE_BREAKER_FAILURE_RATE,
+        min_calls=settings.STRIPE_BREAKER_MIN_CALLS,
+        window=settings.STRIPE_BREAKER_WINDOW,
+        open_seconds=settings.STRIPE_BREAKER_OPEN_SECONDS,
+    )
+
+
+def configure_stripe():
+    """Point the Stripe SDK at the pooled session."""
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+    stripe.default_http_client = stripe.RequestsClient(
+        session=get_http_session(),
+        timeout=(settings.STRIPE_CONNECT_TIMEOUT,
+                 settings.STRIPE_READ_TIMEOUT),
+    )
+
+
+def _reset_stripe_client(*, setting, **kwargs):
+    if setting.startswith("STRIPE_"):
+        get_http_session.cache_clear()
+        get_stripe_breaker.cache_clear()
+        configure_stripe()
+
+
+setting_changed.connect(_reset_stripe_client)
+
+
+def call_stripe(func, *args, **kwargs):
+    """
+    Call a Stripe SDK method through the circuit breaker.
+
+    Raises ``CircuitOpen`` without calling Stripe while it is failing.
+    """
+    try:
+        return get_stripe_breaker().call(func, *args, **kwargs)
+    finally:
+        record_pool_usage()
+
+
+def get_pool_stats() -> dict:
+    """Connection pool usage of this process."""
+    adapter = get_http_session().get_adapter("https://")
+    stats = {
+        "size": settings.STRIPE_POOL_SIZE,
+        "in_use": 0,
+        "requests": 0,
+        "connections": 0,
+    }
+
+    for key in adapter.poolmanager.pools.keys():
+        pool = adapter.poolmanager.pools.get(key)
+
+        if pool is None:
+            continue
+
+        stats["in_use"] += pool.pool.maxsize - pool.pool.qsize()
+        stats["requests"] += pool.num_requests
+        stats["connections"] += pool.num_connections
+
+    return stats
+
+
+def record_pool_usage():
+    """Add this process's new requests and connections to the totals."""
+    stats = get_pool_stats()
+
+    for name, key in (("requests", POOL_REQUESTS_KEY),
+                      ("connections", POOL_CONNECTIONS_KEY)):
+        delta = stats[name] - _seen[name]
+
+        if delta > 0:
+            django_cache.add(key, 0, None)
+            django_cache.incr(key, delta)
+
+        _seen[name] = stats[name]
+
+
+def get_stripe_metrics() -> dict:
+    """
+    Breaker state and pool usage across every worker. ``connections``
+    counts TLS connections opened; with keep-alive working it stays far
+    below ``requests``.
+    """
+    return {
+        "breaker": get_stripe_breaker().stats(),
+        "pool": {
+            "size": settings.STRIPE_POOL_SIZE,
+            "requests": django_cache.get(POOL_REQUESTS_KEY, 0),
+            "connections": django_cache.get(POOL_CONNECTIONS_KEY, 0),
+        },
+    }
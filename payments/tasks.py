@@ -0,0 +1,52 @@
+import json
+
+import stripe
+from celery import shared_task
+from django.conf import settings
+
+from library_api_service.circuit_breaker import CircuitOpen
+from payments.gateways import FakeGateway
+from payments.services import PaymentService
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(stripe.error.StripeError,),
+    retry_backoff=True,
+    retry_kwargs={
+        "max_retries": 5
+    }
+)
+def create_batch_checkout_session(self, payment_ids: list[int]):
+    try:
+        PaymentService.attach_batch_checkout_session(payment_ids)
+    except CircuitOpen as exc:
+        raise self.retry(exc=exc, countdown=exc.retry_after)
+
+
+@shared_task
+def process_stripe_events():
+    """
+    Handle stored Stripe webhook events. Queued by the webhook, and run
+    every minute for events whose task was lost.
+    """
+    return PaymentService.process_stripe_events(
+        settings.STRIPE_EVENT_BATCH_SIZE
+    )
+
+
+@shared_task
+def send_fake_webhook(session_id: str):
+    """Report a ``FakeGateway`` checkout session as paid."""
+    payload = FakeGateway.build_paid_event(session_id)
+    PaymentService.record_stripe_event(
+        stripe.Event.construct_from(json.loads(payload), None), payload
+    )
+
+
+@shared_task
+def accrue_fines():
+    """Bring the fines of overdue, unreturned borrowings up to today."""
+    return PaymentService.accrue_fines(
+        batch_size=settings.FINE_ACCRUAL_BATCH_SIZE
+    )
@@ -1,26 +1,66 @@
 import datetime
+import hashlib
+import hmac
+import json
+import time
 from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 import stripe
+from celery.exceptions import Retry
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 from rest_framework.reverse import reverse
+from borrowings.models import Borrowing
 from borrowings.tests.tests_borrowings import (sample_book,
                                                BORROWINGS_URL,
+                                               explain_indexed,
                                                sample_borrowing)
-from payments.models import Payment
+from library_api_service.circuit_breaker import (CLOSED,
+                                                 HALF_OPEN,
+                                                 OPEN,
+                                                 CircuitBreaker,
+                                                 CircuitOpen)
+from library_api_service.testing import QueryCountAssertionsMixin
+from payments.gateways import (FakeGateway,
+                               PaymentGateway,
+                               StripeGateway,
+                               check_checkout_session_ttl,
+                               get_payment_gateway)
+from payments.models import Payment, StripeEvent
 from payments.serializers import PaymentSerializer
+from payments.services import PaymentService
+from payments.stripe_client import (call_stripe,
+                                    get_http_session,
+                                    get_stripe_breaker)
+from payments.tasks import (create_batch_checkout_session,
+                            process_stripe_events,
+                            send_fake_webhook)
+from tg_notifications.tasks import send_telegram_notification
 
 PAYMENTS_URL = reverse("payments:payments-list")
+PAYMENTS_EXPORT_URL = reverse("payments:payments-export")
+STRIPE_SUCCESS_URL = reverse("payments:stripe-success")
+STRIPE_WEBHOOK_URL = reverse("payments:stripe-webhook")
+STRIPE_METRICS_URL = reverse("payments:stripe-metrics")
 
 user_model = get_user_model()
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
 
 def sample_payment(client: user_model):
+    # Fines of unreturned borrowings are still accruing: return it first.
     borrowing = sample_borrowing(client=client)
+    borrowing.actual_return_date = date.today()
+    Borrowing.objects.filter(pk=borrowing.pk).update(
+        actual_return_date=borrowing.actual_return_date
+    )
 
     return Payment.objects.create(
         type=Payment.TypeChoices.FINE,
@@ -69,6 +109,236 @@ class AuthenticatedPaymentsTest(TestCase):
 
         self.assertIn("payment_session_url", response.data)
 
+    @mock.patch("stripe.checkout.Session.create")
+    def test_checkout_session_created_on_first_request(self, session_create):
+        session_create.return_value = SimpleNamespace(
+            id="cs_test_1",
+            url="https://checkout.stripe.com/c/pay/cs_test_1",
+        )
+        payload = {
+            "expected_return_date": str(date.today()),
+            "book": sample_book().pk,
+        }
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(BORROWINGS_URL, payload)
+
+        session_create.assert_not_called()
+
+        payment = Payment.objects.get(borrowing_id=response.data["id"])
+        polls = [
+            self.client.get(response.data["payment_status_url"])
+            for _ in range(2)
+        ]
+        window = int(time.time()) // settings.CHECKOUT_SESSION_TTL
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsNone(response.data["payment_session_url"])
+        session_create.assert_called_once()
+        self.assertEqual(
+            session_create.call_args.kwargs["idempotency_key"],
+            f"checkout-session-{payment.id}-{window}"
+        )
+        self.assertEqual(
+            session_create.call_args.kwargs["expires_at"],
+            (window + 2) * settings.CHECKOUT_SESSION_TTL
+        )
+
+        for poll in polls:
+            self.assertEqual(poll.status_code, status.HTTP_200_OK)
+            self.assertEqual(poll.data["session_id"], "cs_test_1")
+            self.assertEqual(
+                poll.data["session_url"],
+                "https://checkout.stripe.com/c/pay/cs_test_1"
+            )
+
+    @mock.patch("stripe.checkout.Session.create")
+    @mock.patch("stripe.checkout.Session.expire")
+    def test_expiring_checkout_session_is_replaced(
+            self, session_expire, session_create):
+        session_create.return_value = SimpleNamespace(
+            id="cs_test_new",
+            url="https://checkout.stripe.com/c/pay/cs_test_new",
+        )
+        payment, other = (sample_payment(client=self.user) for _ in range(2))
+        Payment.objects.filter(pk__in=[payment.pk, other.pk]).update(
+            session_id="cs_test_old",
+            session_url="https://checkout.stripe.com/c/pay/cs_test_old",
+            session_expires_at=timezone.now() + timedelta(minutes=10),
+        )
+
+        response = self.client.get(
+            reverse("payments:payments-checkout-session", args=[payment.pk])
+        )
+
+        self.assertEqual(response.data["session_id"], "cs_test_new")
+        session_expire.assert_called_once_with("cs_test_old")
+        self.assertEqual(
+            session_create.call_args.kwargs["metadata"]["payment_ids"],
+            f"{payment.pk},{other.pk}"
+        )
+        self.assertEqual(
+            set(Payment.objects.values_list("session_id", flat=True)),
+            {"cs_test_new"}
+        )
+
+    @mock.patch("stripe.checkout.Session.create")
+    @mock.patch("stripe.checkout.Session.retrieve")
+    @mock.patch("stripe.checkout.Session.expire")
+    def test_completed_session_is_not_replaced(
+            self, session_expire, session_retrieve, session_create):
+        session_expire.side_effect = stripe.error.InvalidRequestError(
+            "Only Checkout Sessions with a status in [\"open\"] can be "
+            "expired.", None
+        )
+        session_retrieve.return_value = SimpleNamespace(status="complete")
+        payment = sample_payment(client=self.user)
+        Payment.objects.filter(pk=payment.pk).update(
+            session_id="cs_test_paid",
+            session_expires_at=timezone.now() + timedelta(minutes=10),
+        )
+
+        response = self.client.get(
+            reverse("payments:payments-checkout-session", args=[payment.pk])
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["session_id"], "cs_test_paid")
+        session_create.assert_not_called()
+
+    @mock.patch("stripe.checkout.Session.create")
+    @mock.patch("stripe.checkout.Session.retrieve")
+    @mock.patch("stripe.checkout.Session.expire")
+    def test_session_expired_elsewhere_is_replaced(
+            self, session_expire, session_retrieve, session_create):
+        session_expire.side_effect = stripe.error.InvalidRequestError(
+            "No such checkout.session: 'cs_test_old'", None
+        )
+        session_retrieve.side_effect = session_expire.side_effect
+        session_create.return_value = SimpleNamespace(
+            id="cs_test_new",
+            url="https://checkout.stripe.com/c/pay/cs_test_new",
+        )
+        payment = sample_payment(client=self.user)
+        Payment.objects.filter(pk=payment.pk).update(
+            session_id="cs_test_old",
+            session_expires_at=timezone.now() + timedelta(minutes=10),
+        )
+
+        response = self.client.get(
+            reverse("payments:payments-checkout-session", args=[payment.pk])
+        )
+
+        self.assertEqual(response.data["session_id"], "cs_test_new")
+        session_retrieve.assert_called_once_with("cs_test_old")
+
+    @mock.patch("stripe.checkout.Session.create")
+    @mock.patch("stripe.checkout.Session.retrieve")
+    @mock.patch("stripe.checkout.Session.expire")
+    def test_concurrent_replacement_is_returned(
+            self, session_expire, session_retrieve, session_create):
+        payment = sample_payment(client=self.user)
+        Payment.objects.filter(pk=payment.pk).update(
+            session_id="cs_test_old",
+            session_expires_at=timezone.now() + timedelta(minutes=10),
+        )
+
+        def replaced_meanwhile(session_id):
+            Payment.objects.filter(pk=payment.pk).update(
+                session_id="cs_test_other",
+                session_url="https://checkout.stripe.com/c/pay/cs_test_other",
+                session_expires_at=timezone.now() + timedelta(hours=6),
+            )
+            raise stripe.error.InvalidRequestError(
+                "Only Checkout Sessions with a status in [\"open\"] can "
+                "be expired.", None
+            )
+
+        session_expire.side_effect = replaced_meanwhile
+
+        response = self.client.get(
+            reverse("payments:payments-checkout-session", args=[payment.pk])
+        )
+
+        self.assertEqual(response.data["session_id"], "cs_test_other")
+        self.assertEqual(
+            response.data["session_url"],
+            "https://checkout.stripe.com/c/pay/cs_test_other"
+        )
+        session_retrieve.assert_not_called()
+        session_create.assert_not_called()
+
+    @mock.patch("stripe.checkout.Session.create")
+    def test_batch_session_keeps_sessions_fetched_meanwhile(
+            self, session_create):
+        payments = [sample_payment(client=self.user) for _ in range(2)]
+
+        def fetched_meanwhile(**kwargs):
+            Payment.objects.filter(pk=payments[0].pk).update(
+                session_id="cs_test_own"
+            )
+            return SimpleNamespace(
+                id="cs_test_batch",
+                url="https://checkout.stripe.com/c/pay/cs_test_batch",
+            )
+
+        session_create.side_effect = fetched_meanwhile
+
+        PaymentService.attach_batch_checkout_session(
+            [payment.pk for payment in payments]
+        )
+
+        self.assertEqual(
+            list(
+                Payment.objects.order_by("id").values_list(
+                    "session_id", flat=True
+                )
+            ),
+            ["cs_test_own", "cs_test_batch"]
+        )
+
+    @mock.patch("stripe.checkout.Session.create")
+    def test_paid_payment_gets_no_session(self, session_create):
+        payment = sample_payment(client=self.user)
+        Payment.objects.filter(pk=payment.pk).update(
+            status=Payment.StatusChoices.PAID
+        )
+
+        response = self.client.get(
+            reverse("payments:payments-checkout-session", args=[payment.pk])
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["session_id"])
+        session_create.assert_not_called()
+
+    @mock.patch("stripe.checkout.Session.create")
+    def test_failed_checkout_session_is_retried(self, session_create):
+        payment = sample_payment(client=self.user)
+        url = reverse(
+            "payments:payments-checkout-session", args=[payment.pk]
+        )
+        session_create.side_effect = stripe.error.APIConnectionError("down")
+
+        failed = self.client.get(url)
+
+        payment.refresh_from_db()
+        self.assertEqual(
+            failed.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self.assertIsNone(payment.session_id)
+
+        session_create.side_effect = None
+        session_create.return_value = SimpleNamespace(
+            id="cs_test_2",
+            url="https://checkout.stripe.com/c/pay/cs_test_2",
+        )
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["session_id"], "cs_test_2")
+
     def test_payments_queryset(self):
         sample_payment(client=self.user)
 
@@ -80,7 +350,80 @@ class AuthenticatedPaymentsTest(TestCase):
         serializers = PaymentSerializer(users_payments, many=True)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializers.data)
+        self.assertEqual(response.data["results"], serializers.data)
+
+    def test_fast_list_matches_serializer_output(self):
+        sample_payment(client=self.user)
+        sample_payment(client=self.user)
+
+        fast = self.client.get(PAYMENTS_URL)
+
+        with override_settings(FAST_LIST_SERIALIZATION=False):
+            slow = self.client.get(PAYMENTS_URL)
+
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_expand_borrowing(self):
+        payment = sample_payment(client=self.user)
+
+        response = self.client.get(
+            PAYMENTS_URL,
+            {
+                "fields": "money_to_paid",
+                "expand": "borrowing",
+            }
+        )
+
+        self.assertEqual(
+            response.data["results"],
+            [
+                {
+                    "money_to_paid": "100.00",
+                    "borrowing": {
+                        "id": payment.borrowing.id,
+                        "borrow_date": str(payment.borrowing.borrow_date),
+                        "expected_return_date": str(
+                            payment.borrowing.expected_return_date
+                        ),
+                        "actual_return_date": str(
+                            payment.borrowing.actual_return_date
+                        ),
+                        "book": payment.borrowing.book_id,
+                        "user": self.user.id,
+                    },
+                }
+            ]
+        )
+
+    def test_export_csv_only_own_payments(self):
+        payment = sample_payment(client=self.user)
+        sample_payment(
+            client=user_model.objects.create_user(
+                email="other@example.com",
+                password="password",
+            )
+        )
+
+        response = self.client.get(
+            PAYMENTS_EXPORT_URL,
+            {
+                "file_format": "csv",
+            }
+        )
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            lines,
+            [
+                "id,status,type,borrowing,session_id,session_url,"
+                "money_to_paid",
+                f"{payment.id},Pending,Fine,{payment.borrowing_id},,,"
+                "100.00",
+            ]
+        )
 
     def test_fine_fee_calculation(self):
         book_obj = sample_book()
@@ -94,10 +437,11 @@ class AuthenticatedPaymentsTest(TestCase):
             reverse(
                 "borrowings:borrowings-return-borrowing",
                 kwargs={
-                    "pk": borrowing.id}),
-            format="json")
+                    "pk": borrowing.id}))
 
-        payment_session_url = response.data["payment_session_url"]
+        payment_session_url = self.client.get(
+            response.data["payment_status_url"]
+        ).data["session_url"]
         session_id = payment_session_url.split("#")[0][34:]
         checkout_session = stripe.checkout.Session.retrieve(session_id)
         expected_amount_to_pay = checkout_session.amount_total / 100
@@ -120,13 +464,11 @@ class AuthenticatedPaymentsTest(TestCase):
             "book": book_obj.pk,
         }
 
-        response = self.client.post(
-            BORROWINGS_URL,
-            payload,
-            format="json"
-        )
+        response = self.client.post(BORROWINGS_URL, payload)
 
-        payment_session_url = response.data["payment_session_url"]
+        payment_session_url = self.client.get(
+            response.data["payment_status_url"]
+        ).data["session_url"]
         session_id = payment_session_url.split("#")[0][34:]
         checkout_session = stripe.checkout.Session.retrieve(session_id)
         expected_amount_to_pay = checkout_session.amount_total / 100
@@ -135,3 +477,719 @@ class AuthenticatedPaymentsTest(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(base_fee, expected_amount_to_pay)
+
+
+class PaymentQueryBudgetTest(QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+        self.client.force_authenticate(self.user)
+
+    def add_payments(self, count):
+        for _ in range(count):
+            sample_payment(client=self.user)
+
+    def test_list_query_count_is_constant(self):
+        self.assertQueryCountConstant(
+            lambda: self.client.get(PAYMENTS_URL),
+            self.add_payments,
+        )
+
+    def test_expanded_list_query_count_is_constant(self):
+        self.assertQueryCountConstant(
+            lambda: self.client.get(PAYMENTS_URL, {"expand": "borrowing"}),
+            self.add_payments,
+        )
+
+
+def sign_payload(payload: bytes, secret: str, timestamp=None) -> str:
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(
+        secret.encode(),
+        f"{timestamp}.".encode() + payload,
+        hashlib.sha256,
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def sample_event(
+        session_id="cs_test_1",
+        event_id="evt_1",
+        type="checkout.session.completed",
+        payment_status="paid",
+        metadata=None):
+    return {
+        "id": event_id,
+        "object": "event",
+        "type": type,
+        "data": {
+            "object": {
+                "id": session_id,
+                "object": "checkout.session",
+                "payment_status": payment_status,
+                "metadata": metadata or {},
+            },
+        },
+    }
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+@mock.patch.object(process_stripe_events, "delay")
+class StripeWebhookTest(TestCase):
+    def post_event(self, event, secret="whsec_test"):
+        payload = json.dumps(event).encode()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                STRIPE_WEBHOOK_URL,
+                payload,
+                content_type="application/json",
+                headers={"Stripe-Signature": sign_payload(payload, secret)},
+            )
+
+    def test_signed_event_is_stored_and_queued(self, delay):
+        with self.assertNumQueries(1):
+            response = self.post_event(sample_event())
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        event = StripeEvent.objects.get()
+        self.assertEqual(event.event_id, "evt_1")
+        self.assertEqual(event.type, "checkout.session.completed")
+        self.assertEqual(
+            event.payload["data"]["object"]["id"], "cs_test_1"
+        )
+        self.assertIsNone(event.processed_at)
+        delay.assert_called_once_with()
+
+    def test_redelivered_event_is_stored_once(self, delay):
+        self.post_event(sample_event())
+        response = self.post_event(sample_event())
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+
+    def test_bad_signature_is_rejected(self, delay):
+        response = self.post_event(sample_event(), secret="whsec_other")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+        delay.assert_not_called()
+
+    @override_settings(STRIPE_WEBHOOK_SECRET=None)
+    def test_unconfigured_secret_is_unavailable(self, delay):
+        with self.assertLogs("payments.views", "ERROR"):
+            response = self.post_event(sample_event())
+
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_missing_signature_is_rejected(self, delay):
+        response = self.client.post(
+            STRIPE_WEBHOOK_URL,
+            sample_event(),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+
+@mock.patch.object(send_telegram_notification, "delay")
+class StripeEventProcessingTest(TestCase):
+    def setUp(self):
+        self.user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+        self.payments = [sample_payment(client=self.user) for _ in range(3)]
+        # The first two were checked out together in one session.
+        Payment.objects.filter(pk__in=[self.payments[0].pk,
+                                       self.payments[1].pk]).update(
+            session_id="cs_batch"
+        )
+        Payment.objects.filter(pk=self.payments[2].pk).update(
+            session_id="cs_single"
+        )
+
+    def add_event(self, **kwargs):
+        event = sample_event(**kwargs)
+
+        return StripeEvent.objects.create(
+            event_id=event["id"], type=event["type"], payload=event
+        )
+
+    def get_statuses(self):
+        return list(
+            Payment.objects.filter(
+                pk__in=[payment.pk for payment in self.payments]
+            ).order_by("id").values_list("status", flat=True)
+        )
+
+    def test_paid_session_settles_all_its_payments(self, delay):
+        self.add_event(session_id="cs_batch")
+
+        self.assertEqual(process_stripe_events(), 1)
+        self.assertEqual(
+            self.get_statuses(),
+            [Payment.StatusChoices.PAID,
+             Payment.StatusChoices.PAID,
+             Payment.StatusChoices.PENDING],
+        )
+        self.assertFalse(
+            StripeEvent.objects.filter(processed_at__isnull=True).exists()
+        )
+        self.assertEqual(delay.call_count, 2)
+        self.assertIn(self.user.email, delay.call_args.args[0])
+
+    def test_events_are_handled_in_batches(self, delay):
+        self.add_event(session_id="cs_batch", event_id="evt_1")
+        self.add_event(session_id="cs_single", event_id="evt_2")
+        self.add_event(
+            session_id="cs_single",
+            event_id="evt_3",
+            type="checkout.session.async_payment_succeeded",
+        )
+
+        # Two batches of four queries and the final empty one, each
+        # wrapped in a savepoint.
+        with self.assertNumQueries(14):
+            handled = PaymentService.process_stripe_events(batch_size=2)
+
+        self.assertEqual(handled, 3)
+        self.assertEqual(
+            self.get_statuses(), [Payment.StatusChoices.PAID] * 3
+        )
+        # The repeated cs_single event finds its payment already paid.
+        self.assertEqual(delay.call_count, 3)
+
+    def test_superseded_session_settles_its_payments(self, delay):
+        # Paid just before get_checkout_session replaced it.
+        self.add_event(
+            session_id="cs_superseded",
+            metadata={
+                "payment_id": str(self.payments[0].pk),
+                "payment_ids": f"{self.payments[0].pk},{self.payments[1].pk}",
+            },
+        )
+
+        self.assertEqual(process_stripe_events(), 1)
+        self.assertEqual(
+            self.get_statuses(),
+            [Payment.StatusChoices.PAID,
+             Payment.StatusChoices.PAID,
+             Payment.StatusChoices.PENDING],
+        )
+
+    def test_replayed_event_changes_nothing(self, delay):
+        self.add_event(session_id="cs_single")
+        process_stripe_events()
+        StripeEvent.objects.update(processed_at=None)
+        delay.reset_mock()
+
+        self.assertEqual(process_stripe_events(), 1)
+        delay.assert_not_called()
+
+    def test_unpaid_and_other_events_are_only_marked_handled(self, delay):
+        self.add_event(
+            session_id="cs_single", event_id="evt_1", payment_status="unpaid"
+        )
+        self.add_event(
+            session_id="cs_batch",
+            event_id="evt_2",
+            type="checkout.session.expired",
+        )
+
+        self.assertEqual(process_stripe_events(), 2)
+        self.assertEqual(
+            self.get_statuses(), [Payment.StatusChoices.PENDING] * 3
+        )
+        delay.assert_not_called()
+
+
+class StripeSuccessViewTest(TestCase):
+    def setUp(self):
+        self.user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+        self.payments = [sample_payment(client=self.user) for _ in range(2)]
+        Payment.objects.filter(
+            pk__in=[payment.pk for payment in self.payments]
+        ).update(session_id="cs_test_1")
+
+    def test_pending_until_webhook_is_handled(self):
+        response = self.client.get(
+            STRIPE_SUCCESS_URL, {"session_id": "cs_test_1"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()["status"], "Pending")
+
+    async def test_reports_paid_session(self):
+        await Payment.objects.filter(session_id="cs_test_1").aupdate(
+            status=Payment.StatusChoices.PAID
+        )
+
+        response = await self.async_client.get(
+            STRIPE_SUCCESS_URL, {"session_id": "cs_test_1"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json(),
+            {
+                "message": "Payment successful",
+                "status": "Paid",
+                "payment_id": self.payments[0].id,
+                "payment_ids": [payment.id for payment in self.payments],
+                "amount_total": 20000,
+                "currency": "usd",
+            },
+        )
+
+    def test_unknown_session_id(self):
+        response = self.client.get(STRIPE_SUCCESS_URL, {"session_id": "x"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"detail": "Invalid session_id"})
+
+    def test_session_id_required(self):
+        response = self.client.get(STRIPE_SUCCESS_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FineAccrualTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book()
+
+    def overdue_borrowing(self, days):
+        borrowing = sample_borrowing(client=self.user, book=self.book)
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            expected_return_date=date.today() - timedelta(days=days)
+        )
+
+        return borrowing
+
+    def test_accrues_fines_of_overdue_borrowings(self):
+        first = self.overdue_borrowing(days=3)
+        second = self.overdue_borrowing(days=1)
+        sample_borrowing(client=self.user, book=self.book)
+        returned = self.overdue_borrowing(days=2)
+        Borrowing.objects.filter(pk=returned.pk).update(
+            actual_return_date=date.today()
+        )
+
+        accrued = PaymentService.accrue_fines(batch_size=1)
+
+        self.assertEqual(accrued, 2)
+        self.assertEqual(
+            dict(
+                Payment.objects.filter(
+                    type=Payment.TypeChoices.FINE,
+                    status=Payment.StatusChoices.PENDING,
+                ).values_list("borrowing_id", "money_to_paid")
+            ),
+            {first.pk: Decimal("5.97"), second.pk: Decimal("1.99")}
+        )
+
+    def test_accrual_is_incremental(self):
+        borrowing = self.overdue_borrowing(days=2)
+        PaymentService.accrue_fines()
+
+        self.assertEqual(PaymentService.accrue_fines(), 0)
+        self.assertEqual(
+            PaymentService.accrue_fines(
+                today=date.today() + timedelta(days=1)
+            ),
+            1
+        )
+        self.assertEqual(
+            Payment.objects.get(borrowing=borrowing).money_to_paid,
+            Decimal("5.97")
+        )
+
+    def test_paid_fine_is_not_accrued(self):
+        borrowing = self.overdue_borrowing(days=2)
+        PaymentService.accrue_fines()
+        Payment.objects.filter(borrowing=borrowing).update(
+            status=Payment.StatusChoices.PAID
+        )
+
+        PaymentService.accrue_fines(today=date.today() + timedelta(days=1))
+
+        self.assertEqual(
+            Payment.objects.get(borrowing=borrowing).money_to_paid,
+            Decimal("3.98")
+        )
+
+    @mock.patch("stripe.checkout.Session.create")
+    def test_return_settles_accrued_fine(self, session_create):
+        borrowing = self.overdue_borrowing(days=2)
+        PaymentService.accrue_fines(today=date.today() - timedelta(days=1))
+        fine = Payment.objects.get(borrowing=borrowing)
+
+        before_return = self.client.get(
+            reverse("payments:payments-checkout-session", args=[fine.pk])
+        )
+        response = self.client.post(
+            reverse(
+                "borrowings:borrowings-return-borrowing",
+                args=[borrowing.pk],
+            )
+        )
+
+        fine.refresh_from_db()
+        self.assertIsNone(before_return.data["session_id"])
+        session_create.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["payment_status_url"],
+            reverse(
+                "payments:payments-checkout-session",
+                args=[fine.pk],
+                request=response.wsgi_request,
+            )
+        )
+        self.assertEqual(fine.money_to_paid, Decimal("3.98"))
+        self.assertEqual(Payment.objects.count(), 1)
+
+
+@mock.patch("library_api_service.circuit_breaker.time.time")
+class CircuitBreakerTest(TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(
+            "test",
+            failures=(ConnectionError,),
+            failure_rate=0.5,
+            min_calls=4,
+            window=60,
+            open_seconds=30,
+        )
+        self.breaker.reset(now=1000)
+        self.down = mock.Mock(side_effect=ConnectionError)
+        self.up = mock.Mock(return_value="ok")
+
+    def call(self, func):
+        try:
+            return self.breaker.call(func)
+        except ConnectionError:
+            return None
+
+    def open_circuit(self, now):
+        now.return_value = 1000
+
+        for func in (self.up, self.down, self.up, self.down):
+            self.call(func)
+
+    def test_opens_once_failure_rate_is_reached(self, now):
+        now.return_value = 1000
+
+        for func in (self.up, self.down, self.up):
+            self.call(func)
+
+        self.assertEqual(self.breaker.get_state()[0], CLOSED)
+
+        self.call(self.down)
+
+        with self.assertRaises(CircuitOpen) as raised:
+            self.breaker.call(self.up)
+
+        self.assertEqual(raised.exception.retry_after, 30)
+        self.assertEqual(self.up.call_count, 2)
+
+    def test_other_errors_do_not_count(self, now):
+        now.return_value = 1000
+
+        for _ in range(4):
+            with self.assertRaises(ValueError):
+                self.breaker.call(mock.Mock(side_effect=ValueError))
+
+        self.assertEqual(self.breaker.call(self.up), "ok")
+
+    def test_successful_trial_closes_circuit(self, now):
+        self.open_circuit(now)
+        now.return_value = 1031
+
+        self.assertEqual(self.breaker.get_state()[0], HALF_OPEN)
+        self.assertEqual(self.breaker.call(self.up), "ok")
+        self.assertEqual(self.breaker.stats()["state"], CLOSED)
+
+    def test_failed_trial_opens_circuit_again(self, now):
+        self.open_circuit(now)
+        now.return_value = 1031
+
+        self.call(self.down)
+
+        self.assertEqual(self.breaker.get_state(), (OPEN, 30))
+
+
+class StripeClientTest(TestCase):
+    def setUp(self):
+        self.admin = user_model.objects.create_superuser(
+            email="admin@example.com",
+            password="password",
+        )
+        self.breaker = get_stripe_breaker()
+        self.breaker.reset()
+        self.addCleanup(self.breaker.reset)
+
+    def open_circuit(self):
+        self.breaker.open(time.time())
+
+    def test_sdk_uses_pooled_session_with_timeouts(self):
+        client = stripe.default_http_client
+
+        self.assertIs(client._session, get_http_session())
+        self.assertEqual(
+            client._timeout,
+            (settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+        )
+        self.assertEqual(
+            stripe.max_network_retries, settings.STRIPE_MAX_NETWORK_RETRIES
+        )
+        self.assertEqual(
+            get_http_session().get_adapter("https://")._pool_maxsize,
+            settings.STRIPE_POOL_SIZE,
+        )
+
+    def test_open_circuit_fails_fast(self):
+        create = mock.Mock()
+        self.open_circuit()
+
+        with self.assertRaises(CircuitOpen):
+            call_stripe(create)
+
+        create.assert_not_called()
+
+    def test_checkout_task_is_requeued_while_circuit_is_open(self):
+        payment = sample_payment(client=self.admin)
+        self.open_circuit()
+
+        with mock.patch.object(
+                create_batch_checkout_session, "retry", side_effect=Retry
+        ) as retry, self.assertRaises(Retry):
+            create_batch_checkout_session([payment.id])
+
+        self.assertAlmostEqual(
+            retry.call_args.kwargs["countdown"], 30, delta=1
+        )
+
+    def test_checkout_session_unavailable_while_circuit_is_open(self):
+        payment = sample_payment(client=self.admin)
+        self.open_circuit()
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        response = client.get(
+            reverse("payments:payments-checkout-session", args=[payment.pk])
+        )
+
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self.assertIn(response["Retry-After"], ("29", "30"))
+
+    def test_metrics_for_admins_only(self):
+        user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        self.assertEqual(
+            client.get(STRIPE_METRICS_URL).status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+
+        self.open_circuit()
+        client.force_authenticate(self.admin)
+        response = client.get(STRIPE_METRICS_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["breaker"]["state"], OPEN)
+        self.assertEqual(
+            set(response.data["pool"]), {"size", "requests", "connections"}
+        )
+
+
+FAKE_GATEWAY_SETTINGS = {
+    "PAYMENT_GATEWAY": "payments.gateways.FakeGateway",
+    "PAYMENT_GATEWAY_OPTIONS": {"latency": [0, 0], "webhook_delay": 2},
+}
+
+
+@mock.patch.object(send_telegram_notification, "delay")
+@mock.patch.object(send_fake_webhook, "apply_async")
+@override_settings(**FAKE_GATEWAY_SETTINGS)
+class FakeGatewayTest(TestCase):
+    def setUp(self):
+        self.user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+        self.payment = sample_payment(client=self.user)
+
+    def test_default_gateway_is_stripe(self, apply_async, delay):
+        with override_settings(
+                PAYMENT_GATEWAY="payments.gateways.StripeGateway",
+                PAYMENT_GATEWAY_OPTIONS={}):
+            self.assertIsInstance(get_payment_gateway(), StripeGateway)
+
+    @mock.patch("stripe.checkout.Session.create")
+    def test_checkout_session_without_stripe(
+            self, session_create, apply_async, delay):
+        payment = PaymentService.get_checkout_session(self.payment)
+
+        session_create.assert_not_called()
+        self.assertTrue(payment.session_id.startswith("cs_fake_"))
+        self.assertIn(payment.session_id, payment.session_url)
+        self.assertEqual(
+            apply_async.call_args.args[0], (payment.session_id,)
+        )
+        self.assertEqual(apply_async.call_args.kwargs["countdown"], 2)
+
+    def test_same_idempotency_key_same_session(self, apply_async, delay):
+        gateway = get_payment_gateway()
+        expires_at = timezone.now()
+        first, second = (
+            gateway.create_checkout_session(
+                [], {}, expires_at, "checkout-session-1"
+            )
+            for _ in range(2)
+        )
+
+        self.assertEqual(first, second)
+
+    def test_webhook_callback_marks_payment_paid(self, apply_async, delay):
+        payment = PaymentService.get_checkout_session(self.payment)
+
+        with self.captureOnCommitCallbacks(execute=True), \
+                mock.patch.object(
+                    process_stripe_events, "delay", process_stripe_events
+                ):
+            send_fake_webhook(*apply_async.call_args.args[0])
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.StatusChoices.PAID)
+        self.assertEqual(
+            StripeEvent.objects.get().type, "checkout.session.completed"
+        )
+
+    @override_settings(PAYMENT_GATEWAY_OPTIONS={
+        "latency": [0, 0], "error_rate": 1, "paid_rate": 0,
+    })
+    def test_simulated_failures(self, apply_async, delay):
+        with self.assertRaises(stripe.error.APIConnectionError):
+            PaymentService.get_checkout_session(self.payment)
+
+        apply_async.assert_not_called()
+
+    @override_settings(
+        PAYMENT_GATEWAY_OPTIONS={"latency": [0, 0], "error_rate": 1},
+        STRIPE_BREAKER_MIN_CALLS=2,
+    )
+    def test_simulated_failures_open_the_circuit(self, apply_async, delay):
+        get_stripe_breaker().reset()
+        self.addCleanup(get_stripe_breaker().reset)
+        gateway = get_payment_gateway()
+
+        for _ in range(2):
+            with self.assertRaises(stripe.error.APIConnectionError):
+                gateway.create_checkout_session(
+                    [], {}, timezone.now(), "checkout-session-1"
+                )
+
+        with self.assertRaises(CircuitOpen):
+            gateway.create_checkout_session(
+                [], {}, timezone.now(), "checkout-session-1"
+            )
+
+    def test_gateway_must_implement_every_method(self, apply_async, delay):
+        class PartialGateway(PaymentGateway):
+            def create_checkout_session(self, *args):
+                pass
+
+        with self.assertRaises(TypeError):
+            PartialGateway()
+
+        with override_settings(PAYMENT_GATEWAY="payments.models.Payment"), \
+                self.assertRaises(ImproperlyConfigured):
+            get_payment_gateway()
+
+    def test_session_ttl_must_fit_stripe_bounds(self, apply_async, delay):
+        check_checkout_session_ttl()
+
+        for ttl in (20 * 60, 13 * 60 * 60):
+            with override_settings(CHECKOUT_SESSION_TTL=ttl), \
+                    self.assertRaises(ImproperlyConfigured):
+                check_checkout_session_ttl()
+
+    def test_fake_is_selected_by_settings(self, apply_async, delay):
+        gateway = get_payment_gateway()
+
+        self.assertIsInstance(gateway, FakeGateway)
+        self.assertEqual(gateway.latency, (0, 0))
+
+
+class PaymentIndexTest(TestCase):
+    def setUp(self):
+        self.payment = sample_payment(
+            client=user_model.objects.create_user(
+                email="test_user@example.com",
+                password="password",
+            )
+        )
+
+    def test_payment_by_session_id(self):
+        self.assertIn(
+            "payments_session_id_idx",
+            explain_indexed(Payment.objects.filter(session_id="cs_test"))
+        )
+
+    def test_payments_of_borrowing_by_type_and_status(self):
+        self.assertIn(
+            "payments_borrowing_type_idx",
+            explain_indexed(
+                Payment.objects.filter(
+                    borrowing=self.payment.borrowing,
+                    type=Payment.TypeChoices.PAYMENT,
+                    status=Payment.StatusChoices.PENDING,
+                )
+            )
+        )
+
+    def test_payments_paid_on_day(self):
+        start = timezone.now().replace(hour=0, minute=0, second=0)
+        self.assertIn(
+            "payments_paid_at_idx",
+            explain_indexed(
+                Payment.objects.filter(
+                    paid_at__gte=start,
+                    paid_at__lt=start + timedelta(days=1),
+                )
+            )
+        )
+
+    def test_fine_of_borrowing(self):
+        self.assertIn(
+            "payments_one_fine_per_borrowing",
+            explain_indexed(
+                Payment.objects.filter(
+                    borrowing=self.payment.borrowing,
+                    type=Payment.TypeChoices.FINE,
+                )
+            )
+        )
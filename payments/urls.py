@@ -1,8 +1,10 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 from payments.views import (PaymentViewSet,
+                            StripeMetricsAPIView,
                             StripePaymentCancelAPIView,
-                            StripeSuccessAPIView)
+                            StripeSuccessView,
+                            StripeWebhookAPIView)
 
 app_name = 'payments'
 
@@ -12,8 +14,16 @@ router.register("", PaymentViewSet, basename="payments")
 urlpatterns = [
     path(
         'success/',
-        StripeSuccessAPIView.as_view(),
+        StripeSuccessView.as_view(),
         name='stripe-success'),
+    path(
+        'webhook/',
+        StripeWebhookAPIView.as_view(),
+        name='stripe-webhook'),
+    path(
+        'stripe-metrics/',
+        StripeMetricsAPIView.as_view(),
+        name='stripe-metrics'),
     path(
         'cancel/',
         StripePaymentCancelAPIView.as_view(),
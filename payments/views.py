@@ -1,27 +1,61 @@
+import logging
+import math
+
 import stripe
 from django.conf import settings
+from django.http import JsonResponse
+from django.views import View
 from drf_spectacular.types import OpenApiTypes
-from drf_spectacular.utils import extend_schema, OpenApiParameter
+from drf_spectacular.utils import (OpenApiExample,
+                                   extend_schema,
+                                   OpenApiParameter)
 from rest_framework import mixins, viewsets, status
+from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from library_api_service.circuit_breaker import CircuitOpen
+from library_api_service.exports import StreamingExportMixin
+from library_api_service.fast_serializers import FastListMixin
+from library_api_service.sparse_fields import (SPARSE_FIELDS_PARAMETERS,
+                                               SparseFieldsViewMixin)
+from payments.gateways import CHECKOUT_CURRENCY
 from payments.models import Payment
 from payments.serializers import PaymentSerializer
+from payments.services import PaymentService
+from payments.stripe_client import get_stripe_metrics
 
-
-stripe.api_key = settings.STRIPE_SECRET_KEY
+logger = logging.getLogger(__name__)
 
 
-class PaymentViewSet(mixins.ListModelMixin,
+class PaymentViewSet(StreamingExportMixin,
+                     SparseFieldsViewMixin,
+                     FastListMixin,
+                     mixins.ListModelMixin,
                      mixins.RetrieveModelMixin,
                      viewsets.GenericViewSet
                      ):
     serializer_class = PaymentSerializer
     authentication_classes = (JWTAuthentication,)
     permission_classes = (IsAuthenticated,)
+    query_budget = {
+        "list": 3,
+        "retrieve": 3,
+        # A replaced session also expires the old one and marks it so.
+        "checkout_session": 6,
+    }
+    export_filename = "payments"
+    export_fields = {
+        "id": "id",
+        "status": "status",
+        "type": "type",
+        "borrowing": "borrowing_id",
+        "session_id": "session_id",
+        "session_url": "session_url",
+        "money_to_paid": "money_to_paid",
+    }
 
     def get_queryset(self):
         user = self.request.user
@@ -50,7 +84,7 @@ class PaymentViewSet(mixins.ListModelMixin,
                 )
             user_pk = int(user_pk)
             try:
-                queryset = queryset.filter(user__pk=user_pk)
+                queryset = queryset.filter(borrowing__user__pk=user_pk)
             except Exception as e:
                 raise ValueError(
                     {"detail": f"{e}"}
@@ -69,9 +103,18 @@ class PaymentViewSet(mixins.ListModelMixin,
                 "Filters:\n"
                 "- **type=payment** → base payments\n"
                 "- **type=fine** → fine payments\n"
-                "- **user_id** → filter by user (admin only)"
+                "- **user_id** → filter by user (admin only)\n\n"
+                "Results are cursor-paginated; pass **paginate=false** "
+                "for the legacy unpaginated list."
         ),
         parameters=[
+            *SPARSE_FIELDS_PARAMETERS,
+            OpenApiParameter(
+                name="paginate",
+                type=OpenApiTypes.BOOL,
+                required=False,
+                description="Set to false to disable pagination (legacy)",
+            ),
             OpenApiParameter(
                 name="type",
                 type=OpenApiTypes.STR,
@@ -103,6 +146,7 @@ class PaymentViewSet(mixins.ListModelMixin,
                 "- Regular users can access only their own payments\n"
                 "- Admin users can access any payment"
         ),
+        parameters=SPARSE_FIELDS_PARAMETERS,
         responses={
             200: PaymentSerializer,
             403: OpenApiTypes.OBJECT,
@@ -112,61 +156,194 @@ class PaymentViewSet(mixins.ListModelMixin,
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
 
+    @extend_schema(
+        summary="Get checkout session",
+        description=(
+                "Returns the Stripe checkout session of a pending payment, "
+                "creating it on the first request. The session is reused "
+                "until it is about to expire, then replaced by a new one, "
+                "so always pay through the latest **session_url**.\n\n"
+                "Returns 503 with a Retry-After header while Stripe is "
+                "unavailable.\n\n"
+                "Permissions:\n"
+                "- Regular users can access only their own payments\n"
+                "- Admin users can access any payment"
+        ),
+        responses={
+            200: OpenApiTypes.OBJECT,
+            404: OpenApiTypes.OBJECT,
+            503: OpenApiTypes.OBJECT,
+        },
+        examples=[
+            OpenApiExample(
+                name="Session ready",
+                value={
+                    "payment_id": 7,
+                    "status": "Pending",
+                    "session_id": "cs_test_...",
+                    "session_url": "https://checkout.stripe.com/...",
+                    "session_expires_at": "2026-10-18T12:00:00Z",
+                },
+                response_only=True,
+                status_codes=["200"],
+            ),
+        ],
+    )
+    @action(detail=True, methods=["get"], url_path="checkout-session")
+    def checkout_session(self, request, pk=None):
+        payment_obj = self.get_object()
 
-class StripeSuccessAPIView(APIView):
+        try:
+            PaymentService.get_checkout_session(payment_obj)
+        except CircuitOpen as exc:
+            return Response(
+                {"detail": "Payment provider is unavailable, "
+                           "try again later."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(math.ceil(exc.retry_after))},
+            )
+        except stripe.error.StripeError:
+            return Response(
+                {"detail": "Payment provider is unavailable, "
+                           "try again later."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        return Response(
+            {
+                "payment_id": payment_obj.id,
+                "status": payment_obj.status,
+                "session_id": payment_obj.session_id,
+                "session_url": payment_obj.session_url,
+                "session_expires_at": payment_obj.session_expires_at,
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class StripeWebhookAPIView(APIView):
+    """
+    Receives Stripe webhook events.
+
+    Only verifies the signature and stores the event; payments are
+    updated afterwards by ``process_stripe_events``, so Stripe gets its
+    acknowledgement right away.
+    """
     authentication_classes = []
     permission_classes = []
+    throttle_classes = []
+    query_budget = 1
 
-    def get(self, request):
-        session_id = request.query_params.get("session_id")
+    @extend_schema(exclude=True)
+    def post(self, request):
+        payload = request.body
 
-        if not session_id:
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            # Stripe retries non-2xx deliveries, so none are lost.
+            logger.error(
+                "STRIPE_WEBHOOK_SECRET is not set, rejecting Stripe event"
+            )
             return Response(
-                {"detail": "session_id is required"},
-                status=status.HTTP_400_BAD_REQUEST
+                {"detail": "Webhook is not configured"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
         try:
-            session = stripe.checkout.Session.retrieve(session_id)
-        except stripe.error.InvalidRequestError:
+            event = stripe.Webhook.construct_event(
+                payload,
+                request.headers.get("Stripe-Signature", ""),
+                settings.STRIPE_WEBHOOK_SECRET,
+            )
+        except (ValueError, stripe.error.SignatureVerificationError):
             return Response(
-                {"detail": "Invalid session_id"},
+                {"detail": "Invalid signature"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if session.payment_status != "paid":
-            return Response(
-                {"detail": "Payment not completed"},
+        PaymentService.record_stripe_event(event, payload)
+
+        return Response({"received": True}, status=status.HTTP_200_OK)
+
+
+class StripeMetricsAPIView(APIView):
+    authentication_classes = (JWTAuthentication,)
+    permission_classes = (IsAdminUser,)
+    query_budget = 1
+
+    @extend_schema(
+        summary="Stripe client metrics",
+        description=(
+                "Circuit breaker state and connection pool usage of the "
+                "Stripe client, summed over every worker.\n\n"
+                "Permissions:\n"
+                "- Admin users only"
+        ),
+        responses={
+            200: OpenApiTypes.OBJECT,
+            403: OpenApiTypes.OBJECT,
+        },
+    )
+    def get(self, request):
+        return Response(get_stripe_metrics(), status=status.HTTP_200_OK)
+
+
+class StripeSuccessView(View):
+    """
+    Stripe redirects here after checkout.
+
+    Reports the state of the session's payments, which the
+    ``checkout.session.completed`` webhook marks paid, without calling
+    Stripe. Until the event is handled the payments are still pending
+    and the response is ``202``.
+    """
+
+    async def get(self, request):
+        session_id = request.GET.get("session_id")
+
+        if not session_id:
+            return JsonResponse(
+                {"detail": "session_id is required"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        payment_id = session.metadata.get("payment_id")
-        if not payment_id:
-            return Response(
-                {"detail": "payment_id not found"},
+        # Multi-book checkouts settle several payments with one session.
+        payments = [
+            payment_obj
+            async for payment_obj in Payment.objects.filter(
+                session_id=session_id
+            ).only("id", "status", "money_to_paid").order_by("id")
+        ]
+
+        if not payments:
+            return JsonResponse(
+                {"detail": "Invalid session_id"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        payment_obj = Payment.objects.get(id=payment_id)
-        payment_obj.status = Payment.StatusChoices.PAID
-        payment_obj.save(update_fields=['status'])
-
-        customer = None
-        if session.customer:
-            customer = stripe.Customer.retrieve(session.customer)
+        paid = all(
+            payment_obj.status == Payment.StatusChoices.PAID
+            for payment_obj in payments
+        )
+        amount_total = sum(
+            payment_obj.money_to_paid for payment_obj in payments
+        )
 
-        return Response(
+        return JsonResponse(
             {
-                "message": "Payment successful",
-                "payment_id": payment_id,
-                "amount_total": session.amount_total,
-                "currency": session.currency,
-                "customer": {
-                    "name": customer.name if customer else None,
-                    "email": customer.email if customer else None,
-                },
+                "message": (
+                    "Payment successful" if paid
+                    else "Payment is being confirmed"
+                ),
+                "status": (
+                    Payment.StatusChoices.PAID if paid
+                    else Payment.StatusChoices.PENDING
+                ),
+                "payment_id": payments[0].id,
+                "payment_ids": [payment_obj.id for payment_obj in payments],
+                "amount_total": int(amount_total * 100),
+                "currency": CHECKOUT_CURRENCY,
             },
-            status=status.HTTP_200_OK
+            status=status.HTTP_200_OK if paid else status.HTTP_202_ACCEPTED
         )
 
 
@@ -0,0 +1,31 @@
+from collections.abc import Iterable, Iterator
+
+# Telegram rejects longer messages.
+TELEGRAM_MESSAGE_MAX_LENGTH = 4096
+
+
+def build_digests(
+        header: str,
+        lines: Iterable[str],
+        max_items: int,
+        max_length: int = TELEGRAM_MESSAGE_MAX_LENGTH) -> Iterator[str]:
+    """
+    Group ``lines`` into messages of at most ``max_items`` lines each,
+    every one starting with ``header`` and fitting in ``max_length``.
+    """
+    digest = []
+    length = len(header)
+
+    for line in lines:
+        if digest and (
+                len(digest) == max_items
+                or length + len(line) + 1 > max_length):
+            yield "\n".join([header, *digest])
+            digest = []
+            length = len(header)
+
+        digest.append(line)
+        length += len(line) + 1
+
+    if digest:
+        yield "\n".join([header, *digest])
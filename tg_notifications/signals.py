@@ -1,8 +1,34 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from borrowings.models import Borrowing
+from borrowings.signals import borrowings_checked_out
 from tg_notifications.tasks import send_telegram_notification
 from payments.models import Payment
+from payments.signals import payments_paid
+
+
+def get_borrowing_details(borrowing: Borrowing) -> tuple[str, str]:
+    """
+    User email and book title, read from loaded relations when the
+    caller has them, else with a single query.
+    """
+    if Borrowing.user.is_cached(borrowing) and \
+            Borrowing.book.is_cached(borrowing):
+        return borrowing.user.email, borrowing.book.title
+
+    return Borrowing.objects.filter(pk=borrowing.pk).values_list(
+        "user__email", "book__title"
+    ).get()
+
+
+def get_payment_user_email(payment: Payment) -> str:
+    if Payment.borrowing.is_cached(payment) and \
+            Borrowing.user.is_cached(payment.borrowing):
+        return payment.borrowing.user.email
+
+    return Payment.objects.filter(pk=payment.pk).values_list(
+        "borrowing__user__email", flat=True
+    ).get()
 
 
 @receiver(post_save, sender=Borrowing)
@@ -13,14 +39,33 @@ def notify_borrowing_created(sender, instance, created, **kwargs):
     if not created:
         return
 
+    email, title = get_borrowing_details(instance)
+
     send_telegram_notification.delay(
         f"📚 New borrowing created\n"
-        f"User: {instance.user.email}\n"
-        f"Book: {instance.book.title}\n"
+        f"User: {email}\n"
+        f"Book: {title}\n"
         f"Return until: {instance.expected_return_date}"
     )
 
 
+@receiver(borrowings_checked_out, sender=Borrowing)
+def notify_borrowings_checked_out(sender, user, borrowings, **kwargs):
+    """
+    Notify admins when several books are borrowed in one checkout
+    """
+    titles = "\n".join(
+        f"- {borrowing.book.title} (until {borrowing.expected_return_date})"
+        for borrowing in borrowings
+    )
+
+    send_telegram_notification.delay(
+        f"📚 {len(borrowings)} new borrowings created\n"
+        f"User: {user.email}\n"
+        f"Books:\n{titles}"
+    )
+
+
 @receiver(post_save, sender=Payment)
 def notify_payment_paid(sender, instance, created, **kwargs):
     """
@@ -31,7 +76,16 @@ def notify_payment_paid(sender, instance, created, **kwargs):
 
     send_telegram_notification.delay(
         f"💳 Payment successful\n"
-        f"User: {instance.borrowing.user.email}\n"
+        f"User: {get_payment_user_email(instance)}\n"
         f"Amount: {instance.money_to_paid}\n"
         f"Type: {instance.type}"
     )
+
+
+@receiver(payments_paid, sender=Payment)
+def notify_payments_paid(sender, payments, **kwargs):
+    """
+    Notify admins of payments marked paid together from Stripe events
+    """
+    for payment in payments:
+        notify_payment_paid(sender, payment, created=False)
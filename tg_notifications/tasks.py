@@ -1,7 +1,12 @@
+from datetime import date
+
 from celery import shared_task
+from django.conf import settings
+from django.db.models import Max, Min
 from django.utils.timezone import now
 from borrowings.models import Borrowing
-from payments.models import Payment
+from borrowings.services import DailyStatsService
+from tg_notifications.services.digests import build_digests
 from tg_notifications.services.telegram_bot import send_message
 
 
@@ -16,28 +21,99 @@ def send_telegram_notification(self, text: str):
     send_message(text)
 
 
+def get_overdue_borrowings(today: date):
+    return Borrowing.objects.filter(
+        expected_return_date__lt=today,
+        actual_return_date__isnull=True
+    )
+
+
+def iterate_by_id(queryset, chunk_size: int):
+    """
+    Stream ``queryset`` in id order with one keyset query per chunk, so
+    no query or cursor outlives ``chunk_size`` rows.
+    """
+    last_id = 0
+
+    while True:
+        chunk = queryset.filter(id__gt=last_id).order_by("id")[:chunk_size]
+        count = 0
+
+        for obj in chunk.iterator():
+            count += 1
+            last_id = obj.id
+            yield obj
+
+        if count < chunk_size:
+            return
+
+
 @shared_task
 def check_overdue_borrowings():
-    overdue = Borrowing.objects.filter(
-        expected_return_date__lt=now().date(),
-        actual_return_date__isnull=True
+    """
+    Split the overdue scan into id ranges of ``OVERDUE_SCAN_RANGE_SIZE``
+    and queue one ``scan_overdue_borrowings`` task per range, so workers
+    share the job whatever the table size.
+    """
+    today = now().date()
+    bounds = get_overdue_borrowings(today).aggregate(
+        first=Min("id"), last=Max("id")
     )
-    for b in overdue:
-        send_telegram_notification.delay(
-            f"⚠️ Borrowing #{b.id} by {b.user.email} is overdue!"
+
+    if bounds["first"] is None:
+        return 0
+
+    size = settings.OVERDUE_SCAN_RANGE_SIZE
+    starts = range(bounds["first"], bounds["last"] + 1, size)
+
+    for start in starts:
+        scan_overdue_borrowings.delay(start, start + size, today.isoformat())
+
+    return len(starts)
+
+
+@shared_task
+def scan_overdue_borrowings(start_id: int, end_id: int, today: str):
+    """
+    Send digests of the borrowings with ``start_id <= id < end_id`` that
+    were overdue on ``today``, ``OVERDUE_DIGEST_SIZE`` per message.
+    """
+    overdue = get_overdue_borrowings(date.fromisoformat(today)).filter(
+        id__gte=start_id,
+        id__lt=end_id,
+    ).select_related("user", "book").only(
+        "id", "expected_return_date", "user__email", "book__title"
+    )
+    lines = (
+        f"#{borrowing.id} {borrowing.user.email}: {borrowing.book.title} "
+        f"(due {borrowing.expected_return_date})"
+        for borrowing in iterate_by_id(
+            overdue, settings.OVERDUE_SCAN_CHUNK_SIZE
         )
+    )
+    sent = 0
+
+    for digest in build_digests(
+            f"⚠️ Overdue borrowings ({today}):",
+            lines,
+            settings.OVERDUE_DIGEST_SIZE):
+        send_telegram_notification.delay(digest)
+        sent += 1
+
+    return sent
 
 
 @shared_task
 def daily_summary():
     today = now().date()
-    borrowings_today = Borrowing.objects.filter(borrow_date=today).count()
-    payments_today = Payment.objects.filter(status=Payment.StatusChoices.PAID)
-    total_amount = sum(p.money_to_paid for p in payments_today)
+    # Refreshed here, as the scheduled rollup may be minutes behind.
+    stats = DailyStatsService.rollup(today)
 
     send_telegram_notification.delay(
         f"📊 Daily Summary ({today}):\n"
-        f"New borrowings: {borrowings_today}\n"
-        f"Payments: {payments_today.count()}\n"
-        f"Total received: {total_amount}"
+        f"New borrowings: {stats.borrowings_created}\n"
+        f"Returns: {stats.borrowings_returned}\n"
+        f"Payments: {stats.payments_paid + stats.fines_paid} "
+        f"({stats.fines_paid} fines)\n"
+        f"Total received: {stats.revenue}"
     )
@@ -0,0 +1,173 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from borrowings.models import Borrowing, DailyStats
+from borrowings.services import DailyStatsService
+from borrowings.tests.tests_borrowings import sample_borrowing
+from library_api_service.testing import QueryCountAssertionsMixin
+from payments.models import Payment
+from tg_notifications.services.digests import build_digests
+from tg_notifications.tasks import (check_overdue_borrowings,
+                                    daily_summary,
+                                    scan_overdue_borrowings,
+                                    send_telegram_notification)
+
+user_model = get_user_model()
+
+
+@mock.patch.object(send_telegram_notification, "delay")
+class TelegramNotificationQueriesTest(QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        self.user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+
+    def add_overdue_borrowings(self, count):
+        for _ in range(count):
+            borrowing = sample_borrowing(client=self.user)
+            Borrowing.objects.filter(pk=borrowing.pk).update(
+                expected_return_date=date.today() - timedelta(days=1)
+            )
+
+    def add_paid_payments(self, count):
+        for _ in range(count):
+            Payment.objects.create(
+                type=Payment.TypeChoices.PAYMENT,
+                status=Payment.StatusChoices.PAID,
+                borrowing=sample_borrowing(client=self.user),
+                money_to_paid=2,
+            )
+
+    def test_overdue_scan_query_count_is_constant(self, delay):
+        self.assertQueryCountConstant(
+            lambda: scan_overdue_borrowings(0, 10 ** 9, str(date.today())),
+            self.add_overdue_borrowings,
+        )
+        self.assertIn(self.user.email, delay.call_args.args[0])
+
+    def test_daily_summary_query_count_is_constant(self, delay):
+        self.assertQueryCountConstant(daily_summary, self.add_paid_payments)
+        self.assertIn("Payments: 6", delay.call_args.args[0])
+        self.assertIn("Total received: 12.00", delay.call_args.args[0])
+        self.assertEqual(DailyStats.objects.get().payments_paid, 6)
+
+    def test_daily_summary_is_up_to_date(self, delay):
+        DailyStatsService.rollup(date.today())
+        self.add_paid_payments(2)
+
+        daily_summary()
+
+        self.assertIn("Payments: 2", delay.call_args.args[0])
+
+    def test_paid_notification_without_loaded_relations(self, delay):
+        payment = Payment.objects.create(
+            type=Payment.TypeChoices.PAYMENT,
+            borrowing=sample_borrowing(client=self.user),
+            money_to_paid=2,
+        )
+        payment = Payment.objects.get(pk=payment.pk)
+        payment.status = Payment.StatusChoices.PAID
+
+        # The UPDATE plus one lookup of the borrower's email.
+        with self.assertNumQueries(2):
+            payment.save(update_fields=["status"])
+
+        self.assertIn(self.user.email, delay.call_args.args[0])
+
+    def test_borrowing_notification_uses_loaded_relations(self, delay):
+        borrowing = sample_borrowing(client=self.user)
+
+        self.assertIn(self.user.email, delay.call_args.args[0])
+        self.assertIn(borrowing.book.title, delay.call_args.args[0])
+
+
+@mock.patch.object(send_telegram_notification, "delay")
+class OverdueScanTest(TestCase):
+    def setUp(self):
+        self.user = user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+        self.overdue = []
+
+        for _ in range(5):
+            borrowing = sample_borrowing(client=self.user)
+            self.overdue.append(borrowing.pk)
+
+        Borrowing.objects.filter(pk__in=self.overdue).update(
+            expected_return_date=date.today() - timedelta(days=1)
+        )
+        # Neither of these is overdue.
+        sample_borrowing(client=self.user)
+        returned = sample_borrowing(client=self.user)
+        Borrowing.objects.filter(pk=returned.pk).update(
+            expected_return_date=date.today() - timedelta(days=1),
+            actual_return_date=date.today(),
+        )
+
+    @override_settings(OVERDUE_SCAN_RANGE_SIZE=2)
+    def test_check_splits_overdue_ids_into_ranges(self, delay):
+        with mock.patch.object(scan_overdue_borrowings, "delay") as scan:
+            self.assertEqual(check_overdue_borrowings(), 3)
+
+        ranges = [call.args[:2] for call in scan.call_args_list]
+
+        self.assertEqual(ranges[0][0], self.overdue[0])
+        self.assertGreater(ranges[-1][1], self.overdue[-1])
+        self.assertEqual(
+            [start for start, _ in ranges[1:]],
+            [end for _, end in ranges[:-1]],
+        )
+        delay.assert_not_called()
+
+    def test_check_without_overdue_borrowings_queues_nothing(self, delay):
+        Borrowing.objects.update(actual_return_date=date.today())
+
+        with mock.patch.object(scan_overdue_borrowings, "delay") as scan:
+            self.assertEqual(check_overdue_borrowings(), 0)
+
+        scan.assert_not_called()
+
+    @override_settings(OVERDUE_SCAN_CHUNK_SIZE=2, OVERDUE_DIGEST_SIZE=2)
+    def test_scan_sends_digests_of_overdue_borrowings(self, delay):
+        sent = scan_overdue_borrowings(0, 10 ** 9, str(date.today()))
+        messages = [call.args[0] for call in delay.call_args_list]
+
+        self.assertEqual(sent, 3)
+        self.assertEqual(len(messages), 3)
+        self.assertEqual(
+            [
+                line.split()[0]
+                for message in messages
+                for line in message.splitlines()[1:]
+            ],
+            [f"#{pk}" for pk in self.overdue],
+        )
+
+    def test_scan_covers_only_its_range(self, delay):
+        scan_overdue_borrowings(
+            self.overdue[1], self.overdue[3], str(date.today())
+        )
+
+        (message,) = [call.args[0] for call in delay.call_args_list]
+
+        self.assertEqual(len(message.splitlines()), 3)
+        self.assertIn(f"#{self.overdue[1]} ", message)
+        self.assertIn(f"#{self.overdue[2]} ", message)
+
+
+class BuildDigestsTest(TestCase):
+    def test_splits_by_item_count(self):
+        digests = list(build_digests("Header", ["a", "b", "c"], 2))
+
+        self.assertEqual(digests, ["Header\na\nb", "Header\nc"])
+
+    def test_splits_before_exceeding_max_length(self):
+        lines = ["x" * 40] * 3
+
+        for digest in build_digests("Header", lines, 10, max_length=100):
+            self.assertLessEqual(len(digest), 100)
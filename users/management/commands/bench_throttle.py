@@ -0,0 +1,64 @@
+import statistics
+import time
+from types import SimpleNamespace
+
+import redis
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from borrowings.views import BorrowingViewSet
+from library_api_service.throttling import (RedisTokenBuckets,
+                                            TokenBucketThrottle,
+                                            get_token_buckets)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per-request cost of the token bucket check made "
+        "for POST /api/borrowings/, against THROTTLE_REDIS_URL or "
+        "--redis-url (in-process buckets when neither is set)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=10_000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--redis-url")
+
+    def handle(self, *args, **options):
+        if options["redis_url"]:
+            buckets = RedisTokenBuckets(
+                redis.Redis.from_url(options["redis_url"])
+            )
+        else:
+            buckets = get_token_buckets()
+
+        view = BorrowingViewSet(action="create")
+        request = Request(APIRequestFactory().post("/api/borrowings/"))
+        throttle = TokenBucketThrottle()
+        plans = []
+
+        for number in range(options["users"]):
+            request.user = SimpleNamespace(pk=number, is_authenticated=True)
+            plans.append(throttle.get_buckets(request, view))
+
+        self.stdout.write(
+            f"Backend: {type(buckets).__name__}, "
+            f"{len(plans[0])} buckets per request"
+        )
+
+        timings = []
+
+        for number in range(options["requests"]):
+            plan = plans[number % len(plans)]
+            started = time.perf_counter()
+            buckets.consume(plan)
+            timings.append(time.perf_counter() - started)
+
+        timings.sort()
+        self.stdout.write(
+            f"{len(timings)} checks: "
+            f"mean={statistics.fmean(timings) * 1e6:.0f}us "
+            f"p50={timings[len(timings) // 2] * 1e6:.0f}us "
+            f"p99={timings[int(len(timings) * 0.99)] * 1e6:.0f}us"
+        )
@@ -1,3 +1,126 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from library_api_service.throttling import (LocalTokenBuckets,
+                                            RedisTokenBuckets,
+                                            get_token_buckets,
+                                            parse_rate)
+
+TOKEN_URL = reverse("user:token_obtain_pair")
+
+user_model = get_user_model()
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {
+            **settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"],
+            **rates,
+        },
+    })
+
+
+@override_settings(THROTTLE_REDIS_URL=None)
+class LoginThrottleTest(TestCase):
+    def setUp(self):
+        get_token_buckets().reset()
+        self.client = APIClient()
+        user_model.objects.create_user(
+            email="test_user@example.com",
+            password="password",
+        )
+
+    def login(self, password="wrong", ip="10.0.0.1"):
+        return self.client.post(
+            TOKEN_URL,
+            {"email": "test_user@example.com", "password": password},
+            REMOTE_ADDR=ip,
+        )
+
+    @throttle_rates(login="2/min")
+    def test_login_is_throttled_with_retry_after(self):
+        self.assertEqual(
+            self.login().status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        self.login()
+        response = self.login(password="password")
+
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        # The next token is 30s away, less what the requests took.
+        self.assertIn(response["Retry-After"], ("29", "30"))
+
+    @throttle_rates(login="2/min")
+    def test_login_is_throttled_per_ip(self):
+        self.login()
+        self.login()
+        response = self.login(password="password", ip="10.0.0.2")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @throttle_rates(login=None)
+    def test_scope_without_rate_is_not_throttled(self):
+        for _ in range(20):
+            response = self.login()
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TokenBucketTest(TestCase):
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("20/min"), (20, 20 / 60))
+        self.assertEqual(parse_rate("5/s"), (5, 5))
+
+    @mock.patch("library_api_service.throttling.time.monotonic")
+    def test_local_bucket_refills_over_time(self, monotonic):
+        buckets = LocalTokenBuckets()
+        bucket = [("throttle:{ip:1}:anon", 2, 1.0)]
+        monotonic.return_value = 100.0
+
+        self.assertEqual(buckets.consume(bucket), (True, 0))
+        self.assertEqual(buckets.consume(bucket), (True, 0))
+        self.assertEqual(buckets.consume(bucket), (False, 1.0))
+
+        monotonic.return_value = 100.5
+        self.assertEqual(buckets.consume(bucket), (False, 0.5))
+
+        monotonic.return_value = 101.0
+        self.assertEqual(buckets.consume(bucket), (True, 0))
+
+    def test_local_bucket_charges_all_buckets_or_none(self):
+        buckets = LocalTokenBuckets()
+        client = ("throttle:{user:1}:user", 10, 1.0)
+        scope = ("throttle:{user:1}:borrowings_write", 1, 1.0)
+
+        buckets.consume([client, scope])
+        allowed, _ = buckets.consume([client, scope])
+
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(buckets.buckets[client[0]][0], 9, places=2)
+
+    def test_redis_buckets_use_one_script_call(self):
+        client = mock.Mock()
+        client.register_script.return_value.return_value = [0, 1500]
+        buckets = RedisTokenBuckets(client)
+
+        allowed, wait = buckets.consume([
+            ("throttle:{user:1}:user", 600, 10.0),
+            ("throttle:{user:1}:borrowings_write", 30, 0.5),
+        ])
+
+        self.assertEqual((allowed, wait), (False, 1.5))
+        client.register_script.return_value.assert_called_once_with(
+            keys=[
+                "throttle:{user:1}:user",
+                "throttle:{user:1}:borrowings_write",
+            ],
+            args=[600, 0.01, 30, 0.0005],
+        )
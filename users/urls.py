@@ -1,12 +1,16 @@
 from django.urls import include, path
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
+from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
 
 from users import views
 app_name = 'user'
 
 urlpatterns = [
     path('', views.CreateUserView.as_view(), name="create"),
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path(
+        'token/',
+        views.ThrottledTokenObtainPairView.as_view(),
+        name='token_obtain_pair'
+    ),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     path("me/", views.ManageUserView.as_view(), name="manage_user"),
@@ -7,6 +7,7 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from users.serializers import AuthTokenSerializer
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from rest_framework_simplejwt.views import TokenObtainPairView
 from users.serializers import UserSerializer
 
 
@@ -35,6 +36,7 @@ from users.serializers import UserSerializer
 class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
     permission_classes = (AllowAny,)
+    throttle_scope = "login"
 
 
 @extend_schema(
@@ -59,6 +61,12 @@ class CreateUserView(generics.CreateAPIView):
 class LoginUserView(ObtainAuthToken):
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
     serializer_class = AuthTokenSerializer
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = "login"
+
+
+class ThrottledTokenObtainPairView(TokenObtainPairView):
+    throttle_scope = "login"
 
 
 @extend_schema(